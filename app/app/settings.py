@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.throttling.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,14 +82,74 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# core.db.backends.postgresql adds CONN_HEALTH_CHECKS and POOL to Django's
+# backend , DB_POOL picks how connections are reused:
+#   none      persistent connections , one per thread , kept DB_CONN_MAX_AGE seconds
+#   internal  connections go back to an in-process pool at the end of a request
+#   external  persistent connections to pgbouncer in transaction pooling mode ,
+#             server side cursors are off as they do not survive a transaction ,
+#             keep the server TimeZone at UTC so no SET is needed per connection
+DATABASE_POOL_MODE = os.environ.get('DB_POOL', 'none').lower()
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER':os.environ.get('DB_USER'),
         'PASSWORD':os.environ.get('DB_PASS'),
+        # the pool keeps connections , Django closes them after each request
+        'CONN_MAX_AGE': 0 if DATABASE_POOL_MODE == 'internal'
+        else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'DISABLE_SERVER_SIDE_CURSORS': DATABASE_POOL_MODE == 'external',
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        } if DATABASE_POOL_MODE == 'internal' else None,
+    }
+}
+
+# read replicas of the default database , DB_REPLICA_HOSTS is a comma
+# separated list of host[:port] with the same name and credentials , the
+# test runner points them at the test database of default
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], HOST=host, PORT=port, TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['core.db.replicas.ReplicaRouter']
+
+# safe requests of the recipe , tag and user views read from a replica ,
+# see core.db.replicas , a client that wrote is kept on the primary for
+# STICKY_SECONDS and replicas behind by more than MAX_LAG seconds are skipped ,
+# the pins of tokens are kept in CACHE_ALIAS which must be shared between the
+# processes , with the default local memory cache a token is only pinned in
+# the process that served the write
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'MAX_LAG': float(os.environ.get('DB_REPLICA_MAX_LAG', 5)),
+    'LAG_CHECK_INTERVAL': float(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 1)),
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10)),
+    'COOKIE_NAME': 'db_primary',
+    'CACHE_ALIAS': os.environ.get('DB_REPLICA_CACHE_ALIAS', 'default'),
+}
 
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# local memory by default , point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. memcached) in production so every process sees the same data
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
@@ -111,6 +173,21 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# password hashers , see user.hashers , PASSWORD_HASHER picks the one new
+# passwords get , the others stay to check existing passwords which are
+# rehashed with the first at the next login
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'user.hashers.PBKDF2PasswordHasher',
+    'argon2': 'user.hashers.Argon2PasswordHasher',
+    'bcrypt': 'user.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -141,4 +218,132 @@ AUTH_USER_MODEL = 'core.User'
 # configuration for schema documentation to do
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
-}
\ No newline at end of file
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.EndpointTokenBucketThrottle',
+    ],
+}
+
+# JSON encoder of the API renderer and parser: auto (orjson when installed),
+# orjson or stdlib
+API_JSON_BACKEND = os.environ.get('API_JSON_BACKEND', 'auto')
+
+# cursor pagination for the recipe APIs , default page size and the ceiling
+# a client can ask for with ?page_size= , per endpoint
+API_PAGINATION = {
+    'recipes': {
+        'PAGE_SIZE': int(os.environ.get('RECIPE_PAGE_SIZE', 50)),
+        'MAX_PAGE_SIZE': int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 200)),
+    },
+    'tags': {
+        'PAGE_SIZE': int(os.environ.get('TAG_PAGE_SIZE', 100)),
+        'MAX_PAGE_SIZE': int(os.environ.get('TAG_MAX_PAGE_SIZE', 500)),
+    },
+    # changes per response of the recipe and tag sync endpoints
+    'sync': {
+        'PAGE_SIZE': int(os.environ.get('SYNC_PAGE_SIZE', 500)),
+        'MAX_PAGE_SIZE': int(os.environ.get('SYNC_MAX_PAGE_SIZE', 2000)),
+    },
+}
+
+# in-process cache in front of token authentication , see user.authentication
+# CACHE_ALIAS optionally layers it over a shared Django cache , keep TTL short
+# then as other processes only learn about deleted tokens when entries expire
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_MAX_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    'CACHE_ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS') or None,
+}
+
+# cached list/retrieve responses of the recipe APIs , see recipe.caching
+RECIPE_API_CACHE = {
+    'CACHE_ALIAS': os.environ.get('RECIPE_API_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('RECIPE_API_CACHE_TIMEOUT', 300)),
+}
+
+# bulk recipe endpoint , items are written in transactions of CHUNK_SIZE ,
+# clients can pick a chunk size up to MAX_CHUNK_SIZE with ?chunk_size=
+RECIPE_BULK = {
+    'CHUNK_SIZE': int(os.environ.get('RECIPE_BULK_CHUNK_SIZE', 500)),
+    'MAX_CHUNK_SIZE': int(os.environ.get('RECIPE_BULK_MAX_CHUNK_SIZE', 2000)),
+    'MAX_ITEMS': int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 10000)),
+}
+
+# rows read per round trip and per tag query by the streaming recipe export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+
+# text search configuration of the recipe search_vector column , existing
+# rows keep the old configuration until they are saved again
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# serve the recipe and tag read endpoints with async views that run on a
+# pool of worker threads , see recipe.async_views , app.asgi turns it on
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'false').lower() == 'true'
+# worker threads , and so database connections , of the async read views
+ASYNC_READ_WORKERS = int(os.environ.get('ASYNC_READ_WORKERS', 20))
+
+# build recipe and tag list responses from .values() rows instead of the
+# DRF field machinery , see recipe.serializers.FastSerializerMixin
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', 'false').lower() == 'true'
+
+# time a SAMPLE_RATE share of requests , see core.instrumentation , the
+# measurements go to Server-Timing headers and the /api/metrics/ histograms
+INSTRUMENTATION = {
+    'ENABLED': os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true',
+    'SAMPLE_RATE': float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.05)),
+    'SERVER_TIMING': os.environ.get('INSTRUMENTATION_SERVER_TIMING', 'true').lower() == 'true',
+}
+
+# password hashes run on WORKERS threads with at most MAX_QUEUE waiting ,
+# a hash waiting longer than QUEUE_TIMEOUT seconds answers 503 , see
+# user.hashers , logins seen in the last LOGIN_CACHE_TTL seconds get their
+# token back without hashing , with one query , see user.authentication.LoginCache
+PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': int(os.environ.get('PBKDF2_ITERATIONS', 260000)),
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    'MAX_QUEUE': int(os.environ.get('PASSWORD_HASHING_MAX_QUEUE', 64)),
+    'QUEUE_TIMEOUT': float(os.environ.get('PASSWORD_HASHING_QUEUE_TIMEOUT', 5)),
+    'LOGIN_CACHE_SIZE': int(os.environ.get('LOGIN_CACHE_SIZE', 10000)),
+    'LOGIN_CACHE_TTL': int(os.environ.get('LOGIN_CACHE_TTL', 300)),
+}
+
+# token bucket throttles , see core.throttling , 'user' and 'anon' cover every
+# endpoint , the others the views with that throttle_scope , a rate of N/period
+# allows bursts of N , CACHE_ALIAS shares the buckets between processes
+API_THROTTLING = {
+    'ENABLED': os.environ.get('API_THROTTLING_ENABLED', 'true').lower() == 'true',
+    'RATES': {
+        'user': os.environ.get('THROTTLE_RATE_USER', '1200/min'),
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '120/min'),
+        'recipe': os.environ.get('THROTTLE_RATE_RECIPE', '600/min'),
+        'recipe-bulk': os.environ.get('THROTTLE_RATE_RECIPE_BULK', '60/min'),
+        'recipe-export': os.environ.get('THROTTLE_RATE_RECIPE_EXPORT', '20/min'),
+        'tag': os.environ.get('THROTTLE_RATE_TAG', '600/min'),
+        'me': os.environ.get('THROTTLE_RATE_ME', '300/min'),
+        'login': os.environ.get('THROTTLE_RATE_LOGIN', '30/min'),
+        'signup': os.environ.get('THROTTLE_RATE_SIGNUP', '20/hour'),
+    },
+    'MAX_KEYS': int(os.environ.get('API_THROTTLING_MAX_KEYS', 100000)),
+    'CACHE_ALIAS': os.environ.get('API_THROTTLING_CACHE_ALIAS') or None,
+}
+
+# requests a process serves at once , more wait up to QUEUE_TIMEOUT seconds
+# for a slot and are then shed with 503 , a client with MAX_PER_CLIENT
+# requests in flight gets 429 , keep MAX_REQUESTS near the database pool size
+API_CONCURRENCY = {
+    'ENABLED': os.environ.get('API_CONCURRENCY_ENABLED', 'true').lower() == 'true',
+    'MAX_REQUESTS': int(os.environ.get('API_CONCURRENCY_MAX_REQUESTS', 32)),
+    'MAX_PER_CLIENT': int(os.environ.get('API_CONCURRENCY_MAX_PER_CLIENT', 8)),
+    'QUEUE_TIMEOUT': float(os.environ.get('API_CONCURRENCY_QUEUE_TIMEOUT', 0.5)),
+    'RETRY_AFTER': int(os.environ.get('API_CONCURRENCY_RETRY_AFTER', 1)),
+    'EXEMPT_PATHS': ['/api/health/', '/api/metrics/'],
+}
@@ -0,0 +1,23 @@
+"""
+Settings for the full test suite , app.settings with a replica database
+
+The replica gets a test database of its own instead of mirroring default ,
+so core.tests.test_replicas can tell from the rows which database a request
+read from. It is not in DATABASE_REPLICAS['ALIASES'] , only the tests that
+override it route reads there.
+
+Throttling and the concurrency limiter are off , their stores are process
+wide and every test of the run would share the same buckets ,
+core.tests.test_throttling turns them on where it needs them.
+"""
+from app.settings import *  # noqa: F401,F403
+from app.settings import API_CONCURRENCY, API_THROTTLING, DATABASES
+
+DATABASES = dict(DATABASES, replica=dict(
+    DATABASES['default'],
+    TEST={'NAME': None if DATABASES['default']['NAME'] == ':memory:'
+          else f"test_{DATABASES['default']['NAME']}_replica"},
+))
+
+API_THROTTLING = dict(API_THROTTLING, ENABLED=False)
+API_CONCURRENCY = dict(API_CONCURRENCY, ENABLED=False)
@@ -16,6 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path , include
 from drf_spectacular.views import SpectacularAPIView,SpectacularSwaggerView
+from core.views import DatabaseStatsView, MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,5 +26,7 @@ urlpatterns = [
     SpectacularSwaggerView.as_view(url_name='api-schema'),
     name = 'api-docs'),
     path('api/user/', include('user.urls')),
-    path('api/recipe/',include('recipe.urls'))
+    path('api/recipe/', include('recipe.urls')),
+    path('api/health/db/', DatabaseStatsView.as_view(), name='health-db'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
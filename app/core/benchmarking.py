@@ -0,0 +1,347 @@
+"""
+Helpers for the benchmark management commands
+
+Benchmarks run against a throwaway test database , the same way the test
+runner does , so they never write synthetic data into a real database.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, Tag
+
+TITLE_WORDS = [
+    [
+        'Spicy', 'Creamy', 'Roasted', 'Quick', 'Smoky', 'Grilled', 'Classic',
+        'Vegan', 'Crispy', 'Lemon',
+    ],
+    [
+        'Lentil', 'Chicken', 'Tomato', 'Mushroom', 'Chickpea', 'Salmon',
+        'Potato', 'Tofu', 'Beef', 'Pumpkin',
+    ],
+    [
+        'Soup', 'Curry', 'Salad', 'Stew', 'Pasta', 'Tacos', 'Risotto', 'Bake',
+        'Stir Fry', 'Burger',
+    ],
+]
+# share of recipes with 0 , 1 , 2 ... tags
+TAGS_PER_RECIPE_WEIGHTS = [5, 15, 30, 25, 15, 7, 3]
+
+
+@contextmanager
+def benchmark_database(verbosity=0, admission_control=False):
+    """create a test database for the benchmark and drop it afterwards ,
+    throttles and the concurrency limiter are off unless admission_control"""
+    setup_test_environment()
+    old_config = setup_databases(
+        verbosity, interactive=False, aliases=['default'],
+    )
+    overrides = {} if admission_control else {
+        'API_THROTTLING': dict(settings.API_THROTTLING, ENABLED=False),
+        'API_CONCURRENCY': dict(settings.API_CONCURRENCY, ENABLED=False),
+    }
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+@contextmanager
+def timer():
+    """measure the wall time of a block , read it from the yielded dict"""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+
+
+def create_benchmark_user(email='bench@example.com'):
+    """create and return the user benchmarks run as"""
+    return get_user_model().objects.create_user(
+        email=email, password='benchpass123',
+    )
+
+
+def recipe_payloads(count, tags_per_recipe=3, tag_pool=50):
+    """return `count` recipe payloads whose tags come from a pool of names"""
+    return [
+        {
+            'title': f'Recipe {i}',
+            'description': f'Description of recipe {i}',
+            'time_minutes': 5 + i % 120,
+            'price': f'{1 + i % 90}.{i % 100:02d}',
+            'tags': [
+                {'name': f'Tag {(i + j) % tag_pool}'}
+                for j in range(tags_per_recipe)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def create_recipes(user, count, tags_per_recipe=3, tag_pool=50):
+    """insert `count` recipes with tags for the user straight into the
+    database"""
+    tags = Tag.objects.bulk_create(
+        [Tag(user=user, name=f'Tag {i}') for i in range(tag_pool)]
+    )
+    recipes = [
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            description=f'Description of recipe {i}',
+            time_minutes=5 + i % 120,
+            price=Decimal(f'{1 + i % 90}.{i % 100:02d}'),
+        )
+        for i in range(count)
+    ]
+    for recipe in recipes:
+        recipe.set_search_vector()
+    recipes = Recipe.objects.bulk_create(recipes, batch_size=5000)
+    RecipeTag = Recipe.tags.through
+    links = RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe.id, tag_id=tags[(i + j) % tag_pool].id)
+        for i, recipe in enumerate(recipes)
+        for j in range(tags_per_recipe)
+    ])
+    # keep the tag counters right , links were inserted without the counters
+    counts = Counter(link.tag_id for link in links)
+    for tag in tags:
+        tag.recipe_count = counts[tag.id]
+    Tag.objects.bulk_update(tags, ['recipe_count'])
+    return recipes
+
+
+def zipf_weights(count, skew):
+    """return `count` weights following Zipf's law , the first is the
+    largest"""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def split_by_weight(total, weights):
+    """split `total` into integers proportional to the weights , each at
+    least 1"""
+    scale = (total - len(weights)) / sum(weights)
+    shares = [1 + int(weight * scale) for weight in weights]
+    shares[0] += total - sum(shares)  # rounding leftovers go to the heaviest
+    return shares
+
+
+def generate_dataset(users=20, recipes=5000, tags_per_user=60, skew=1.1,
+                     seed=0):
+    """insert a reproducible data set with realistic skew and return
+    [(user , token , recipe count)] heaviest user first
+
+    Recipes per user and the use of each user's tags follow Zipf's law ,
+    most recipes have 2-3 tags , times and prices are log-normal.
+    """
+    rng = random.Random(seed)
+    password = make_password('benchpass123')  # hashed once for every user
+    user_model = get_user_model()
+    accounts = user_model.objects.bulk_create([
+        user_model(
+            email=f'bench{i}@example.com', name=f'Bench {i}',
+            password=password,
+        )
+        for i in range(users)
+    ])
+    if accounts[0].pk is None:  # backends not returning ids from bulk inserts
+        accounts = list(
+            user_model.objects.filter(email__startswith='bench').order_by('id')
+        )
+    tokens = Token.objects.bulk_create([
+        Token(key=Token.generate_key(), user=user) for user in accounts
+    ])
+
+    recipe_counts = split_by_weight(recipes, zipf_weights(users, skew))
+    tag_weights = zipf_weights(tags_per_user, skew)
+    Tag.objects.bulk_create([
+        Tag(user=user, name=f'Tag {i}')
+        for user in accounts for i in range(tags_per_user)
+    ], batch_size=5000)
+    tag_ids = defaultdict(list)  # user id -> tag ids , most used first
+    user_tags = Tag.objects.filter(user__in=accounts).order_by('id')
+    for user_id, tag_id in user_tags.values_list('user_id', 'id'):
+        tag_ids[user_id].append(tag_id)
+
+    rows, tag_choices = [], []
+    for user, count in zip(accounts, recipe_counts):
+        for _ in range(count):
+            title = ' '.join(rng.choice(words) for words in TITLE_WORDS)
+            minutes = int(rng.lognormvariate(3.3, 0.6))
+            price = max(0.5, min(999, rng.lognormvariate(2, 0.6)))
+            rows.append(Recipe(
+                user=user,
+                title=title,
+                description=(
+                    f'{title} , ready in no time and easy to make at home.'
+                ),
+                time_minutes=max(1, min(600, minutes)),
+                price=Decimal(f'{price:.2f}'),
+            ))
+            wanted = rng.choices(
+                range(len(TAGS_PER_RECIPE_WEIGHTS)), TAGS_PER_RECIPE_WEIGHTS,
+            )[0]
+            picked = set(
+                rng.choices(tag_ids[user.id], tag_weights, k=wanted)
+            )
+            tag_choices.append(picked)
+    for recipe in rows:
+        recipe.set_search_vector()
+    created = Recipe.objects.bulk_create(rows, batch_size=5000)
+    if created[0].pk is None:
+        created = list(Recipe.objects.order_by('id'))
+    RecipeTag = Recipe.tags.through
+    links = RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe.id, tag_id=tag_id)
+        for recipe, picked in zip(created, tag_choices)
+        for tag_id in picked
+    ], batch_size=5000)
+    counts = Counter(link.tag_id for link in links)
+    tags = list(Tag.objects.filter(user__in=accounts))
+    for tag in tags:
+        tag.recipe_count = counts[tag.id]
+    Tag.objects.bulk_update(tags, ['recipe_count'], batch_size=5000)
+    return list(zip(accounts, tokens, recipe_counts))
+
+
+@contextmanager
+def count_queries(alias='default'):
+    """count the queries of the block on this thread's connection , read
+    the number from the yielded dict"""
+    result = {'queries': 0}
+
+    def count(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connections[alias].execute_wrapper(count):
+        yield result
+
+
+def latency_summary(latencies, seconds, queries=None):
+    """return requests/sec and p50/p95/p99 in ms of a load run , and the
+    queries per request when they were counted"""
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        index = min(len(latencies) - 1, int(len(latencies) * p))
+        return latencies[index] * 1000
+
+    summary = {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / seconds,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+    if queries is not None:
+        summary['queries_per_request'] = queries / len(latencies)
+    return summary
+
+
+def wsgi_load(paths, headers, concurrency, total):
+    """send `total` GET requests for `paths` in turn through Django's WSGI
+    handler from `concurrency` threads , return latency_summary with the
+    queries per request"""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    counter = itertools.count()
+    latencies = []
+    queries = []
+    lock = threading.Lock()
+
+    def start_response(status, response_headers, exc_info=None):
+        if not status.startswith('200'):
+            raise RuntimeError(f'Unexpected response {status}')
+
+    def client():
+        with count_queries() as counted:
+            while (number := next(counter)) < total:
+                path = paths[number % len(paths)]
+                environ = factory.get(path, **headers).environ
+                start = time.perf_counter()
+                response = handler(environ, start_response)
+                b''.join(response)
+                # the server does this , it closes the db connection
+                response.close()
+                latencies.append(time.perf_counter() - start)
+        with lock:
+            queries.append(counted['queries'])
+
+    with timer() as elapsed:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [pool.submit(client) for _ in range(concurrency)]:
+                future.result()
+    return latency_summary(latencies, elapsed['seconds'], sum(queries))
+
+
+def asgi_load(paths, headers, concurrency, total):
+    """send `total` GET requests for `paths` in turn through Django's ASGI
+    handler from `concurrency` tasks on one event loop , return
+    latency_summary"""
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    counter = itertools.count()
+    latencies = []
+    raw_headers = [(b'host', b'testserver')] + [
+        (name[5:].lower().replace('_', '-').encode(), value.encode())
+        for name, value in headers.items()
+    ]
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        start = message['type'] == 'http.response.start'
+        if start and message['status'] != 200:
+            raise RuntimeError(f"Unexpected response {message['status']}")
+
+    async def client():
+        while (number := next(counter)) < total:
+            path, _, query = paths[number % len(paths)].partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path,
+                'query_string': query.encode(), 'headers': raw_headers,
+                'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+            }
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            latencies.append(time.perf_counter() - start)
+
+    async def run():
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+
+    with timer() as elapsed:
+        asyncio.run(run())
+    return latency_summary(latencies, elapsed['seconds'])
@@ -0,0 +1,123 @@
+"""
+PostgreSQL backend with connection health checks and an optional pool
+
+Django 3.2 only knows CONN_MAX_AGE , this backend adds two keys to the
+DATABASES entry:
+    CONN_HEALTH_CHECKS  ping a persistent connection with SELECT 1 before
+                        the first query of a request and reconnect if it died
+    POOL                {'MIN_SIZE', 'MAX_SIZE', 'TIMEOUT'} , hand closed
+                        connections back to a pool shared by the threads of
+                        the process instead of closing them , see core.db.pool
+"""
+from django.db.backends.postgresql import base, creation
+
+from core.db.pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Test database creation that lets go of pooled and persistent
+    connections before the database is dropped"""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        with self._nodb_cursor() as cursor:
+            # connections kept open by benchmark and async worker threads
+            cursor.execute(
+                'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                'WHERE datname = %s AND pid <> pg_backend_pid()',
+                [test_database_name],
+            )
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    health_check_enabled = False
+    health_check_done = False
+    connection_pool = None  # pool the open connection came from
+    pool_reused = False  # the open connection was taken idle from the pool
+
+    def get_pool(self, conn_params=None):
+        """return the pool of this database , None when pooling is off"""
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        if conn_params is None:
+            conn_params = self.get_connection_params()
+        # the test runner renames the database , it gets a pool of its own
+        key = (self.alias, repr(sorted(conn_params.items())))
+        return get_pool(
+            key,
+            min_size=options.get('MIN_SIZE', 0),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+        )
+
+    def get_new_connection(self, conn_params):
+        self.connection_pool = self.get_pool(conn_params)
+        if self.connection_pool is None:
+            self.pool_reused = False
+            return super().get_new_connection(conn_params)
+
+        created = []
+
+        def connect():
+            created.append(True)
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        connection = self.connection_pool.acquire(connect)
+        self.pool_reused = not created
+        if self.pool_reused:
+            self.isolation_level = connection.isolation_level
+        return connection
+
+    def warm_pool(self):
+        """open the pool's MIN_SIZE connections , return the pool or None"""
+        conn_params = self.get_connection_params()
+        pool = self.get_pool(conn_params)
+        if pool is not None:
+            connect = super().get_new_connection
+            pool.warm(lambda: connect(conn_params))
+        return pool
+
+    def pool_stats(self):
+        """return the counters of this database's pool , None when pooling
+        is off"""
+        pool = self.get_pool()
+        return pool.stats() if pool is not None else None
+
+    def connect(self):
+        super().connect()
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False,
+        )
+        # a new connection was just made , an idle pooled one may have died
+        self.health_check_done = not self.pool_reused
+
+    def _close(self):
+        if self.connection_pool is None or self.connection is None:
+            return super()._close()
+        broken = self.errors_occurred and not self.is_usable()
+        with self.wrap_database_errors:
+            self.connection_pool.release(self.connection, discard=broken)
+
+    def close_if_unusable_or_obsolete(self):
+        if self.connection is not None:
+            # checked again before the first query of the next request
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        """close the connection if it does not answer , the next query
+        opens a new one"""
+        if (self.connection is None or not self.health_check_enabled
+                or self.health_check_done):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
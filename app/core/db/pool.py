@@ -0,0 +1,174 @@
+"""
+In-process pool of database connections shared by the threads of a process
+
+Django keeps one connection per thread and closes it after each request
+when CONN_MAX_AGE is 0 , with the pool the close hands the connection back
+and the next request of any thread takes it again , skipping the TCP and
+authentication handshake.
+"""
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """no connection became free within the pool timeout , Django raises it
+    as an OperationalError like a failed connect"""
+
+
+class ConnectionPool:
+    """Bounded pool of connections , at most `max_size` are open at once ,
+    `acquire` waits up to `timeout` seconds for one"""
+
+    def __init__(self, min_size=0, max_size=10, timeout=10):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []  # most recently released last
+        self._size = 0  # open connections , idle and in use
+        self._condition = threading.Condition()
+        self.created = 0
+        self.discarded = 0
+        self.acquired = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def acquire(self, connect):
+        """return an idle connection , a new one made by `connect` while
+        below max_size , or wait for one to be released"""
+        with self._condition:
+            start = None
+            while not self._idle and self._size >= self.max_size:
+                if start is None:
+                    start = time.monotonic()
+                    self.waits += 1
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self.timeouts += 1
+                        self.wait_seconds += time.monotonic() - start
+                        raise PoolTimeout(
+                            f'No database connection free after '
+                            f'{self.timeout}s ({self.max_size} in use).'
+                        )
+            if start is not None:
+                self.wait_seconds += time.monotonic() - start
+            self.acquired += 1
+            if self._idle:
+                return self._idle.pop()
+            # reserve the slot before connecting outside the lock
+            self._size += 1
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return connection
+
+    def release(self, connection, discard=False):
+        """give a connection back , broken ones and ones left in a
+        transaction that cannot be rolled back are closed instead"""
+        if not discard and not connection.closed:
+            status = connection.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    discard = True
+        with self._condition:
+            if discard or connection.closed:
+                self._size -= 1
+                self.discarded += 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+        if discard and not connection.closed:
+            connection.close()
+
+    def warm(self, connect):
+        """open connections until min_size are idle , return how many were
+        added"""
+        added = []
+        with self._condition:
+            missing = min(
+                self.min_size - len(self._idle), self.max_size - self._size,
+            )
+        for _ in range(max(missing, 0)):
+            added.append(self.acquire(connect))
+        for connection in added:
+            self.release(connection)
+        return len(added)
+
+    def check(self, query='SELECT 1'):
+        """run `query` on every idle connection , the ones failing are
+        closed , return the error of each connection or None when it
+        answered"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        errors = []
+        for connection in idle:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(query)
+                    cursor.fetchone()
+            except psycopg2.Error as error:
+                errors.append(str(error).strip() or type(error).__name__)
+            else:
+                errors.append(None)
+            # the query opened a transaction , release rolls it back
+            self.release(connection, discard=errors[-1] is not None)
+        return errors
+
+    def close(self):
+        """close the idle connections , ones in use are closed on release"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        """return the pool size and counters"""
+        with self._condition:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'created': self.created,
+                'discarded': self.discarded,
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'wait_seconds': self.wait_seconds,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, min_size=0, max_size=10, timeout=10):
+    """return the process wide pool for a set of connection parameters"""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(min_size, max_size, timeout)
+        return _pools[key]
+
+
+def close_pools():
+    """close the idle connections of every pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,191 @@
+"""
+Routing of safe API reads to read replicas of the default database
+
+Views with ReplicaReadMixin run GET , HEAD and OPTIONS requests inside
+replica_reads() , which picks one replica for the whole request , and the
+router sends the reads made meanwhile there. Everything else , writes and
+reads outside those views , stays on the default database.
+
+A successful write pins its client to the primary for STICKY_SECONDS so it
+reads its own writes: the token is remembered in the cache and a cookie is
+set for clients without one. Replicas lagging more than MAX_LAG seconds ,
+or not answering , are left out until their next lag check. Responses read
+from a replica are not cached , they could be older than the version they
+would be cached under.
+"""
+import contextvars
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+# alias reads are routed to in the current request , None is the primary
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+_lags = {}  # alias -> (checked_at, lag seconds or None when unreachable)
+_lags_lock = threading.Lock()
+
+LAG_SQL = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+def measure_lag(alias):
+    """return how many seconds a replica is behind , 0 when caught up"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def replica_lag(alias):
+    """return the last measured lag of a replica , None when it did not
+    answer , measured again every LAG_CHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    with _lags_lock:
+        entry = _lags.get(alias)
+    interval = settings.DATABASE_REPLICAS['LAG_CHECK_INTERVAL']
+    if entry is not None and now - entry[0] < interval:
+        return entry[1]
+    try:
+        lag = measure_lag(alias)
+    except DatabaseError:
+        lag = None
+        connections[alias].close()
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def reset_lags():
+    """forget the measured lags"""
+    with _lags_lock:
+        _lags.clear()
+
+
+def choose_replica():
+    """return the alias of a replica close enough to the primary , or None"""
+    config = settings.DATABASE_REPLICAS
+    candidates = []
+    for alias in config['ALIASES']:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= config['MAX_LAG']:
+            candidates.append(alias)
+    return random.choice(candidates) if candidates else None
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """route the reads of the block to a replica , or to `alias`"""
+    token = _read_alias.set(alias or choose_replica())
+    try:
+        yield _read_alias.get()
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica():
+    """return if the reads of the current request go to a replica"""
+    return _read_alias.get() is not None
+
+
+@contextmanager
+def primary_reads():
+    """route the reads of the block to the primary"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads to the replica picked by replica_reads() and writes to
+    the default database"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # objects read from a replica are saved to the primary
+        instance = hints.get('instance')
+        replicas = settings.DATABASE_REPLICAS['ALIASES']
+        if instance is not None and instance._state.db in replicas:
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS['ALIASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pin_key(request):
+    """cache key pinning the request's token to the primary , None
+    without a token"""
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    return 'db-primary:' + hashlib.sha256(auth[1].encode()).hexdigest()
+
+
+def is_pinned(request):
+    """return if the client wrote recently and must read from the primary"""
+    config = settings.DATABASE_REPLICAS
+    if request.COOKIES.get(config['COOKIE_NAME']):
+        return True
+    key = pin_key(request)
+    return key is not None and bool(caches[config['CACHE_ALIAS']].get(key))
+
+
+def pin_primary(request, response):
+    """keep the client on the primary after a write"""
+    config = settings.DATABASE_REPLICAS
+    key = pin_key(request)
+    if key is not None:
+        caches[config['CACHE_ALIAS']].set(key, True, config['STICKY_SECONDS'])
+    response.set_cookie(
+        config['COOKIE_NAME'], '1', max_age=config['STICKY_SECONDS'],
+        httponly=True, samesite='Lax',
+    )
+
+
+class ReplicaReadMixin:
+    """Serve safe requests of an API view from a read replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS['ALIASES']:
+            return super().dispatch(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            if is_pinned(request):
+                return super().dispatch(request, *args, **kwargs)
+            with replica_reads():
+                return super().dispatch(request, *args, **kwargs)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code < 400:
+            pin_primary(request, response)
+        return response
+
+    def perform_authentication(self, request):
+        try:
+            super().perform_authentication(request)
+        except AuthenticationFailed:
+            if _read_alias.get() is None:
+                raise
+            # a token created moments ago may not have reached the replica
+            with primary_reads():
+                request._authenticate()
@@ -0,0 +1,292 @@
+"""
+Request level performance instrumentation
+
+A settings.INSTRUMENTATION['SAMPLE_RATE'] share of requests is timed by
+InstrumentationMiddleware: wall time , database queries and their time ,
+serializer time and render time (through the `timed` hooks) and response
+bytes , labelled by view and action. Sampled responses carry a
+Server-Timing header and every sample goes into in-process histograms ,
+served in the Prometheus text format by core.views.MetricsView.
+
+Requests that are not sampled only pay for a random() call and a context
+variable lookup per query and per serialized object.
+"""
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (help , buckets , value of a RequestMetrics)
+HISTOGRAMS = {
+    'api_request_duration_seconds': (
+        'Wall time of sampled requests.', DURATION_BUCKETS, lambda m: m.wall,
+    ),
+    'api_request_db_queries': (
+        'Database queries of sampled requests.', QUERY_BUCKETS,
+        lambda m: m.queries,
+    ),
+    'api_request_db_seconds': (
+        'Time spent in database queries by sampled requests.',
+        DURATION_BUCKETS, lambda m: m.times['db'],
+    ),
+    'api_request_serializer_seconds': (
+        'Time spent serializing by sampled requests.', DURATION_BUCKETS,
+        lambda m: m.times['serializer'],
+    ),
+    'api_request_render_seconds': (
+        'Time spent rendering by sampled requests.', DURATION_BUCKETS,
+        lambda m: m.times['render'],
+    ),
+    'api_response_bytes': (
+        'Body size of sampled responses , streamed ones are left out.',
+        BYTES_BUCKETS, lambda m: m.bytes,
+    ),
+}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Measurements of one sampled request"""
+
+    def __init__(self):
+        self.view = 'unresolved'
+        self.action = 'none'
+        self.wall = 0.0
+        self.queries = 0
+        self.bytes = None
+        self.times = defaultdict(float)  # stage -> seconds
+        # stages being timed , inner calls are not counted again
+        self.active = set()
+
+    def server_timing(self):
+        """return the Server-Timing header value"""
+        parts = [f'total;dur={self.wall * 1000:.2f}']
+        parts.append(
+            f'db;dur={self.times["db"] * 1000:.2f};'
+            f'desc="{self.queries} queries"'
+        )
+        for stage in ('serializer', 'render'):
+            parts.append(f'{stage};dur={self.times[stage] * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def current_metrics():
+    """return the metrics of the request being sampled or None"""
+    return _current.get()
+
+
+def timed(stage):
+    """decorator adding the time spent in a function to `stage` of the
+    sampled request , nested and recursive calls count once"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = _current.get()
+            if metrics is None or stage in metrics.active:
+                return func(*args, **kwargs)
+            metrics.active.add(stage)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.times[stage] += time.perf_counter() - start
+                metrics.active.discard(stage)
+        return wrapper
+    return decorator
+
+
+class TimedSerializerMixin:
+    """Count the time spent in to_representation as serializer time"""
+
+    @timed('serializer')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+def record_query(execute, sql, params, many, context):
+    """database execute wrapper counting the queries of sampled requests"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.times['db'] += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """time the queries of every connection , threads included"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histograms:
+    """Thread safe histograms of HISTOGRAMS by (view , action) labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (name , labels) -> [bucket counts , sum , count]
+
+    def observe(self, metrics):
+        """add the measurements of a sampled request"""
+        labels = (metrics.view, metrics.action)
+        with self._lock:
+            for name, (_, buckets, value) in HISTOGRAMS.items():
+                observed = value(metrics)
+                if observed is None:
+                    continue
+                series = self._series.get((name, labels))
+                if series is None:
+                    series = [[0] * len(buckets), 0.0, 0]
+                    self._series[(name, labels)] = series
+                for i, bound in enumerate(buckets):
+                    if observed <= bound:
+                        series[0][i] += 1
+                series[1] += observed
+                series[2] += 1
+
+    def snapshot(self):
+        """return {(name , labels): (bucket counts , sum , count)}"""
+        with self._lock:
+            return {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+histograms = Histograms()
+
+
+def label_value(value):
+    """escape a Prometheus label value"""
+    value = str(value).replace('\\', r'\\')
+    return value.replace('"', r'\"').replace('\n', r'\n')
+
+
+def prometheus_text(extra=()):
+    """return the histograms , and `extra` lines , in the Prometheus text
+    format"""
+    snapshot = histograms.snapshot()
+    sample_rate = float(settings.INSTRUMENTATION['SAMPLE_RATE'])
+    lines = [
+        '# HELP api_instrumentation_sample_rate Share of requests measured.',
+        '# TYPE api_instrumentation_sample_rate gauge',
+        f'api_instrumentation_sample_rate {sample_rate!r}',
+    ]
+    for name, (help_text, buckets, _) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (series_name, (view, action)), series in sorted(snapshot.items()):
+            if series_name != name:
+                continue
+            counts, total, count = series
+            labels = (
+                f'view="{label_value(view)}",action="{label_value(action)}"'
+            )
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{float(bound)!r}"}} '
+                    f'{bucket_count}'
+                )
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total!r}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+    lines += extra
+    return '\n'.join(lines) + '\n'
+
+
+def view_labels(request, view_func):
+    """return the (view , action) labels of a resolved view"""
+    method = request.method.lower()
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}', method
+    actions = getattr(view_func, 'actions', None) or {}
+    return cls.__name__, actions.get(method, method)
+
+
+class InstrumentationMiddleware:
+    """Measure a sample of requests , put it first in MIDDLEWARE so the
+    wall time covers the other middleware
+
+    Sync and async capable , like MiddlewareMixin , so under ASGI it does not
+    move every request onto the one thread Django runs sync code on."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # lets Django call it as a coroutine function , see MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def sample(self):
+        """return the metrics of a request to measure , or None"""
+        config = settings.INSTRUMENTATION
+        if not config['ENABLED'] or random.random() >= config['SAMPLE_RATE']:
+            return None
+        return RequestMetrics()
+
+    def finish(self, metrics, start, response):
+        """record a measured request and add its Server-Timing header"""
+        metrics.wall = time.perf_counter() - start
+        if not response.streaming:
+            metrics.bytes = len(response.content)
+        histograms.observe(metrics)
+        if settings.INSTRUMENTATION['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = self.sample()
+        if metrics is None:
+            return self.get_response(request)
+
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, start, response)
+
+    async def __acall__(self, request):
+        metrics = self.sample()
+        if metrics is None:
+            return await self.get_response(request)
+
+        # sync code below runs with a copy of this context , it sees metrics
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, start, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view, metrics.action = view_labels(request, view_func)
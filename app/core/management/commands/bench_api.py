@@ -0,0 +1,340 @@
+"""
+Django command running the benchmark suite of the recipe and user APIs
+
+A reproducible , skewed data set (core.benchmarking.generate_dataset) is
+built in a throwaway test database , then three groups run:
+    micro     the recipe serializers and RecipeSerializer._get_or_create_tags
+    endpoint  each endpoint on its own through the Django test client
+    load      a mix of read endpoints through the WSGI handler from threads
+Requests are spread over the users like the data , heavy users more often.
+--output writes the results as JSON , --compare reads an earlier file and
+fails when a throughput dropped by more than --max-regression.
+"""
+import json
+import platform
+import random
+from types import SimpleNamespace
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from core.benchmarking import (
+    benchmark_database,
+    count_queries,
+    generate_dataset,
+    latency_summary,
+    timer,
+    wsgi_load,
+)
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeSerializer, TagSerialzer
+
+GROUPS = ['micro', 'endpoint', 'load']
+# result field compared between runs , higher is better
+THROUGHPUT = {
+    'micro': 'ops_per_second',
+    'endpoint': 'requests_per_second',
+    'load': 'requests_per_second',
+}
+LOAD_PATHS = [
+    '/api/recipe/recipes/?page_size=20',
+    '/api/recipe/recipes/?page_size=20&fields=id,title',
+    '/api/recipe/recipes/?q=soup',
+    '/api/recipe/tags/',
+    '/api/recipe/tags/popular/',
+    '/api/user/me/',
+]
+
+
+def endpoint_cases():
+    """return {name: function(rng , user) -> (method , path , data)}"""
+    def detail(rng, user):
+        recipe_id = rng.choice(user.recipe_ids)
+        return 'get', f'/api/recipe/recipes/{recipe_id}/', None
+
+    def filtered(rng, user):
+        query = f'tags={user.tag_ids[0]}&price_max=20'
+        return 'get', f'/api/recipe/recipes/?{query}', None
+
+    def create(rng, user):
+        return 'post', '/api/recipe/recipes/', {
+            'title': 'Bench soup', 'time_minutes': 10, 'price': '5.00',
+            'tags': [
+                {'name': 'Tag 0'}, {'name': 'Tag 1'},
+                {'name': f'New {rng.random()}'},
+            ],
+        }
+
+    def retag(rng, user):
+        recipe_id = rng.choice(user.recipe_ids)
+        return 'patch', f'/api/recipe/recipes/{recipe_id}/', {
+            'tags': [{'name': f'Tag {i}'} for i in rng.sample(range(10), 3)],
+        }
+
+    def get(path):
+        return lambda rng, user: ('get', path, None)
+
+    return {
+        'recipe-list': get('/api/recipe/recipes/?page_size=20'),
+        'recipe-list-fields': get(
+            '/api/recipe/recipes/?page_size=20&fields=id,title'
+        ),
+        'recipe-search': get('/api/recipe/recipes/?q=spicy soup'),
+        'recipe-filter': filtered,
+        'recipe-detail': detail,
+        'tag-list': get('/api/recipe/tags/'),
+        'tag-popular': get('/api/recipe/tags/popular/'),
+        'user-me': get('/api/user/me/'),
+        'recipe-create': create,
+        'recipe-retag': retag,
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe and user APIs"""
+    help = (
+        'Run micro , endpoint and load benchmarks and report them as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--groups', nargs='+', choices=GROUPS, default=GROUPS,
+        )
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--tags', type=int, default=60, help='tags per user',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Zipf exponent of the data and requests',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--repeat', type=int, default=20, help='runs per micro benchmark',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200, help='requests per endpoint',
+        )
+        parser.add_argument('--load-requests', type=int, default=2000)
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8],
+        )
+        parser.add_argument(
+            '--cached', action='store_true', help='keep the response cache on',
+        )
+        parser.add_argument(
+            '--output',
+            help='write the results as JSON to this file , - for stdout',
+        )
+        parser.add_argument(
+            '--compare', help='JSON results of an earlier run to compare with',
+        )
+        parser.add_argument('--max-regression', type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        cache_settings = {
+            'CACHE_ALIAS': 'default',
+            'TIMEOUT': 300 if options['cached'] else 0,
+        }
+        cached = override_settings(RECIPE_API_CACHE=cache_settings)
+        with benchmark_database(), cached:
+            users = self.create_dataset(options)
+            results = []
+            for group in options['groups']:
+                results += getattr(self, f'run_{group}')(users, options)
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'parameters': {
+                name: options[name] for name in [
+                    'users', 'recipes', 'tags', 'skew', 'seed', 'repeat',
+                    'requests', 'load_requests', 'concurrency', 'cached',
+                ]
+            },
+            'results': results,
+        }
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_results(results)
+            if options['output']:
+                with open(options['output'], 'w') as file:
+                    json.dump(report, file, indent=2)
+        if baseline is not None:
+            self.compare(
+                baseline['results'], results, options['max_regression'],
+            )
+
+    def create_dataset(self, options):
+        """build the data set , return the users heaviest first with what
+        the requests need to know about them"""
+        dataset = generate_dataset(
+            options['users'], options['recipes'], options['tags'],
+            options['skew'], options['seed'],
+        )
+        users = []
+        for user, token, count in dataset:
+            recipes = Recipe.objects.filter(user=user)
+            tags = Tag.objects.filter(user=user).order_by('id')
+            users.append(SimpleNamespace(
+                user=user,
+                token=token.key,
+                weight=count,
+                recipe_ids=list(recipes.values_list('id', flat=True)),
+                tag_ids=list(tags.values_list('id', flat=True)),
+            ))
+        return users
+
+    def run_micro(self, users, options):
+        """time the serializers and tag linking of the heaviest user"""
+        heaviest, repeat = users[0], options['repeat']
+        results = []
+
+        def record(name, ops, seconds):
+            results.append({
+                'group': 'micro', 'name': name, 'ops': ops,
+                'seconds': seconds, 'ops_per_second': ops / seconds,
+            })
+
+        recipes = list(
+            Recipe.objects.filter(user=heaviest.user).order_by('-id')
+            .prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id'))
+            )[:200]
+        )
+        with timer() as elapsed:
+            for _ in range(repeat):
+                RecipeSerializer(recipes, many=True).data
+        record('recipe-serializer', len(recipes) * repeat, elapsed['seconds'])
+
+        serializer = RecipeSerializer()
+        rows = list(
+            Recipe.objects.filter(id__in=[r.id for r in recipes])
+            .values(*serializer.fast_columns())
+        )
+        with timer() as elapsed:
+            for _ in range(repeat):
+                serializer.fast_data(rows)
+        record('recipe-fast-data', len(rows) * repeat, elapsed['seconds'])
+
+        tags = list(Tag.objects.filter(user=heaviest.user))
+        with timer() as elapsed:
+            for _ in range(repeat):
+                TagSerialzer(tags, many=True).data
+        record('tag-serializer', len(tags) * repeat, elapsed['seconds'])
+
+        # two existing tags , one new , rolled back after every call
+        context = {
+            'request': SimpleNamespace(user=heaviest.user, method='POST'),
+        }
+        recipe = recipes[-1]
+        with timer() as elapsed:
+            for i in range(repeat):
+                names = [
+                    {'name': 'Tag 0'}, {'name': 'Tag 1'}, {'name': f'New {i}'},
+                ]
+                with transaction.atomic():
+                    RecipeSerializer(context=context)._get_or_create_tags(
+                        names, recipe,
+                    )
+                    transaction.set_rollback(True)
+        record('get-or-create-tags', repeat, elapsed['seconds'])
+        return results
+
+    def run_endpoint(self, users, options):
+        """time each endpoint through the test client , one request at a
+        time"""
+        rng = random.Random(options['seed'])
+        weights = [user.weight for user in users]
+        client = APIClient()
+        results = []
+        for name, case in endpoint_cases().items():
+            latencies = []
+            with count_queries() as counted:
+                for _ in range(options['requests']):
+                    user = rng.choices(users, weights)[0]
+                    method, path, data = case(rng, user)
+                    with timer() as elapsed:
+                        res = getattr(client, method)(
+                            path, data, format='json',
+                            HTTP_AUTHORIZATION=f'Token {user.token}',
+                        )
+                    if res.status_code >= 400:
+                        raise CommandError(
+                            f'{name}: {method.upper()} {path} answered '
+                            f'{res.status_code}'
+                        )
+                    latencies.append(elapsed['seconds'])
+            summary = latency_summary(
+                latencies, sum(latencies), counted['queries'],
+            )
+            results.append({'group': 'endpoint', 'name': name, **summary})
+        return results
+
+    def run_load(self, users, options):
+        """drive a mix of read endpoints from threads as the heaviest user"""
+        headers = {'HTTP_AUTHORIZATION': f'Token {users[0].token}'}
+        results = []
+        for concurrency in options['concurrency']:
+            summary = wsgi_load(
+                LOAD_PATHS, headers, concurrency, options['load_requests'],
+            )
+            results.append({
+                'group': 'load', 'name': f'read-mix-c{concurrency}', **summary,
+            })
+        return results
+
+    def print_results(self, results):
+        for result in results:
+            label = f"{result['group']:<9}{result['name']:<22}"
+            if result['group'] == 'micro':
+                self.stdout.write(
+                    f"{label}{result['ops_per_second']:>12.0f} ops/s"
+                )
+            else:
+                self.stdout.write(
+                    f"{label}{result['requests_per_second']:>12.0f} req/s"
+                    f"  p50 {result['p50_ms']:7.2f}"
+                    f"  p95 {result['p95_ms']:7.2f}"
+                    f"  p99 {result['p99_ms']:7.2f} ms"
+                    f"  {result['queries_per_request']:5.1f} queries/req"
+                )
+
+    def compare(self, baseline, results, max_regression):
+        """print the throughput change against a baseline , fail on a drop
+        larger than max_regression"""
+        previous = {
+            (result['group'], result['name']): result for result in baseline
+        }
+        regressions = []
+        for result in results:
+            before = previous.get((result['group'], result['name']))
+            if before is None:
+                continue
+            field = THROUGHPUT[result['group']]
+            change = result[field] / before[field] - 1
+            self.stdout.write(
+                f"{result['group']:<9}{result['name']:<22}{change:>+8.1%}"
+            )
+            if change < -max_regression:
+                regressions.append(
+                    f"{result['group']} {result['name']} {change:+.1%}"
+                )
+        if regressions:
+            raise CommandError(
+                'Throughput regressions: ' + ' , '.join(regressions)
+            )
@@ -0,0 +1,109 @@
+"""
+Django command to compare WSGI and ASGI throughput of the read endpoints
+
+Each mode runs in its own process , ASYNC_READ_VIEWS is read when the url
+configuration is imported:
+    wsgi        WSGI handler , one thread per concurrent client
+    asgi-sync   ASGI handler with the sync DRF views
+    asgi-async  ASGI handler with recipe.async_views
+Requests go straight to Django's handlers , so the numbers leave out the
+HTTP server but include middleware , authentication , queries and rendering.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.benchmarking import (
+    asgi_load,
+    benchmark_database,
+    create_benchmark_user,
+    create_recipes,
+    wsgi_load,
+)
+
+MODES = {
+    'wsgi': (wsgi_load, 'false'),
+    'asgi-sync': (asgi_load, 'false'),
+    'asgi-async': (asgi_load, 'true'),
+}
+
+
+class Command(BaseCommand):
+    """Django command to load test the read endpoints under WSGI and ASGI"""
+    help = (
+        'Compare requests/sec and p99 latency of WSGI and ASGI read '
+        'endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=sorted(MODES),
+            help='run one mode in this process',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 16, 64],
+        )
+        parser.add_argument(
+            '--requests', type=int, default=1000, help='requests per run',
+        )
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument(
+            '--json', action='store_true',
+            help='print one JSON object per run',
+        )
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            return self.run_mode(options)
+        results = []
+        for mode, (load, async_views) in MODES.items():
+            command = [
+                sys.executable, sys.argv[0], 'bench_asgi', '--mode', mode,
+                '--json', '--requests', str(options['requests']),
+                '--recipes', str(options['recipes']),
+                '--concurrency', *map(str, options['concurrency']),
+            ]
+            env = dict(os.environ, ASYNC_READ_VIEWS=async_views)
+            output = subprocess.run(
+                command, env=env, check=True, capture_output=True, text=True,
+            )
+            results += [
+                json.loads(line) for line in output.stdout.splitlines()
+                if line.startswith('{')
+            ]
+
+        for result in results:
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                self.stdout.write(
+                    f"{result['mode']:<11} c={result['concurrency']:<4} "
+                    f"{result['requests_per_second']:>8.0f} req/s  "
+                    f"p50 {result['p50_ms']:>8.2f} ms  "
+                    f"p99 {result['p99_ms']:>8.2f} ms"
+                )
+
+    def run_mode(self, options):
+        load, async_views = MODES[options['mode']]
+        # responses are not cached , every request reaches the database
+        cache_settings = {'CACHE_ALIAS': 'default', 'TIMEOUT': 0}
+        uncached = override_settings(RECIPE_API_CACHE=cache_settings)
+        with benchmark_database(), uncached:
+            user = create_benchmark_user()
+            recipes = create_recipes(user, options['recipes'])
+            token = Token.objects.create(user=user)
+            paths = [
+                '/api/recipe/recipes/?page_size=20',
+                f'/api/recipe/recipes/{recipes[0].id}/',
+                '/api/recipe/tags/',
+            ]
+            headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+            for concurrency in options['concurrency']:
+                result = load(paths, headers, concurrency, options['requests'])
+                result.update(mode=options['mode'], concurrency=concurrency)
+                self.stdout.write(json.dumps(result))
@@ -0,0 +1,74 @@
+"""
+Django command to compare the stdlib and orjson JSON backends of the API
+"""
+import io
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarking import recipe_payloads, timer
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, orjson
+
+
+def catalog(count):
+    """return `count` recipes shaped like the recipe list response"""
+    recipes = recipe_payloads(count, tags_per_recipe=5)
+    for i, recipe in enumerate(recipes, 1):
+        recipe['id'] = i
+        recipe['link'] = ''
+        recipe['tags'] = [
+            {'id': j, 'name': tag['name']}
+            for j, tag in enumerate(recipe['tags'])
+        ]
+    return {'next': None, 'previous': None, 'results': recipes}
+
+
+class Command(BaseCommand):
+    """Django command to benchmark JSON rendering and parsing"""
+    help = 'Measure JSON encode and decode time of synthetic recipe catalogs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='number of recipes in each catalog',
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def measure(self, func, repeat):
+        """return the best wall time of `repeat` calls , in ms"""
+        best = None
+        for _ in range(repeat):
+            with timer() as elapsed:
+                func()
+            seconds = elapsed['seconds']
+            best = seconds if best is None else min(best, seconds)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        backends = ['stdlib'] + (['orjson'] if orjson is not None else [])
+        if orjson is None:
+            self.stdout.write(
+                'orjson is not installed , only the stdlib is measured'
+            )
+        renderer, parser = FastJSONRenderer(), FastJSONParser()
+        for size in options['sizes']:
+            data = catalog(size)
+            body = JSONRenderer().render(data)
+            self.stdout.write(f'{size} recipes , {len(body)} bytes')
+            for backend in backends:
+                with override_settings(API_JSON_BACKEND=backend):
+                    encode_ms = self.measure(
+                        lambda: renderer.render(data), options['repeat'],
+                    )
+                    decode_ms = self.measure(
+                        lambda: parser.parse(
+                            io.BytesIO(body), 'application/json', {},
+                        ),
+                        options['repeat'],
+                    )
+                self.stdout.write(
+                    f'  {backend:<8} {encode_ms:>10.1f} ms encode '
+                    f'{decode_ms:>10.1f} ms decode'
+                )
@@ -0,0 +1,141 @@
+"""
+Django command measuring logins/sec of POST /api/user/token/
+
+Logins go through Django's WSGI handler from threads , spread over
+--users users:
+    cold  every login hashes the password , the login cache is off
+    warm  the same credentials were seen recently , no hash , one query
+Each cold run uses one PASSWORD_HASHING['WORKERS'] value of --workers , so
+logins/sec per busy core (hashing workers up to the core count) shows how
+the hash scales.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from core.benchmarking import benchmark_database, latency_summary, timer
+from user.authentication import get_login_cache
+
+TOKEN_PATH = '/api/user/token/'
+PASSWORD = 'bench-pass123'
+
+
+def login_load(emails, concurrency, total):
+    """post `total` logins for `emails` in turn from `concurrency` threads ,
+    return latency_summary"""
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    counter = itertools.count()
+    latencies = []
+    lock = threading.Lock()
+
+    def start_response(status, response_headers, exc_info=None):
+        if not status.startswith('200'):
+            raise RuntimeError(f'Unexpected response {status}')
+
+    def client():
+        while (number := next(counter)) < total:
+            email = emails[number % len(emails)]
+            body = json.dumps({'email': email, 'password': PASSWORD})
+            environ = factory.post(
+                TOKEN_PATH, body, content_type='application/json',
+            ).environ
+            start = time.perf_counter()
+            response = handler(environ, start_response)
+            b''.join(response)
+            response.close()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    with timer() as elapsed:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [pool.submit(client) for _ in range(concurrency)]:
+                future.result()
+    return latency_summary(latencies, elapsed['seconds'])
+
+
+class Command(BaseCommand):
+    """Django command to benchmark logins"""
+    help = (
+        'Measure logins/sec with and without the login cache , per busy '
+        'core.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument(
+            '--requests', type=int, default=200, help='logins per run',
+        )
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4],
+            help='hashing workers of the cold runs',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='print one JSON object per run',
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            # one hash for everybody , creating the users stays quick
+            encoded = make_password(PASSWORD)
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(
+                    email=f'bench{i}@example.com', password=encoded,
+                )
+                for i in range(options['users'])
+            )
+            emails = [user.email for user in users]
+
+            for workers in options['workers']:
+                config = dict(
+                    settings.PASSWORD_HASHING,
+                    WORKERS=workers, LOGIN_CACHE_TTL=0,
+                )
+                with override_settings(PASSWORD_HASHING=config):
+                    summary = login_load(
+                        emails, options['concurrency'], options['requests'],
+                    )
+                results.append({'run': 'cold', 'workers': workers, **summary})
+
+            config = dict(
+                settings.PASSWORD_HASHING, WORKERS=max(options['workers']),
+            )
+            with override_settings(PASSWORD_HASHING=config):
+                login_load(emails, options['concurrency'], len(emails))
+                summary = login_load(
+                    emails, options['concurrency'], options['requests'],
+                )
+                summary['cache'] = get_login_cache().stats()
+            results.append({
+                'run': 'warm', 'workers': config['WORKERS'], **summary,
+            })
+
+        cores = os.cpu_count()
+        for result in results:
+            result['cores'] = cores
+            result['logins_per_second_per_core'] = (
+                result['requests_per_second'] / min(result['workers'], cores)
+            )
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                self.stdout.write(
+                    f"{result['run']:<5} workers={result['workers']:<3}"
+                    f"{result['requests_per_second']:>9.1f} logins/s"
+                    f"{result['logins_per_second_per_core']:>9.1f} per core"
+                    f"  p50 {result['p50_ms']:8.2f} ms"
+                    f"  p99 {result['p99_ms']:8.2f} ms"
+                )
@@ -0,0 +1,74 @@
+"""
+Django command to print the query plans of the hot recipe and tag queries
+
+Run it before and after migrating to compare plans , e.g.
+    python manage.py migrate core 0003 && python manage.py explain_queries
+    python manage.py migrate core && python manage.py explain_queries
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from core.models import Recipe, Tag
+from recipe.search import search_recipes
+
+
+class Command(BaseCommand):
+    """Django command to explain the per-user recipe and tag queries"""
+    help = 'Print the query plans of the per-user recipe and tag queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help=(
+                'email of the user to query for , defaults to the user with '
+                'most recipes'
+            ),
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='run the queries and report actual timings (postgres only)',
+        )
+        parser.add_argument(
+            '--search', help='also explain a ?q= search for this text',
+        )
+
+    def get_user(self, email):
+        """return the user to build the queries for"""
+        users = get_user_model().objects.all()
+        if email:
+            user = users.filter(email=email).first()
+        else:
+            users = users.annotate(recipes=Count('recipe'))
+            user = users.order_by('-recipes').first()
+        if user is None:
+            raise CommandError('No user to explain queries for.')
+        return user
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        names = list(
+            Tag.objects.filter(user=user).values_list('name', flat=True)[:20]
+        ) or ['Breakfast']
+        recipes = Recipe.objects.filter(user=user).defer('search_vector')
+        tags = Tag.objects.filter(user=user)
+        queries = [
+            ('recipe list', recipes.order_by('-id')[:51]),
+            ('tag list', tags.order_by('-name')[:101]),
+            ('tag lookup', tags.filter(name__in=names)),
+        ]
+        if options['search']:
+            queries.append(('recipe search', search_recipes(
+                recipes, options['search'],
+            ).order_by('-rank', '-id')[:51]))
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+
+        self.stdout.write(
+            f'Query plans for {user.email} on {connection.vendor}'
+        )
+        for label, queryset in queries:
+            self.stdout.write(f'\n== {label}')
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,179 @@
+"""
+Django command to import recipes from an NDJSON or CSV file
+
+The file is streamed , rows are validated with the recipe serializer rules
+and written in batches with bulk inserts , one transaction per batch.
+After every batch the position in the file is saved to a checkpoint file ,
+so an interrupted import resumes where it stopped when run again.
+
+NDJSON rows are recipe objects , CSV rows have one column per recipe field
+and a `tags` column of '|' separated names , the same as the export.
+"""
+import csv
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from recipe.bulk import RecipeBulkWriter
+from recipe.caching import bump_version
+from recipe.serializers import RecipeSerializer
+
+
+def read_ndjson(path, position):
+    """yield (byte offset after the line , line) from `position` on"""
+    with open(path, 'rb') as file:
+        file.seek(position)
+        for line in file:
+            position += len(line)
+            if line.strip():
+                yield position, line
+
+
+def parse_ndjson(line):
+    """return the recipe data of an NDJSON line"""
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError('Expected a JSON object.')
+    tags = row.get('tags', [])
+    # tag names or tag objects , the objects are checked by the serializer
+    if not isinstance(tags, list) or not all(
+        isinstance(tag, (str, dict)) for tag in tags
+    ):
+        raise ValidationError({'tags': ['Expected a list of tag names.']})
+    row['tags'] = [
+        tag if isinstance(tag, dict) else {'name': tag} for tag in tags
+    ]
+    return row
+
+
+def read_csv(path, position):
+    """yield (row number , row) for the rows after row number `position`"""
+    with open(path, newline='') as file:
+        for number, row in enumerate(csv.DictReader(file), 1):
+            if number > position:
+                yield number, row
+
+
+def parse_csv(row):
+    """return the recipe data of a CSV row"""
+    tags = row.pop('tags', None) or ''
+    row['tags'] = [{'name': name} for name in tags.split('|') if name]
+    return row
+
+
+FORMATS = {
+    'ndjson': (read_ndjson, parse_ndjson),
+    'csv': (read_csv, parse_csv),
+}
+
+
+def batches(rows, size):
+    """group an iterable into lists of at most `size` items"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    """Django command to stream recipes from a file into the database"""
+    help = 'Import recipes for a user from an NDJSON or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--user', required=True, help='email of the owner of the recipes',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help='file format , guessed from the extension by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='checkpoint file , <path>.checkpoint by default',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='ignore an existing checkpoint and import from the start',
+        )
+
+    def load_checkpoint(self, path, file_format, restart):
+        """return the saved progress for the file , or a fresh one"""
+        fresh = {
+            'format': file_format, 'position': 0, 'rows': 0, 'imported': 0,
+            'errors': 0,
+        }
+        if restart or not os.path.exists(path):
+            return fresh
+        with open(path) as file:
+            checkpoint = json.load(file)
+        if checkpoint.get('format') != file_format:
+            raise CommandError(
+                f'Checkpoint {path} is for another format , use --restart.'
+            )
+        self.stdout.write(f"Resuming after row {checkpoint['rows']}")
+        return checkpoint
+
+    def save_checkpoint(self, path, checkpoint):
+        """write the progress atomically , a crash never leaves half a file"""
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(f'{path}.tmp', path)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if path.endswith('.csv') else 'ndjson'
+        read, parse = FORMATS[file_format]
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        checkpoint = self.load_checkpoint(
+            checkpoint_path, file_format, options['restart'],
+        )
+
+        writer = RecipeBulkWriter(user, options['batch_size'])
+        # one serializer for every row , its fields are only built once
+        serializer = RecipeSerializer(context={})
+        start, imported = time.monotonic(), 0
+        rows = read(path, checkpoint['position'])
+        for batch in batches(rows, options['batch_size']):
+            valid = []
+            for position, raw in batch:
+                checkpoint['rows'] += 1
+                try:
+                    data = serializer.run_validation(parse(raw))
+                    valid.append((checkpoint['rows'], data))
+                except (ValidationError, ValueError) as error:
+                    checkpoint['errors'] += 1
+                    detail = getattr(error, 'detail', error)
+                    self.stderr.write(f"row {checkpoint['rows']}: {detail}")
+            if valid:
+                with transaction.atomic():
+                    writer.create_validated(valid)
+            imported += len(valid)
+            checkpoint['imported'] += len(valid)
+            checkpoint['position'] = batch[-1][0]
+            self.save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = max(time.monotonic() - start, 1e-9)
+            self.stdout.write(
+                f"rows {checkpoint['rows']} imported {checkpoint['imported']} "
+                f"errors {checkpoint['errors']} "
+                f"{imported / elapsed:.0f} rows/sec"
+            )
+        bump_version(user.pk)
+        self.stdout.write(f"Done , {checkpoint['imported']} recipes imported.")
@@ -10,14 +10,22 @@
     Django command to wait for the database to be avaiable 
 
 """
-from django.core.management.base import BaseCommand # which has check method to check database
+from django.core.management.base import BaseCommand, CommandError # which has check method to check database
 import time
+from django.db import connections
 from psycopg2 import OperationalError as Psycopg2OpError
 from django.db.utils import OperationalError # django throws when db is not ready and app tries to connect 
 
 
 class Command(BaseCommand):
     """Django command to wait for databse"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='open the connection pool and run SELECT 1 on every pooled connection',
+        )
+
     # when call_command is called , this method is the one which executes
     def handle(self,*args, **kwargs):
         """ method call command 
@@ -31,4 +39,33 @@ class Command(BaseCommand):
             except (Psycopg2OpError, OperationalError):
                 self.stdout.write("Database unavaiable and waiting 1 second")
                 time.sleep(1)
-        self.stdout.write("Data base avaiable !!")
\ No newline at end of file
+        self.stdout.write("Data base avaiable !!")
+        if kwargs.get('warm'):
+            self.warm(connections['default'])
+
+    def warm(self, connection):
+        """open the pool's connections , or the persistent one , and run
+        SELECT 1 on each"""
+        connection.ensure_connection()
+        if not connection.is_usable():
+            raise CommandError('Database connection does not answer.')
+        pool = connection.warm_pool() if hasattr(connection, 'warm_pool') else None
+        if pool is None:
+            self.stdout.write('Connection ready , pooling is off.')
+            return
+        errors = pool.check()
+        for number, error in enumerate(errors, 1):
+            if error is not None:
+                self.stdout.write(f'Pooled connection {number} does not answer: {error}')
+        failed = len([error for error in errors if error is not None])
+        if failed:
+            raise CommandError(f'{failed} of {len(errors)} pooled connections do not answer.')
+        stats = pool.stats()
+        if stats['size'] < stats['min_size']:
+            raise CommandError(
+                f"Pool holds {stats['size']} connections , {stats['min_size']} expected."
+            )
+        self.stdout.write(
+            f"Pool warm: {stats['size']} connections ({stats['idle']} idle , "
+            f"max {stats['max_size']})."
+        )
\ No newline at end of file
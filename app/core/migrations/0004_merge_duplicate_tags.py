@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Keep the oldest tag for each (user, name) and move the recipes of
+    its duplicates onto it"""
+    Tag = apps.get_model('core', 'Tag')
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeTag = Recipe.tags.through
+
+    duplicates = (
+        Tag.objects.values('user_id', 'name')
+        .annotate(keep_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        tag_ids = list(
+            Tag.objects.filter(user_id=duplicate['user_id'], name=duplicate['name'])
+            .exclude(id=keep_id)
+            .values_list('id', flat=True)
+        )
+        recipe_ids = (
+            RecipeTag.objects.filter(tag_id__in=tag_ids)
+            .values_list('recipe_id', flat=True)
+            .distinct()
+        )
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe_id=recipe_id, tag_id=keep_id) for recipe_id in recipe_ids],
+            ignore_conflicts=True,
+        )
+        Tag.objects.filter(id__in=tag_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_auto_20221011_1712'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_tag_recipes(apps, schema_editor):
+    """set recipe_count of every tag from the recipe/tag table in one update"""
+    Recipe = apps.get_model('core', 'Recipe')
+    Tag = apps.get_model('core', 'Tag')
+    RecipeTag = Recipe.tags.through
+    counts = (
+        RecipeTag.objects.filter(tag_id=OuterRef('id'))
+        .values('tag_id').annotate(count=Count('id')).values('count')
+    )
+    Tag.objects.using(schema_editor.connection.alias).update(
+        recipe_count=Coalesce(Subquery(counts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tag_recipes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_tag_user_count_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def log_existing_rows(apps, schema_editor):
+    """one change per existing recipe and tag , so a first sync sees them ,
+    txid 0 sorts them before every later change"""
+    connection = schema_editor.connection
+    change_table = connection.ops.quote_name(apps.get_model('core', 'Change')._meta.db_table)
+    for name in ['recipe', 'tag']:
+        table = connection.ops.quote_name(apps.get_model('core', name)._meta.db_table)
+        schema_editor.execute(
+            f'INSERT INTO {change_table} (user_id, model, object_id, deleted, txid, changed_at) '
+            f'SELECT user_id, %s, id, %s, 0, updated_at FROM {table} ORDER BY id',
+            [name, False],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_tag_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('txid', models.BigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'model', 'txid', 'seq'], name='core_change_user_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['user', 'model', 'changed_at'], name='core_change_user_deleted_idx'),
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,12 @@ Database Models
 from unittest.util import _MAX_LENGTH
 from django.conf import settings
 from multiprocessing.sharedctypes import Value
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, router, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
@@ -42,7 +47,116 @@ class User(AbstractBaseUser,PermissionsMixin):
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
-class Recipe(models.Model):
+
+def recipe_search_vector(title, description):
+    """tsvector expression of a recipe's text , title words weigh more than
+    description words , it is built from values so inserts can use it too"""
+    config = settings.RECIPE_SEARCH_CONFIG
+    title = models.Value(title, output_field=models.TextField())
+    description = models.Value(description, output_field=models.TextField())
+    return (
+        SearchVector(title, weight='A', config=config)
+        + SearchVector(description, weight='B', config=config)
+    )
+
+
+class VersionedQuerySet(models.QuerySet):
+
+    def _write_db(self):
+        return self._db or router.db_for_write(self.model)
+
+    def touch(self, **fields):
+        """update the rows , bumping their version and updated_at"""
+        using = self._write_db()
+        with transaction.atomic(using=using, savepoint=False):
+            Change.objects.using(using).record_query(self)
+            return self.update(
+                version=F('version') + 1, updated_at=timezone.now(), **fields,
+            )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        using = self._write_db()
+        with transaction.atomic(using=using, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # rows skipped with ignore_conflicts=True come back without an id
+            # , their callers log the rows they look up afterwards
+            Change.objects.using(using).record(self.model, [
+                (obj.pk, obj.user_id) for obj in objs if obj.pk is not None
+            ])
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        using = self._write_db()
+        with transaction.atomic(using=using, savepoint=False):
+            super().bulk_update(objs, fields, batch_size=batch_size)
+            Change.objects.using(using).record(
+                self.model, [(obj.pk, obj.user_id) for obj in objs],
+            )
+
+    def delete(self):
+        """delete the rows , leaving a tombstone of each in the change log"""
+        using = self._write_db()
+        with transaction.atomic(using=using, savepoint=False):
+            Change.objects.using(using).record_query(self, deleted=True)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class VersionedModel(models.Model):
+    """Row with a version and last change time , the validators of the
+    ETag and Last-Modified headers of the API , see recipe.caching
+
+    save() bumps them on updates , queryset updates go through touch() and
+    bulk_update() callers set them with bump_version(). Every write , delete
+    included , is also logged in Change for the sync endpoints."""
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = VersionedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def bump_version(self):
+        """mark the instance as changed , the database does the increment"""
+        self.version = F('version') + 1
+        self.updated_at = timezone.now()
+
+    def save(self, *args, **kwargs):
+        """save the row , an update bumps its version"""
+        if not self._state.adding:
+            self.bump_version()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'version', 'updated_at',
+                }
+        using = kwargs.get('using')
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            Change.objects.using(using).record(
+                type(self), [(self.pk, self.user_id)],
+            )
+        if not isinstance(self.version, int):
+            # read the new version back , concurrent updates each get their own
+            self.refresh_from_db(using=self._state.db, fields=['version'])
+
+    def delete(self, using=None, keep_parents=False):
+        """delete the row , leaving a tombstone in the change log"""
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            Change.objects.using(using).record(
+                type(self), [(self.pk, self.user_id)], deleted=True,
+            )
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class Recipe(VersionedModel):
     """Recipe object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -54,17 +168,190 @@ class Recipe(models.Model):
     price = models.DecimalField(max_digits=5,decimal_places=2)
     link = models.CharField(max_length=255,blank=True)
     tags = models.ManyToManyField('Tag')
+    # maintained by save() and the bulk write paths , Postgres only
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # recipe list : filter by user , newest first
+            models.Index(
+                fields=['user', '-id'], name='core_recipe_user_id_idx',
+            ),
+            # ?price_min= / ?price_max= and ?time_min= / ?time_max= ranges
+            models.Index(
+                fields=['user', 'price'], name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes'],
+                name='core_recipe_user_time_idx',
+            ),
+            # ?q= full-text search , only created on Postgres
+            GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+            # count and last change of the user's recipes , the list validators
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title # id we dont specify this it will return just ID of the Recipe , when we call str(Recipe)
 
-class Tag(models.Model):
+    def set_search_vector(self, using=None):
+        """set search_vector from the title and description , the database
+        computes it in the next insert or update , return False when the
+        database has no full-text search"""
+        using = using or router.db_for_write(Recipe, instance=self)
+        if connections[using].vendor != 'postgresql':
+            return False
+        self.search_vector = recipe_search_vector(self.title, self.description)
+        return True
+
+    def save(self, *args, **kwargs):
+        """save the recipe , keeping search_vector in step with its text"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.set_search_vector(kwargs.get('using'))
+        elif {'title', 'description'} & set(update_fields):
+            if self.set_search_vector(kwargs.get('using')):
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+
+class Tag(VersionedModel):
     """Tag object"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete = models.CASCADE,
     )
+    # number of recipes with this tag , maintained by recipe.counters
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # popular tags : the user's tags by usage
+            models.Index(
+                fields=['user', '-recipe_count'],
+                name='core_tag_user_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_tag_user_updated_idx',
+            ),
+        ]
+        constraints = [
+            # one tag per name for each user , its index also serves tag
+            # lookups by (user, name) and the tag list ordered by name
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='core_tag_unique_user_name',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ChangeQuerySet(models.QuerySet):
+
+    def _txid(self):
+        """SQL of the id of the current transaction , the change log is read
+        by transaction on Postgres , other databases run one writer at a
+        time"""
+        if connections[self.db].vendor == 'postgresql':
+            return 'txid_current()'
+        return '0'
+
+    def record(self, model, rows, deleted=False):
+        """log a change of the (id , user_id) rows of a versioned model"""
+        if not rows:
+            return
+        txid = RawSQL(self._txid(), [], output_field=models.BigIntegerField())
+        now = timezone.now()
+        self.bulk_create([
+            Change(
+                user_id=user_id, model=model._meta.model_name,
+                object_id=object_id, deleted=deleted, txid=txid,
+                changed_at=now,
+            )
+            for object_id, user_id in rows
+        ])
+
+    def record_query(self, queryset, deleted=False):
+        """log a change of every row of a versioned model's queryset with one
+        INSERT ... SELECT , no rows are loaded"""
+        connection = connections[self.db]
+        query = queryset.order_by().values_list('id', 'user_id').query
+        sql, params = query.get_compiler(connection=connection).as_sql()
+        table = connection.ops.quote_name(Change._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, model, object_id, deleted, txid, changed_at) '
+                f'SELECT changed.user_id, %s, changed.id, %s, '
+                f'{self._txid()}, %s FROM ({sql}) changed',
+                [
+                    queryset.model._meta.model_name, deleted,
+                    connection.ops.adapt_datetimefield_value(timezone.now()),
+                    *params,
+                ],
+            )
+
+    def visible(self):
+        """changes no running transaction can add to anymore , so a cursor
+        never moves past a change that is not committed yet"""
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return self
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT txid_snapshot_xmin(txid_current_snapshot()) , '
+                'txid_current_if_assigned()'
+            )
+            oldest, current = cursor.fetchone()
+        visible = models.Q(txid__lt=oldest)
+        if current is not None:  # what this transaction wrote itself
+            visible |= models.Q(txid=current)
+        return self.filter(visible)
+
+    def after(self, txid, seq):
+        """changes after the cursor position (txid , seq)"""
+        return self.filter(txid__gte=txid).exclude(txid=txid, seq__lte=seq)
+
+
+class Change(models.Model):
+    """Change log of recipes and tags , one row per write of a row , read
+    by the sync endpoints in (txid , seq) order
+
+    seq orders the changes of a transaction , txid orders transactions by
+    their first write , see ChangeQuerySet.visible."""
+    seq = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,  # first column of the indexes below
+    )
+    model = models.CharField(max_length=20)  # model_name , recipe or tag
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    txid = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # sync : the user's changes of one model after a cursor
+            models.Index(
+                fields=['user', 'model', 'txid', 'seq'],
+                name='core_change_user_cursor_idx',
+            ),
+            # last delete of the user's rows , the list validators
+            models.Index(
+                fields=['user', 'model', 'changed_at'],
+                name='core_change_user_deleted_idx',
+                condition=models.Q(deleted=True),
+            ),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{'-' if self.deleted else '+'}{self.model} {self.object_id}"
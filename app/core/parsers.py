@@ -0,0 +1,37 @@
+"""
+JSON parser for the API using orjson when it is installed
+"""
+import io
+import re
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from core.renderers import FastJSONRenderer, orjson, use_orjson
+
+UTF8 = {'utf-8', 'utf8'}
+# 19 digits and more may not fit in 64 bits , orjson refuses or rounds
+# those integers to floats , the stdlib parser keeps them exact
+LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser decoding utf-8 bodies with orjson when available , numbers
+    are parsed like the stdlib parser , DecimalField reads floats through
+    their shortest repr so prices are not changed , bodies with integers
+    beyond 64 bits are left to the stdlib parser"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict or encoding.lower() not in UTF8 or not use_orjson():
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        if LONG_NUMBER.search(data):
+            return super().parse(io.BytesIO(data), media_type, parser_context)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,97 @@
+"""
+JSON renderer for the API using orjson when it is installed
+
+The output is the same as DRF's JSONRenderer (compact , utf-8 , \\u2028 and
+\\u2029 escaped) except that Decimal values are written as strings , so
+prices are never rounded through a float. settings.API_JSON_BACKEND picks
+the encoder: 'auto' (orjson if installed), 'orjson' or 'stdlib'.
+"""
+import decimal
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+from core.instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # optional , the stdlib encoder is used without it
+    orjson = None
+
+
+class DecimalJSONEncoder(encoders.JSONEncoder):
+    """DRF's encoder writing Decimal as a string instead of a float"""
+
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+def use_orjson():
+    """return True when the configured JSON backend is orjson"""
+    backend = getattr(settings, 'API_JSON_BACKEND', 'auto')
+    if backend == 'stdlib':
+        return False
+    if backend == 'orjson' and orjson is None:
+        raise ImproperlyConfigured(
+            'API_JSON_BACKEND is orjson but orjson is not installed.'
+        )
+    return orjson is not None
+
+
+if orjson is not None:
+    # datetimes go through DRF's encoder , orjson formats them differently
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    ORJSON_DEFAULT = DecimalJSONEncoder().default
+
+
+def escape_separators(ret):
+    """escape \\u2028 and \\u2029 like DRF , so the output stays a strict
+    javascript subset"""
+    ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+    return ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def dumps(data):
+    """encode data to compact utf-8 JSON bytes with the configured backend"""
+    if use_orjson():
+        try:
+            return escape_separators(orjson.dumps(
+                data, default=ORJSON_DEFAULT, option=ORJSON_OPTIONS,
+            ))
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits , the stdlib encoder handles them
+            pass
+    return escape_separators(json.dumps(
+        data, cls=DecimalJSONEncoder, ensure_ascii=False,
+        allow_nan=False, separators=(',', ':'),
+    ).encode())
+
+
+def iter_json_array(chunks):
+    """yield a JSON array piece by piece from an iterable of lists of items ,
+    only one chunk is encoded and held in memory at a time"""
+    opening = b'['
+    for chunk in chunks:
+        if chunk:
+            yield opening + b','.join(dumps(item) for item in chunk)
+            opening = b','
+    yield b'[]' if opening == b'[' else b']'
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer encoding with orjson when available , pretty printed
+    output (?indent= or the browsable API) still uses the stdlib encoder"""
+    encoder_class = DecimalJSONEncoder
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (data is None or not self.compact or self.ensure_ascii
+                or indent is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
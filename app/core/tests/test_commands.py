@@ -1,7 +1,14 @@
 """
 Test custom Django management commands.
 """
-from django.test import SimpleTestCase
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2OpError
 from django.core.management import call_command
@@ -45,4 +52,119 @@ class CommandTests(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
 
         patched_check.assert_called_with(databases = ['default'])
-        
\ No newline at end of file
+
+
+class ExplainQueriesCommandTests(TestCase):
+    """Test the explain_queries command"""
+
+    def test_explain_queries(self):
+        """test a plan is printed for each hot query"""
+        user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        output = out.getvalue()
+        self.assertIn(user.email, output)
+        for label in ['recipe list', 'tag list', 'tag lookup']:
+            self.assertIn(f'== {label}', output)
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'pass123')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_file(self, name, content):
+        """write a file in the temporary directory and return its path"""
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def import_file(self, path, **options):
+        """run the command quietly and return its error output"""
+        err = StringIO()
+        call_command(
+            'import_recipes', path, user=self.user.email,
+            stdout=StringIO(), stderr=err, **options
+        )
+        return err.getvalue()
+
+    def test_import_ndjson(self):
+        """test valid rows are imported with their tags and invalid ones reported"""
+        rows = [
+            {'title': 'Soup', 'time_minutes': 10, 'price': '5.50', 'tags': [{'name': 'Vegan'}]},
+            {'title': 'Bad', 'time_minutes': 'soon', 'price': '1.00'},
+            {'title': 'Salad', 'time_minutes': 5, 'price': '3.00', 'tags': ['Vegan', 'Lunch']},
+        ]
+        path = self.write_file('recipes.ndjson', '\n'.join(json.dumps(row) for row in rows))
+
+        errors = self.import_file(path, batch_size=2)
+
+        self.assertIn('row 2', errors)
+        recipes = self.user.recipe_set.order_by('id')
+        self.assertEqual([recipe.title for recipe in recipes], ['Soup', 'Salad'])
+        self.assertEqual(
+            sorted(recipes[1].tags.values_list('name', flat=True)), ['Lunch', 'Vegan'],
+        )
+        self.assertEqual(self.user.tag_set.count(), 2)
+
+    def test_import_invalid_tags(self):
+        """test tags that are not a list of names are row errors , a string
+        is not split into one tag per character"""
+        rows = [
+            {'title': 'Null', 'time_minutes': 10, 'price': '1.00', 'tags': None},
+            {'title': 'String', 'time_minutes': 10, 'price': '1.00', 'tags': 'vegan'},
+            {'title': 'Number', 'time_minutes': 10, 'price': '1.00', 'tags': [1]},
+            {'title': 'Soup', 'time_minutes': 10, 'price': '1.00', 'tags': ['Vegan']},
+        ]
+        path = self.write_file('recipes.ndjson', '\n'.join(json.dumps(row) for row in rows))
+
+        errors = self.import_file(path)
+
+        lines = errors.splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines], ['row 1', 'row 2', 'row 3'])
+        for line in lines:
+            self.assertIn('Expected a list of tag names.', line)
+        self.assertEqual(list(self.user.recipe_set.values_list('title', flat=True)), ['Soup'])
+        self.assertEqual(list(self.user.tag_set.values_list('name', flat=True)), ['Vegan'])
+
+    def test_import_csv(self):
+        """test CSV rows with '|' separated tags are imported"""
+        path = self.write_file(
+            'recipes.csv',
+            'title,description,link,time_minutes,price,tags\n'
+            'Soup,Hot soup,,10,5.50,Vegan|Dinner\n',
+        )
+
+        self.import_file(path)
+
+        recipe = self.user.recipe_set.get()
+        self.assertEqual(recipe.description, 'Hot soup')
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)), ['Dinner', 'Vegan'],
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """test running the command again only imports rows added since"""
+        row = {'title': 'Soup', 'time_minutes': 10, 'price': '5.50'}
+        path = self.write_file('recipes.ndjson', json.dumps(row) + '\n')
+        self.import_file(path)
+        with open(path, 'a') as file:
+            file.write(json.dumps(dict(row, title='Salad')) + '\n')
+
+        self.import_file(path)
+
+        titles = sorted(self.user.recipe_set.values_list('title', flat=True))
+        self.assertEqual(titles, ['Salad', 'Soup'])
+        with open(f'{path}.checkpoint') as file:
+            self.assertEqual(json.load(file)['imported'], 2)
+
+    def test_import_unknown_user(self):
+        """test importing for a user that does not exist fails"""
+        path = self.write_file('recipes.ndjson', '')
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody@example.com')
+
@@ -0,0 +1,278 @@
+"""
+Tests for the connection pool , the database backend and its metrics
+"""
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+import psycopg2.extensions
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS,
+)
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+HEALTH_DB_URL = reverse('health-db')
+
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, query):
+        if self.connection.broken:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.connection.info.transaction_status = TRANSACTION_STATUS_INTRANS
+
+    def fetchone(self):
+        return (1,)
+
+
+class FakeConnection:
+    """stand-in for a psycopg2 connection"""
+
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.rollbacks = 0
+        self.broken = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the in-process connection pool"""
+
+    def test_connections_reused(self):
+        """test a released connection is handed out again"""
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+
+        self.assertIs(pool.acquire(FakeConnection), first)
+        stats = pool.stats()
+        self.assertEqual(
+            (stats['created'], stats['acquired'], stats['in_use']), (1, 2, 1),
+        )
+
+    def test_transaction_rolled_back_on_release(self):
+        """test an open transaction is rolled back and a broken
+        connection discarded"""
+        pool = ConnectionPool(max_size=2)
+        open_transaction = pool.acquire(FakeConnection)
+        open_transaction.info.transaction_status = TRANSACTION_STATUS_INTRANS
+        broken = pool.acquire(FakeConnection)
+
+        pool.release(open_transaction)
+        pool.release(broken, discard=True)
+
+        self.assertEqual(open_transaction.rollbacks, 1)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_wait_and_timeout(self):
+        """test acquire waits for a release and times out when none comes"""
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        held = pool.acquire(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, [held]).start()
+        self.assertIs(pool.acquire(FakeConnection), held)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (2, 1))
+
+    def test_failed_connect_frees_slot(self):
+        """test a connect error does not use up a slot"""
+        pool = ConnectionPool(max_size=1)
+
+        def fail():
+            raise psycopg2.OperationalError('down')
+
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.acquire(fail)
+
+        self.assertEqual(pool.stats()['size'], 0)
+        pool.acquire(FakeConnection)
+
+    def test_warm(self):
+        """test warm opens min_size idle connections"""
+        pool = ConnectionPool(min_size=3, max_size=5)
+
+        self.assertEqual(pool.warm(FakeConnection), 3)
+        self.assertEqual(pool.warm(FakeConnection), 0)
+
+        self.assertEqual(pool.stats()['idle'], 3)
+        pool.close()
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_check(self):
+        """test check queries every idle connection and closes the broken
+        ones"""
+        pool = ConnectionPool(min_size=3, max_size=5)
+        pool.warm(FakeConnection)
+        broken = pool._idle[1]
+        broken.broken = True
+
+        errors = pool.check()
+
+        self.assertEqual(errors, [None, 'server closed the connection', None])
+        self.assertTrue(broken.closed)
+        stats = pool.stats()
+        self.assertEqual(
+            (stats['size'], stats['idle'], stats['discarded']), (2, 2, 1),
+        )
+        self.assertTrue(all(
+            connection.rollbacks == 1 for connection in pool._idle
+        ))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL backend')
+class BackendTests(SimpleTestCase):
+    """Test the pooled and health checked PostgreSQL backend"""
+
+    def wrapper(self, **settings):
+        """return a private connection to the test database"""
+        default = connections['default']
+        db = type(default)(
+            dict(default.settings_dict, **settings), alias='backend-test',
+        )
+        self.addCleanup(db.close)
+        return db
+
+    def backend_pid(self, db):
+        """return the server process id of a connection"""
+        with db.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_pooled_connection_reused(self):
+        """test a closed connection goes back to the pool for the next one"""
+        settings = {'POOL': {'MIN_SIZE': 0, 'MAX_SIZE': 2, 'TIMEOUT': 1}}
+        first = self.wrapper(**settings)
+        pid = self.backend_pid(first)
+        pool = first.get_pool()
+        self.addCleanup(pool.close)
+        first.close()
+
+        second = self.wrapper(**settings)
+
+        self.assertEqual(self.backend_pid(second), pid)
+        self.assertTrue(second.pool_reused)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_warm_pool_checked(self):
+        """test check finds a pooled connection killed after warming"""
+        # other parameters , pools are shared by connection parameters
+        db = self.wrapper(
+            POOL={'MIN_SIZE': 2, 'MAX_SIZE': 2, 'TIMEOUT': 1},
+            OPTIONS={'application_name': 'warm-test'},
+        )
+        pool = db.warm_pool()
+        self.addCleanup(pool.close)
+        killer = self.wrapper()
+        with killer.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)',
+                [pool._idle[0].info.backend_pid],
+            )
+
+        errors = pool.check()
+
+        self.assertEqual(errors[1:], [None])
+        self.assertIsNotNone(errors[0])
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_health_check_reconnects(self):
+        """test a connection killed between requests is replaced"""
+        db = self.wrapper(CONN_HEALTH_CHECKS=True, CONN_MAX_AGE=60)
+        pid = self.backend_pid(db)
+        killer = self.wrapper()
+        with killer.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        db.close_if_unusable_or_obsolete()  # request boundary
+
+        self.assertNotEqual(self.backend_pid(db), pid)
+
+    def test_dead_connection_without_health_check(self):
+        """test the same kill fails the query when checks are off"""
+        db = self.wrapper(CONN_HEALTH_CHECKS=False, CONN_MAX_AGE=60)
+        pid = self.backend_pid(db)
+        killer = self.wrapper()
+        with killer.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        db.close_if_unusable_or_obsolete()
+
+        with self.assertRaises(OperationalError):
+            self.backend_pid(db)
+
+
+class DatabaseStatsApiTests(TestCase):
+    """Test the database metrics endpoint and wait_for_db --warm"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_admin_only(self):
+        """test the metrics need a staff user"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(HEALTH_DB_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_database_stats(self):
+        """test the connection settings of each database are listed"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'pass123',
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(HEALTH_DB_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['default']['vendor'], connection.vendor)
+        self.assertIn('pool', res.data['default'])
+
+    def test_wait_for_db_warm(self):
+        """test --warm checks the connection answers"""
+        out = StringIO()
+
+        call_command('wait_for_db', warm=True, stdout=out)
+
+        self.assertIn('Connection ready', out.getvalue())
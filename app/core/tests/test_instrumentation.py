@@ -0,0 +1,157 @@
+"""
+Tests for the request instrumentation middleware and the metrics endpoint
+"""
+import asyncio
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import path, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.instrumentation import RequestMetrics, _current, histograms, timed
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+async def slow_view(request):
+    """stand in for an async view waiting on I/O"""
+    await asyncio.sleep(0.3)
+    return HttpResponse('ok')
+
+
+# URLconf of AsgiConcurrencyTests
+urlpatterns = [path('slow/', slow_view)]
+
+
+def sampling(rate):
+    """override the sample rate"""
+    return override_settings(
+        INSTRUMENTATION=dict(settings.INSTRUMENTATION, SAMPLE_RATE=rate),
+    )
+
+
+class TimedTests(SimpleTestCase):
+    """Test the timing hooks"""
+
+    def test_nested_calls_counted_once(self):
+        """test a timed function calling itself is timed once , and nothing
+        is recorded outside a sampled request"""
+        calls = []
+
+        @timed('serializer')
+        def serialize(depth):
+            calls.append(depth)
+            return serialize(depth - 1) if depth else 0
+
+        serialize(2)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            serialize(2)
+        finally:
+            _current.reset(token)
+
+        self.assertEqual(len(calls), 6)
+        self.assertGreater(metrics.times['serializer'], 0)
+        self.assertEqual(metrics.active, set())
+
+
+class InstrumentationApiTests(TestCase):
+    """Test sampled requests are measured and exported"""
+
+    def setUp(self):
+        cache.clear()
+        histograms.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+    def test_server_timing(self):
+        """test a sampled response reports its db , serializer and render
+        time"""
+        with sampling(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res['Server-Timing']
+        stages = ['total;dur=', 'db;dur=', 'serializer;dur=', 'render;dur=']
+        for stage in stages:
+            self.assertIn(stage, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_not_sampled(self):
+        """test requests outside the sample are left alone"""
+        with sampling(0):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(histograms.snapshot(), {})
+
+    def test_metrics_endpoint(self):
+        """test the histograms are served to admins in the Prometheus format"""
+        with sampling(1):
+            self.client.get(RECIPES_URL)
+            self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'pass123',
+        )
+        self.client.force_authenticate(admin)
+        with sampling(0):
+            res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            res['Content-Type'].startswith('text/plain; version=0.0.4'),
+        )
+        body = res.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', body)
+        labels = 'view="RecipeViewSet",action="list"'
+        for line in [
+            f'api_request_duration_seconds_count{{{labels}}} 2',
+            f'api_request_db_queries_bucket{{{labels},le="+Inf"}} 2',
+            f'api_response_bytes_count{{{labels}}} 2',
+        ]:
+            self.assertIn(line, body)
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    INSTRUMENTATION=dict(settings.INSTRUMENTATION, SAMPLE_RATE=1.0),
+)
+class AsgiConcurrencyTests(SimpleTestCase):
+    """Test the middleware stack keeps async views concurrent under ASGI"""
+
+    async def test_concurrent_requests_overlap(self):
+        """test six requests of 0.3s take about 0.3s , not 1.8s"""
+        client = AsyncClient()
+        start = time.perf_counter()
+
+        responses = await asyncio.gather(
+            *[client.get('/slow/') for _ in range(6)]
+        )
+
+        self.assertLess(time.perf_counter() - start, 1.0)
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('total;dur=', response['Server-Timing'])
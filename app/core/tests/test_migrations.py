@@ -0,0 +1,52 @@
+"""
+Tests for data migrations
+"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateTagsMigrationTests(TransactionTestCase):
+    """Test duplicate tags are merged before the unique constraint is added"""
+    migrate_from = [('core', '0003_auto_20221011_1712')]
+    migrate_to = [('core', '0005_recipe_tag_indexes')]
+
+    def migrate(self, targets):
+        """migrate the database to `targets` and return the historical apps"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_tags_merged(self):
+        """test recipes of duplicate tags move to the oldest tag"""
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+        user = User.objects.create(email='user@example.com')
+        other_user = User.objects.create(email='other@example.com')
+        kept = Tag.objects.create(user=user, name='Vegan')
+        duplicate = Tag.objects.create(user=user, name='Vegan')
+        other = Tag.objects.create(user=other_user, name='Vegan')
+        recipe_defaults = {'user': user, 'time_minutes': 5, 'price': '1.00'}
+        both = Recipe.objects.create(title='both', **recipe_defaults)
+        both.tags.add(kept, duplicate)
+        only_duplicate = Recipe.objects.create(title='dup', **recipe_defaults)
+        only_duplicate.tags.add(duplicate)
+
+        apps = self.migrate(self.migrate_to)
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('id', flat=True)),
+            sorted([kept.id, other.id]),
+        )
+        for recipe_id in [both.id, only_duplicate.id]:
+            recipe = Recipe.objects.get(id=recipe_id)
+            tag_ids = list(recipe.tags.values_list('id', flat=True))
+            self.assertEqual(tag_ids, [kept.id])
@@ -1,6 +1,7 @@
 """
 Test for models.
 """
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model # to check user model we have this , but for other we have to import models from core
 from decimal import Decimal
@@ -64,4 +65,13 @@ class ModelTests(TestCase):
         tag = models.Tag.objects.create(
             user = user, name = 'Tag1'
         )
-        self.assertEqual(str(tag),tag.name)
\ No newline at end of file
+        self.assertEqual(str(tag),tag.name)
+
+    def test_tag_name_unique_per_user(self):
+        """test a user cannot have two tags with the same name"""
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Tag1')
+        models.Tag.objects.create(user=other_user, name='Tag1')
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Tag1')
@@ -0,0 +1,111 @@
+"""
+Tests for the JSON renderer and parser
+"""
+import datetime
+import io
+from decimal import Decimal
+from unittest import skipIf
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer, dumps, iter_json_array
+
+SAMPLE = {
+    'id': 1,
+    'title': 'Crème brûlée   "quoted"',
+    'price': Decimal('12345678901234567890.10'),
+    'time_minutes': 30,
+    'rating': 4.5,
+    'link': None,
+    'published': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+    'tags': [{'id': 2, 'name': 'Vegan'}],
+    3: True,
+}
+
+
+@skipIf(renderers.orjson is None, 'orjson is not installed')
+class FastJSONRendererTests(SimpleTestCase):
+    """Test the renderer gives the same output with either backend"""
+
+    def render(self, backend, data=SAMPLE, media_type=None):
+        with override_settings(API_JSON_BACKEND=backend):
+            return FastJSONRenderer().render(data, media_type, {})
+
+    def test_backends_render_identically(self):
+        """test orjson and stdlib output are the same bytes"""
+        self.assertEqual(self.render('orjson'), self.render('stdlib'))
+
+    def test_same_as_drf_renderer_without_decimals(self):
+        """test the output matches DRF's renderer when there are no decimals"""
+        data = dict(SAMPLE, price='5.50')
+
+        self.assertEqual(
+            self.render('orjson', data), JSONRenderer().render(data),
+        )
+
+    def test_decimal_is_lossless(self):
+        """test Decimal values are written as exact strings"""
+        self.assertIn(
+            b'"price":"12345678901234567890.10"', self.render('orjson'),
+        )
+
+    def test_line_separators_escaped(self):
+        """test \\u2028 is escaped like DRF does"""
+        self.assertIn(b'\\u2028', self.render('orjson'))
+
+    def test_indent_uses_stdlib(self):
+        """test pretty printing still works"""
+        ret = self.render('orjson', media_type='application/json; indent=2')
+
+        self.assertIn(b'\n  "id": 1', ret)
+
+    def test_large_integers_fall_back(self):
+        """test integers orjson cannot encode are still rendered"""
+        self.assertEqual(
+            self.render('orjson', {'n': 2 ** 70}), b'{"n":%d}' % 2 ** 70,
+        )
+
+    def test_iter_json_array(self):
+        """test arrays are streamed chunk by chunk"""
+        pieces = list(iter_json_array([[{'a': 1}, {'a': 2}], [], [{'a': 3}]]))
+
+        self.assertEqual(pieces, [b'[{"a":1},{"a":2}', b',{"a":3}', b']'])
+        self.assertEqual(list(iter_json_array([])), [b'[]'])
+        self.assertEqual(dumps([]), b'[]')
+
+
+@skipIf(renderers.orjson is None, 'orjson is not installed')
+class FastJSONParserTests(SimpleTestCase):
+    """Test the parser"""
+
+    def parse(self, body, backend='orjson'):
+        with override_settings(API_JSON_BACKEND=backend):
+            return FastJSONParser().parse(
+                io.BytesIO(body), 'application/json', {},
+            )
+
+    def test_backends_parse_identically(self):
+        """test orjson and stdlib parse to the same data"""
+        body = (
+            '{"title":"Crème","price":"5.50","time_minutes":3,"x":1.1}'
+        ).encode()
+
+        self.assertEqual(self.parse(body), self.parse(body, 'stdlib'))
+
+    def test_large_integers_fall_back(self):
+        """test integers beyond 64 bits are parsed exactly , like stdlib"""
+        for number in [2 ** 64, -2 ** 63 - 1, 10 ** 30]:
+            body = b'{"id":%d,"title":"Cr\xc3\xa8me"}' % number
+            self.assertEqual(
+                self.parse(body), {'id': number, 'title': 'Crème'},
+            )
+
+    def test_invalid_json(self):
+        """test invalid bodies and NaN raise a parse error"""
+        for body in [b'{', b'', b'{"price": NaN}']:
+            with self.assertRaises(ParseError):
+                self.parse(body)
@@ -0,0 +1,134 @@
+"""
+Tests for routing API reads to a read replica
+
+The replica is a second test database with rows of its own , so a response
+shows which database it was read from. It is configured by
+app.settings_test , run them with
+`manage.py test --settings=app.settings_test`.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db.replicas import ReplicaRouter, replica_reads, reset_lags
+from core.models import Recipe
+from user.authentication import get_token_cache
+
+REPLICA = 'replica'
+RECIPES_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+# the replica of app.settings_test , the test runner also creates the
+# databases of skipped tests so they are only named when it exists
+HAS_REPLICA = REPLICA in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, 'needs the replica database of app.settings_test')
+@override_settings(
+    DATABASE_REPLICAS=dict(settings.DATABASE_REPLICAS, ALIASES=[REPLICA]),
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test safe reads go to the replica and writers read their writes"""
+    databases = {'default', REPLICA} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        reset_lags()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123', name='Primary',
+        )
+        # the token is only on the primary , as if it had not replicated yet
+        self.token = Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Primary soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.user.name = 'Replica'
+        self.user.save(using=REPLICA)
+        Recipe.objects.using(REPLICA).create(
+            user=self.user, title='Replica soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def titles(self, client=None):
+        """return the recipe titles listed for the user"""
+        res = (client or self.client).get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(recipe['title'] for recipe in res.data['results'])
+
+    def test_reads_from_replica(self):
+        """test a GET lists the replica's rows , the token missing there is
+        found on the primary"""
+        self.assertEqual(self.titles(), ['Replica soup'])
+
+    def test_write_pins_to_primary(self):
+        """test after a write the client reads from the primary , by cookie
+        and by token"""
+        payload = {'title': 'New soup', 'time_minutes': 5, 'price': '2.00'}
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn('db_primary', res.cookies)
+
+        self.assertEqual(self.titles(), ['New soup', 'Primary soup'])
+
+        other_client = APIClient()  # same token , no cookie
+        other_client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(
+            self.titles(other_client), ['New soup', 'Primary soup'],
+        )
+
+    def test_replica_read_not_cached(self):
+        """test a page read from the replica after a write is not served
+        from the cache to the pinned writer"""
+        payload = {'title': 'New soup', 'time_minutes': 5, 'price': '2.00'}
+        self.client.post(RECIPES_URL, payload)
+        other_device = APIClient()  # same user , not pinned
+        other_device.force_authenticate(self.user)
+
+        self.assertEqual(self.titles(other_device), ['Replica soup'])
+
+        self.assertEqual(self.titles(), ['New soup', 'Primary soup'])
+
+    def test_lagging_replica_skipped(self):
+        """test a replica behind by more than MAX_LAG is not used"""
+        lag = settings.DATABASE_REPLICAS['MAX_LAG'] + 1
+        with patch('core.db.replicas.measure_lag', return_value=lag):
+            self.assertEqual(self.titles(), ['Primary soup'])
+
+    def test_unreachable_replica_skipped(self):
+        """test a replica failing its lag check is not used"""
+        with patch('core.db.replicas.measure_lag', side_effect=DatabaseError):
+            self.assertEqual(self.titles(), ['Primary soup'])
+
+    def test_manage_user_reads_replica(self):
+        """test the user endpoint reads the user from the replica"""
+        self.token.save(using=REPLICA)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Replica')
+
+    def test_router(self):
+        """test reads outside replica_reads and all writes use the primary"""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Recipe))
+        with replica_reads() as alias:
+            self.assertEqual(alias, REPLICA)
+            self.assertEqual(router.db_for_read(Recipe), REPLICA)
+            recipe = Recipe.objects.get()
+            self.assertEqual(recipe.title, 'Replica soup')
+            self.assertEqual(
+                router.db_for_write(Recipe, instance=recipe), 'default',
+            )
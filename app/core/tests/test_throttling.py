@@ -0,0 +1,209 @@
+"""
+Tests for the token bucket throttles and the concurrency limiter
+"""
+import asyncio
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.throttling import (
+    CacheTokenBucketStore,
+    ConcurrencyLimiter,
+    TokenBucketStore,
+    client_ident,
+    get_concurrency_limiter,
+)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+METRICS_URL = reverse('metrics')
+
+
+def rates(**params):
+    """turn throttling on with some rates overridden"""
+    return override_settings(API_THROTTLING=dict(
+        settings.API_THROTTLING, ENABLED=True,
+        RATES=dict(settings.API_THROTTLING['RATES'], **params),
+    ))
+
+
+class TokenBucketStoreTests(SimpleTestCase):
+    """Test the in-process and shared bucket stores"""
+
+    def test_burst_then_refill(self):
+        """test a bucket allows `capacity` requests at once then refills at
+        `rate`"""
+        store = TokenBucketStore(max_keys=10)
+        with patch.object(throttling.time, 'monotonic', return_value=100.0):
+            self.assertEqual(
+                [store.consume('a', 1, 2) for _ in range(2)], [0, 0],
+            )
+            self.assertAlmostEqual(store.consume('a', 1, 2), 1)
+        with patch.object(throttling.time, 'monotonic', return_value=101.0):
+            self.assertEqual(store.consume('a', 1, 2), 0)
+
+        self.assertEqual(
+            store.stats(), {'allowed': 3, 'throttled': 1, 'size': 1},
+        )
+
+    def test_least_recently_used_evicted(self):
+        """test the store keeps at most max_keys buckets"""
+        store = TokenBucketStore(max_keys=2)
+        for key in ['a', 'b', 'a', 'c']:
+            store.consume(key, 1, 5)
+
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+
+    def test_shared_store(self):
+        """test buckets kept in a Django cache are seen by every store"""
+        cache.clear()
+        first = CacheTokenBucketStore('default')
+        second = CacheTokenBucketStore('default')
+
+        self.assertEqual(first.consume('a', 0.1, 1), 0)
+        self.assertGreater(second.consume('a', 0.1, 1), 0)
+
+
+class ThrottleApiTests(TestCase):
+    """Test the throttles of the API endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @rates(recipe='2/min')
+    def test_endpoint_throttled_per_user(self):
+        """test an endpoint answers 429 past its rate , other endpoints and
+        users are not affected"""
+        for _ in range(2):
+            self.assertEqual(
+                self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK,
+            )
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        self.assertEqual(
+            self.client.get(TAGS_URL).status_code, status.HTTP_200_OK,
+        )
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK,
+        )
+
+    @rates(user='2/min')
+    def test_user_throttled_over_endpoints(self):
+        """test the user rate counts the requests to every endpoint"""
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @rates(login='1/min')
+    def test_login_throttled_per_address(self):
+        """test logins from one address are throttled"""
+        client = APIClient()
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        client.post(TOKEN_URL, payload)
+
+        res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class ConcurrencyLimitTests(TestCase):
+    """Test requests are shed once too many are in flight"""
+
+    def test_limiter(self):
+        """test the per client cap answers 429 and a full limiter 503"""
+        limiter = ConcurrencyLimiter(
+            max_requests=2, max_per_client=1, timeout=0.01,
+        )
+        self.assertIsNone(limiter.enter('a'))
+        self.assertEqual(limiter.enter('a'), 429)
+        self.assertIsNone(limiter.enter('b'))
+        self.assertEqual(limiter.enter('c'), 503)
+        limiter.leave('a')
+        self.assertIsNone(limiter.enter('c'))
+
+        self.assertEqual(
+            limiter.stats(), {'in_flight': 2, 'shed': {429: 1, 503: 1}},
+        )
+
+    def test_client_ident_hashes_token(self):
+        """test the limiter does not keep the token of a request"""
+        factory = RequestFactory()
+        request = factory.get(RECIPES_URL, HTTP_AUTHORIZATION='Token secret')
+
+        ident = client_ident(request)
+
+        self.assertNotIn('secret', ident)
+        other = factory.get('/', HTTP_AUTHORIZATION='Token secret')
+        self.assertEqual(ident, client_ident(other))
+
+    async def test_async_wait_keeps_loop_running(self):
+        """test a request waiting for a slot on the event loop lets other
+        coroutines run and gets the slot once it is given back"""
+        limiter = ConcurrencyLimiter(
+            max_requests=1, max_per_client=1, timeout=2,
+        )
+        self.assertIsNone(await limiter.aenter('a'))
+        waiting = asyncio.ensure_future(limiter.aenter('b'))
+
+        await asyncio.sleep(0.05)  # would not return while the loop is blocked
+        self.assertFalse(waiting.done())
+        limiter.leave('a')
+
+        self.assertIsNone(await waiting)
+        self.assertEqual(
+            limiter.stats(), {'in_flight': 1, 'shed': {429: 0, 503: 0}},
+        )
+
+    @override_settings(API_CONCURRENCY=dict(
+        settings.API_CONCURRENCY, ENABLED=True, MAX_REQUESTS=1,
+        QUEUE_TIMEOUT=0.01,
+    ))
+    def test_busy_process_sheds_requests(self):
+        """test requests get 503 while the process is full , health and
+        metrics endpoints still answer"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'pass123',
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        limiter = get_concurrency_limiter()
+        limiter.enter('other client')
+        try:
+            res = client.get(RECIPES_URL)
+            metrics = client.get(METRICS_URL)
+        finally:
+            limiter.leave('other client')
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+        self.assertEqual(metrics.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'api_requests_shed_total{code="503"} 1', metrics.content.decode(),
+        )
+        self.assertEqual(
+            client.get(RECIPES_URL).status_code, status.HTTP_200_OK,
+        )
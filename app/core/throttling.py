@@ -0,0 +1,399 @@
+"""
+Rate limiting and admission control for the API
+
+Throttles are token buckets: a bucket holds up to N tokens for a rate of
+'N/period' in settings.API_THROTTLING['RATES'] , refills at N per period
+and every request takes one. A checked bucket costs one dict lookup in
+TokenBucketStore , an LRU of at most MAX_KEYS buckets , or one cache get
+and set in CacheTokenBucketStore when CACHE_ALIAS shares the buckets
+between processes.
+    UserTokenBucketThrottle      'user' or 'anon' , every endpoint together
+    EndpointTokenBucketThrottle  the throttle_scope of the view
+Throttled requests get 429 with Retry-After from DRF.
+
+ConcurrencyLimitMiddleware bounds the requests a process serves at once ,
+settings.API_CONCURRENCY['MAX_REQUESTS'] , so a burst waits for a free
+slot or is shed with 503 instead of piling up on Postgres. A client with
+MAX_PER_CLIENT requests in flight gets 429 for the next ones. Under ASGI a
+request waiting for a slot waits in a worker thread , the event loop keeps
+serving the others.
+"""
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """return (tokens per second , bucket size) of a rate like '100/min'"""
+    num, period = rate.split('/')
+    return int(num) / PERIODS[period[0]], int(num)
+
+
+def refill(bucket, now, rate, capacity):
+    """return the tokens of a (tokens , updated at) bucket at `now` , a
+    missing bucket is full"""
+    if bucket is None:
+        return capacity
+    return min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+
+class TokenBucketStore:
+    """In-process token buckets , key -> (tokens , updated at) , the least
+    recently used bucket is dropped past `max_keys`"""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+
+    def consume(self, key, rate, capacity):
+        """take a token from the bucket of `key` , return 0 when there was
+        one or else the seconds until there is"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = refill(bucket, now, rate, capacity)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # a dropped bucket comes back full , keep MAX_KEYS above the
+                # number of clients seen within one refill period
+                self._buckets.popitem(last=False)
+            self._count(wait)
+        return wait
+
+    def _count(self, wait):
+        if wait:
+            self.throttled += 1
+        else:
+            self.allowed += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self.allowed = self.throttled = 0
+
+    def stats(self):
+        """return the allowed/throttled counters and current size"""
+        with self._lock:
+            return {
+                'allowed': self.allowed, 'throttled': self.throttled,
+                'size': len(self._buckets),
+            }
+
+
+class CacheTokenBucketStore(TokenBucketStore):
+    """Token buckets in a Django cache shared between processes
+
+    The read and the write of a bucket are not atomic , concurrent requests
+    of one client in different processes can both get the last token , which
+    lets a client go over its rate by about the number of processes.
+    """
+
+    def __init__(self, cache_alias):
+        super().__init__(max_keys=0)
+        self.cache = caches[cache_alias]
+
+    def consume(self, key, rate, capacity):
+        now = time.time()
+        cache_key = f'throttle:{key}'
+        tokens = refill(self.cache.get(cache_key), now, rate, capacity)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        # kept until the bucket would be full again , then it can be dropped
+        self.cache.set(
+            cache_key, (tokens - 1 if wait == 0 else tokens, now),
+            capacity / rate + 1,
+        )
+        with self._lock:
+            self._count(wait)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self.allowed = self.throttled = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'allowed': self.allowed, 'throttled': self.throttled,
+                'size': None,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """return the process wide bucket store configured by
+    settings.API_THROTTLING"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = settings.API_THROTTLING
+            if config['CACHE_ALIAS']:
+                _store = CacheTokenBucketStore(config['CACHE_ALIAS'])
+            else:
+                _store = TokenBucketStore(config['MAX_KEYS'])
+    return _store
+
+
+@receiver(setting_changed)
+def reset_bucket_store(setting, **kwargs):
+    """rebuild the bucket store when its settings are overridden in tests"""
+    global _store
+    if setting == 'API_THROTTLING':
+        with _store_lock:
+            _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle taking a token from the bucket of get_scope and
+    get_ident , scopes without a rate are not throttled"""
+
+    def get_scope(self, request, view):
+        raise NotImplementedError('.get_scope() must be overridden')
+
+    def get_ident(self, request):
+        """the user for authenticated requests , the address otherwise"""
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'addr-{super().get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        config = settings.API_THROTTLING
+        scope = self.get_scope(request, view)
+        if not config['ENABLED'] or config['RATES'].get(scope) is None:
+            return True
+        rate, capacity = parse_rate(config['RATES'][scope])
+        key = f'{scope}:{self.get_ident(request)}'
+        self.delay = get_bucket_store().consume(key, rate, capacity)
+        return self.delay == 0
+
+    def wait(self):
+        return self.delay
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle every request of a user , or of an address when anonymous"""
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+
+class EndpointTokenBucketThrottle(TokenBucketThrottle):
+    """Throttle the requests of a user to the endpoint of the view's
+    throttle_scope"""
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None)
+
+
+class ConcurrencyLimiter:
+    """Bounded number of requests in flight , overall and per client"""
+
+    def __init__(self, max_requests, max_per_client, timeout):
+        self.timeout = timeout
+        self.max_per_client = max_per_client
+        self.slots = threading.BoundedSemaphore(max_requests)
+        self._lock = threading.Lock()
+        self._clients = {}  # client -> requests in flight
+        self.in_flight = 0
+        self.shed = {429: 0, 503: 0}
+
+    def enter(self, client):
+        """take a slot for `client` , return None or the status code the
+        request has to be shed with"""
+        if not self._add_client(client):
+            return 429
+        return self._admit(client, self.slots.acquire(timeout=self.timeout))
+
+    async def aenter(self, client):
+        """enter() for the event loop , a request waiting for a slot waits
+        in a worker thread"""
+        if not self._add_client(client):
+            return 429
+        acquired = self.slots.acquire(blocking=False)
+        if not acquired and self.timeout > 0:
+            acquire = sync_to_async(self.slots.acquire, thread_sensitive=False)
+            waiter = asyncio.ensure_future(acquire(timeout=self.timeout))
+            try:
+                acquired = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # the worker can still get the slot , give it back then
+                waiter.add_done_callback(
+                    lambda done: done.result() and self.slots.release()
+                )
+                with self._lock:
+                    self._leave_client(client)
+                raise
+        return self._admit(client, acquired)
+
+    def _add_client(self, client):
+        """count a request of `client` , False when it has too many in
+        flight"""
+        with self._lock:
+            if self._clients.get(client, 0) >= self.max_per_client:
+                self.shed[429] += 1
+                return False
+            self._clients[client] = self._clients.get(client, 0) + 1
+        return True
+
+    def _admit(self, client, acquired):
+        """let the request in when it got a slot , else return 503"""
+        with self._lock:
+            if not acquired:
+                self._leave_client(client)
+                self.shed[503] += 1
+                return 503
+            self.in_flight += 1
+        return None
+
+    def leave(self, client):
+        """give back the slot of a request that was let in"""
+        self.slots.release()
+        with self._lock:
+            self.in_flight -= 1
+            self._leave_client(client)
+
+    def _leave_client(self, client):
+        """the lock must be held"""
+        count = self._clients.pop(client) - 1
+        if count:
+            self._clients[client] = count
+
+    def stats(self):
+        """return the requests in flight and the shed counters"""
+        with self._lock:
+            return {'in_flight': self.in_flight, 'shed': dict(self.shed)}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_concurrency_limiter():
+    """return the process wide limiter configured by
+    settings.API_CONCURRENCY"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            config = settings.API_CONCURRENCY
+            _limiter = ConcurrencyLimiter(
+                config['MAX_REQUESTS'], config['MAX_PER_CLIENT'],
+                config['QUEUE_TIMEOUT'],
+            )
+    return _limiter
+
+
+@receiver(setting_changed)
+def reset_concurrency_limiter(setting, **kwargs):
+    """rebuild the limiter when its settings are overridden in tests"""
+    global _limiter
+    if setting == 'API_CONCURRENCY':
+        with _limiter_lock:
+            _limiter = None
+
+
+def client_ident(request):
+    """a hash of the token of the request , or its address , before
+    authentication ran , the token itself is a secret"""
+    auth = request.META.get('HTTP_AUTHORIZATION')
+    if auth:
+        return 'auth-' + hashlib.sha256(auth.encode()).hexdigest()
+    return 'addr-' + str(request.META.get('REMOTE_ADDR'))
+
+
+class ConcurrencyLimitMiddleware:
+    """Shed requests once the process serves API_CONCURRENCY['MAX_REQUESTS']
+    requests , paths in EXEMPT_PATHS are always let in
+
+    Sync and async capable , like MiddlewareMixin , so under ASGI it does not
+    move every request onto the one thread Django runs sync code on."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # lets Django call it as a coroutine function , see MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def exempt(self, request):
+        config = settings.API_CONCURRENCY
+        if not config['ENABLED']:
+            return True
+        return request.path.startswith(tuple(config['EXEMPT_PATHS']))
+
+    def shed_response(self, shed):
+        if shed == 429:
+            detail = 'Too many requests in flight.'
+        else:
+            detail = 'Server busy , try again shortly.'
+        response = JsonResponse({'detail': detail}, status=shed)
+        response['Retry-After'] = str(settings.API_CONCURRENCY['RETRY_AFTER'])
+        return response
+
+    def release(self, limiter, client, response):
+        """give the slot back once the response is done with it"""
+        if response.streaming:
+            # a streamed export still reads from the database , the slot is
+            # given back when the server closes the response
+            response._resource_closers.append(
+                functools.partial(limiter.leave, client)
+            )
+        else:
+            limiter.leave(client)
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if self.exempt(request):
+            return self.get_response(request)
+
+        limiter = get_concurrency_limiter()
+        client = client_ident(request)
+        shed = limiter.enter(client)
+        if shed is not None:
+            return self.shed_response(shed)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            limiter.leave(client)
+            raise
+        return self.release(limiter, client, response)
+
+    async def __acall__(self, request):
+        if self.exempt(request):
+            return await self.get_response(request)
+
+        limiter = get_concurrency_limiter()
+        client = client_ident(request)
+        shed = await limiter.aenter(client)
+        if shed is not None:
+            return self.shed_response(shed)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            limiter.leave(client)
+            raise
+        return self.release(limiter, client, response)
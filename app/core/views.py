@@ -0,0 +1,160 @@
+"""
+Views for the operational endpoints
+"""
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.instrumentation import label_value, prometheus_text
+from core.throttling import get_bucket_store, get_concurrency_limiter
+from user.authentication import (
+    CachedTokenAuthentication, get_login_cache, get_token_cache,
+)
+
+# pool counter -> (metric , type , help)
+POOL_METRICS = {
+    'size': ('db_pool_connections', 'gauge', 'Open connections of the pool.'),
+    'in_use': (
+        'db_pool_connections_in_use', 'gauge', 'Connections handed out.',
+    ),
+    'created': (
+        'db_pool_connections_created_total', 'counter', 'Connections opened.',
+    ),
+    'waits': (
+        'db_pool_waits_total', 'counter',
+        'Acquires that waited for a free connection.',
+    ),
+    'wait_seconds': (
+        'db_pool_wait_seconds_total', 'counter',
+        'Time spent waiting for connections.',
+    ),
+    'timeouts': (
+        'db_pool_timeouts_total', 'counter', 'Acquires that gave up waiting.',
+    ),
+}
+
+# auth cache counter -> result label
+AUTH_CACHE_RESULTS = {
+    'hits': 'hit', 'shared_hits': 'shared_hit', 'misses': 'miss',
+}
+
+
+def database_stats():
+    """return the connection settings and pool counters of each database"""
+    stats = {}
+    for connection in connections.all():
+        settings_dict = connection.settings_dict
+        cursors = not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False)
+        pool = None
+        if hasattr(connection, 'pool_stats'):
+            pool = connection.pool_stats()
+        stats[connection.alias] = {
+            'vendor': connection.vendor,
+            'pool_mode': settings.DATABASE_POOL_MODE,
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS', False),
+            'server_side_cursors': cursors,
+            'pool': pool,
+        }
+    return stats
+
+
+def pool_metrics():
+    """return the pool counters of each database as Prometheus lines"""
+    pools = {
+        alias: database['pool']
+        for alias, database in database_stats().items()
+        if database['pool'] is not None
+    }
+    lines = []
+    for key, (name, metric_type, help_text) in POOL_METRICS.items():
+        if pools:
+            lines += [
+                f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}',
+            ]
+        for alias, stats in pools.items():
+            lines.append(
+                f'{name}{{alias="{label_value(alias)}"}} {stats[key]!r}'
+            )
+    return lines
+
+
+def admission_metrics():
+    """return the throttle and concurrency limiter counters as Prometheus
+    lines"""
+    buckets = get_bucket_store().stats()
+    limiter = get_concurrency_limiter().stats()
+    lines = [
+        '# HELP api_throttle_checks_total Token bucket checks by outcome.',
+        '# TYPE api_throttle_checks_total counter',
+        f'api_throttle_checks_total{{outcome="allowed"}} {buckets["allowed"]}',
+        f'api_throttle_checks_total{{outcome="throttled"}} '
+        f'{buckets["throttled"]}',
+        '# HELP api_requests_in_flight '
+        'Requests admitted by the concurrency limiter.',
+        '# TYPE api_requests_in_flight gauge',
+        f'api_requests_in_flight {limiter["in_flight"]}',
+        '# HELP api_requests_shed_total '
+        'Requests shed by the concurrency limiter.',
+        '# TYPE api_requests_shed_total counter',
+    ]
+    for code, count in limiter['shed'].items():
+        lines.append(f'api_requests_shed_total{{code="{code}"}} {count}')
+    return lines
+
+
+def auth_cache_metrics():
+    """return the hit and miss counters of the token and login caches as
+    Prometheus lines"""
+    lines = []
+    caches = {
+        'auth_token_cache': get_token_cache(),
+        'auth_login_cache': get_login_cache(),
+    }
+    for name, cache in caches.items():
+        stats = cache.stats()
+        lines += [
+            f'# HELP {name}_lookups_total Cache lookups by result.',
+            f'# TYPE {name}_lookups_total counter',
+        ]
+        for counter, result in AUTH_CACHE_RESULTS.items():
+            if counter in stats:
+                lines.append(
+                    f'{name}_lookups_total{{result="{result}"}} '
+                    f'{stats[counter]}'
+                )
+        lines += [
+            f'# HELP {name}_entries Entries in the local cache.',
+            f'# TYPE {name}_entries gauge',
+            f'{name}_entries {stats["size"]}',
+        ]
+    return lines
+
+
+class DatabaseStatsView(APIView):
+    """Connection and pool metrics of this process , admin users only"""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    schema = None  # operational endpoint , not part of the API docs
+
+    def get(self, request):
+        return Response(database_stats())
+
+
+class MetricsView(APIView):
+    """Request histograms , pool , admission and auth cache counters of this
+    process in the Prometheus text format , admin users only"""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    schema = None
+
+    def get(self, request):
+        return HttpResponse(
+            prometheus_text(
+                pool_metrics() + admission_metrics() + auth_cache_metrics()
+            ),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,124 @@
+"""
+Async versions of the recipe and tag read endpoints for ASGI servers
+
+Django 3.2 has no async ORM , and under ASGI it runs every sync view on one
+shared thread , so concurrent requests queue behind each other while one of
+them waits on Postgres. The views here resolve the token on the event loop
+from the in-memory token cache (a miss is looked up in a worker) and run
+the DRF viewset , queries , serialization and rendering , on a pool of
+settings.ASYNC_READ_WORKERS threads , each with its own database connection.
+Other methods on the same URLs keep the normal sync path.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from user.authentication import (
+    CachedTokenAuthentication, get_token_cache,
+)
+
+READ_METHODS = {'GET', 'HEAD'}
+# url names of the router views served by async_view
+ASYNC_READ_URL_NAMES = {
+    'recipe-list', 'recipe-detail', 'tag-list', 'tag-popular',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """return the process wide pool the read views run in"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_READ_WORKERS,
+                thread_name_prefix='async-read',
+            )
+    return _executor
+
+
+def in_worker(func, *args, **kwargs):
+    """run a sync function on the worker pool , managing the worker's
+    database connection the way a request would"""
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        get_executor(), functools.partial(context.run, call),
+    )
+
+
+async def resolve_token(request):
+    """authenticate the Token header before the view runs , a failure is
+    left to the view so 401 responses stay the same"""
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return
+    token = get_token_cache().get_local(key)
+    if token is None:
+        try:
+            authenticate = CachedTokenAuthentication().authenticate_credentials
+            user, token = await in_worker(authenticate, key)
+        except AuthenticationFailed:
+            return
+    elif not token.user.is_active:
+        return
+    # DRF's Request uses these instead of running the authentication classes
+    request._force_auth_user = token.user
+    request._force_auth_token = token
+
+
+def render_view(view, request, *args, **kwargs):
+    """call a DRF view and render its response in the same thread"""
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def async_view(view):
+    """wrap a sync DRF view , reads run on the worker pool"""
+    sync_view = sync_to_async(view)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return await sync_view(request, *args, **kwargs)
+        await resolve_token(request)
+        return await in_worker(render_view, view, request, *args, **kwargs)
+
+    # keeps csrf_exempt and the viewset attributes the schema generator reads
+    functools.update_wrapper(wrapper, view)
+    return wrapper
+
+
+def async_read_urls(urlpatterns):
+    """return the url patterns with the read endpoints served by async views"""
+    return [
+        URLPattern(
+            pattern.pattern, async_view(pattern.callback),
+            pattern.default_args, pattern.name,
+        )
+        if isinstance(pattern, URLPattern)
+        and pattern.name in ASYNC_READ_URL_NAMES
+        else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,233 @@
+"""
+Bulk create , update and delete of recipes
+
+Items are validated one by one with the recipe serializer , so every item
+gets its own result or errors , and the valid ones are written chunk by
+chunk , each chunk in its own transaction with bulk queries.
+"""
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+
+from core.models import Recipe
+from recipe.caching import bump_version
+from recipe.counters import link_tags, release_recipe_tags, unlink_tags
+from recipe.serializers import RecipeSerializer, resolve_tag_ids
+
+RecipeTag = Recipe.tags.through
+
+
+def chunked(items, size):
+    """yield successive lists of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def is_id(value):
+    """True for an int id , JSON true and false are not ids"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def id_error(index, message='A valid integer is required.'):
+    """result of an item whose id is missing , not an integer or repeated"""
+    return {'index': index, 'status': 'error', 'errors': {'id': [message]}}
+
+
+def tag_names(tags):
+    """unique tag names of serializer tag data , keeping their order"""
+    return list(dict.fromkeys(tag['name'] for tag in tags))
+
+
+class RecipeBulkWriter:
+    """Write lists of recipes for a user in chunked transactions"""
+
+    def __init__(self, user, chunk_size, context=None):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.context = context or {}
+
+    def validate(self, data, instance=None):
+        """validate one item , return (validated_data, errors)"""
+        serializer = RecipeSerializer(
+            instance, data=data, partial=instance is not None,
+            context=self.context,
+        )
+        if serializer.is_valid():
+            return serializer.validated_data, None
+        return None, serializer.errors
+
+    def run_chunks(self, pending, write, results):
+        """call `write` on each chunk of (index, ...) items in a transaction ,
+        marking every item of a chunk that fails as an error"""
+        for chunk in chunked(pending, self.chunk_size):
+            try:
+                with transaction.atomic():
+                    results.update(write(chunk))
+            except DatabaseError as error:
+                for item in chunk:
+                    results[item[0]] = {
+                        'index': item[0], 'status': 'error',
+                        'errors': {'non_field_errors': [str(error)]},
+                    }
+        if pending:
+            bump_version(self.user.pk)
+        return [results[index] for index in sorted(results)]
+
+    def add_tags(self, tags_by_recipe):
+        """link recipes to tags by name with one lookup and one insert"""
+        names = list(dict.fromkeys(
+            name for recipe_names in tags_by_recipe.values()
+            for name in recipe_names
+        ))
+        if not names:
+            return
+        tag_ids = resolve_tag_ids(self.user, names)
+        links = [
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_ids[name])
+            for recipe_id, recipe_names in tags_by_recipe.items()
+            for name in recipe_names
+        ]
+        RecipeTag.objects.bulk_create(links, ignore_conflicts=True)
+        link_tags(link.tag_id for link in links)
+
+    def create(self, items):
+        """create recipes from a list of recipe data"""
+        results, pending = {}, []
+        for index, data in enumerate(items):
+            validated, errors = self.validate(data)
+            if errors:
+                results[index] = {
+                    'index': index, 'status': 'error', 'errors': errors,
+                }
+            else:
+                pending.append((index, validated))
+        return self.run_chunks(pending, self.create_validated, results)
+
+    def create_validated(self, chunk):
+        """insert a chunk of (index, validated_data) recipes with their tags ,
+        run it inside a transaction"""
+        recipes = []
+        for index, validated in chunk:
+            fields = {k: v for k, v in validated.items() if k != 'tags'}
+            recipe = Recipe(user=self.user, **fields)
+            recipe.set_search_vector()
+            recipes.append(recipe)
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:  # the backend cannot hand back the new ids from a bulk insert
+            for recipe in recipes:
+                recipe.save()
+        self.add_tags({
+            recipe.id: tag_names(validated.get('tags', []))
+            for recipe, (index, validated) in zip(recipes, chunk)
+        })
+        return {
+            index: {'index': index, 'status': 'created', 'id': recipe.id}
+            for recipe, (index, validated) in zip(recipes, chunk)
+        }
+
+    def update(self, items):
+        """partially update recipes from a list of recipe data with ids"""
+        results, pending = {}, []
+        ids = [
+            item.get('id') if isinstance(item, dict) else None
+            for item in items
+        ]
+        instances = Recipe.objects.filter(user=self.user, id__in=[
+            recipe_id for recipe_id in ids if is_id(recipe_id)
+        ]).defer('search_vector').prefetch_related('tags').in_bulk()
+        seen = set()
+        for index, (data, recipe_id) in enumerate(zip(items, ids)):
+            if not is_id(recipe_id):
+                results[index] = id_error(index)
+                continue
+            if recipe_id in seen:
+                # the items would share one instance and its tags
+                results[index] = id_error(index, 'Duplicate id.')
+                continue
+            seen.add(recipe_id)
+            instance = instances.get(recipe_id)
+            if instance is None:
+                results[index] = {
+                    'index': index, 'status': 'error',
+                    'errors': {'id': ['Recipe not found.']},
+                }
+                continue
+            validated, errors = self.validate(data, instance)
+            if errors:
+                results[index] = {
+                    'index': index, 'status': 'error', 'errors': errors,
+                }
+            else:
+                pending.append((index, instance, validated))
+        return self.run_chunks(pending, self._update_chunk, results)
+
+    def _update_chunk(self, chunk):
+        fields = set()
+        removed, removed_tag_ids, added = Q(), [], {}
+        for index, instance, validated in chunk:
+            for attr, value in validated.items():
+                if attr == 'tags':
+                    continue
+                setattr(instance, attr, value)
+                fields.add(attr)
+            if 'tags' in validated:
+                names = tag_names(validated['tags'])
+                current = {tag.name: tag.id for tag in instance.tags.all()}
+                dropped = [
+                    tag_id for name, tag_id in current.items()
+                    if name not in names
+                ]
+                if dropped:
+                    removed |= Q(recipe_id=instance.id, tag_id__in=dropped)
+                    removed_tag_ids += dropped
+                added[instance.id] = [
+                    name for name in names if name not in current
+                ]
+        if fields & {'title', 'description'}:
+            for index, instance, validated in chunk:
+                if instance.set_search_vector():
+                    fields.add('search_vector')
+        # every item gets a new version , tag only changes included
+        for index, instance, validated in chunk:
+            instance.bump_version()
+        fields |= {'version', 'updated_at'}
+        Recipe.objects.bulk_update([item[1] for item in chunk], sorted(fields))
+        if removed:
+            RecipeTag.objects.filter(removed).delete()
+            unlink_tags(removed_tag_ids)
+        self.add_tags(added)
+        return {
+            index: {'index': index, 'status': 'updated', 'id': instance.id}
+            for index, instance, validated in chunk
+        }
+
+    def delete(self, ids):
+        """delete recipes from a list of ids"""
+        results, pending = {}, []
+        existing = set(Recipe.objects.filter(user=self.user, id__in=[
+            recipe_id for recipe_id in ids if is_id(recipe_id)
+        ]).values_list('id', flat=True))
+        seen = set()
+        for index, recipe_id in enumerate(ids):
+            if not is_id(recipe_id):
+                results[index] = id_error(index)
+            elif recipe_id in seen:
+                results[index] = id_error(index, 'Duplicate id.')
+            elif recipe_id in existing:
+                seen.add(recipe_id)
+                pending.append((index, recipe_id))
+            else:
+                results[index] = {
+                    'index': index, 'status': 'error',
+                    'errors': {'id': ['Recipe not found.']},
+                }
+        return self.run_chunks(pending, self._delete_chunk, results)
+
+    def _delete_chunk(self, chunk):
+        recipe_ids = [recipe_id for index, recipe_id in chunk]
+        release_recipe_tags(recipe_ids)
+        Recipe.objects.filter(user=self.user, id__in=recipe_ids).delete()
+        return {
+            index: {'index': index, 'status': 'deleted', 'id': recipe_id}
+            for index, recipe_id in chunk
+        }
@@ -0,0 +1,238 @@
+"""
+Response caching and conditional requests for the recipe APIs
+
+Cached responses are keyed by user and a per-user version counter. Every
+write bumps the counter , so stale responses are never read again and
+simply expire from the cache.
+
+Responses carry an ETag and Last-Modified built from the version and
+updated_at columns , see core.models.VersionedModel. They are read with one
+small query , aggregates over an index for lists , and kept with the
+cached response , so If-None-Match and If-Modified-Since are answered with
+304 before the rows are loaded. Last-Modified has second precision , it is
+only sent and compared once its second is over , a later change can not
+fall in the same second then. PUT and PATCH with If-Match get 412 when
+the object changed since the client read it.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+
+from core.db.replicas import reads_from_replica
+from core.models import Change
+
+
+def get_cache():
+    """return the cache configured by settings.RECIPE_API_CACHE"""
+    return caches[settings.RECIPE_API_CACHE['CACHE_ALIAS']]
+
+
+def version_key(user_id):
+    """cache key of the version counter of a user"""
+    return f'recipe-api:version:{user_id}'
+
+
+def get_version(user_id):
+    """return the current version of the user's recipes and tags"""
+    cache = get_cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a counter lost to eviction does not
+        # come back at a value older responses were cached under
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    """increment the version counter of a user"""
+    cache = get_cache()
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:  # counter evicted , restart it from the clock
+        cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def bump_version(user_id):
+    """invalidate the cached responses of a user after a write
+
+    Bumps now and again once the transaction commits , so a response built
+    from rows read before the commit is never cached under the new version.
+    """
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def version_etag(version):
+    """ETag of one version of an object"""
+    return f'"v{version}"'
+
+
+def settled(last_modified):
+    """return True when the second of last_modified is over , a change made
+    later in the same second would not move Last-Modified"""
+    return last_modified is not None and last_modified < int(time.time())
+
+
+def not_modified(request, etag, last_modified):
+    """return True when If-None-Match , or else If-Modified-Since , says the
+    client has the current representation"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # weak comparison , W/"x" matches "x"
+        tags = {
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(if_none_match)
+        }
+        return '*' in tags or etag in tags
+    since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''),
+    )
+    if since is None or not settled(last_modified):
+        return False
+    return last_modified <= since
+
+
+class CachedResponseMixin:
+    """Cache responses per user and answer conditional requests with 304"""
+
+    def cached_response(self, view, validators, request, *args, **kwargs):
+        """return the cached response for the request , calling `view` on a
+        miss , `validators` returns (ETag , Last-Modified timestamp or None)
+        of the response or None when the view answers with an error"""
+        version = get_version(request.user.pk)
+        # scheme and host too , the pagination links in the data are absolute
+        path = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        accept = request.META.get('HTTP_ACCEPT', '')
+        accept = hashlib.sha1(accept.encode()).hexdigest()
+        key = (
+            f'recipe-api:response:{request.user.pk}:{version}:{path}:{accept}'
+        )
+        cache = get_cache()
+        entry = cache.get(key)
+        if entry is not None:
+            data, etag, last_modified = entry
+        else:
+            # read before the rows , a write in between leaves the ETag
+            # older than the data , so it is never reused for newer data
+            current = validators(request, *args, **kwargs)
+            if current is None:
+                return view(request, *args, **kwargs)
+            data, (etag, last_modified) = None, current
+
+        if not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif data is not None:
+            response = Response(data)
+        else:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            # a lagging replica may miss the write that bumped the version ,
+            # a writer pinned to the primary would be served its old rows
+            if not reads_from_replica():
+                cache.set(
+                    key, (response.data, etag, last_modified),
+                    settings.RECIPE_API_CACHE['TIMEOUT'],
+                )
+        response['ETag'] = etag
+        if settled(last_modified):
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class CachedListMixin(CachedResponseMixin):
+    """Cache list responses , use before ListModelMixin"""
+
+    def list_validators(self, request, *args, **kwargs):
+        """the number of the user's rows and their last change or delete ,
+        aggregates over the (user , updated_at) index and the index of the
+        tombstones in the change log"""
+        rows = self.queryset.filter(user=request.user).aggregate(
+            count=Count('id'), last=Max('updated_at'),
+        )
+        deleted = Change.objects.filter(
+            user=request.user, model=self.queryset.model._meta.model_name,
+            deleted=True,
+        ).aggregate(last=Max('changed_at'))['last']
+        changes = [
+            time for time in (rows['last'], deleted) if time is not None
+        ]
+        last = max(changes).timestamp() if changes else None
+        accept = request.META.get('HTTP_ACCEPT', '')
+        seed = f'{request.user.pk}:{request.build_absolute_uri()}:{accept}'
+        seed = f"{seed}:{rows['count']}:{last}"
+        etag = '"%s"' % hashlib.sha1(seed.encode()).hexdigest()
+        return etag, None if last is None else int(last)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, self.list_validators, request, *args, **kwargs
+        )
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+    """Cache retrieve responses , use before RetrieveModelMixin"""
+
+    def retrieve_validators(self, request, *args, **kwargs):
+        """the version and last change of the object"""
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            row = self.queryset.filter(
+                user=request.user, **{self.lookup_field: lookup},
+            ).values_list('version', 'updated_at').first()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            return None
+        return version_etag(row[0]), int(row[1].timestamp())
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, self.retrieve_validators, request, *args,
+            **kwargs
+        )
+
+
+class PreconditionFailed(exceptions.APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('The object changed since it was read.')
+    default_code = 'precondition_failed'
+
+
+class ConditionalUpdateMixin:
+    """Refuse PUT and PATCH with 412 when If-Match names another version of
+    the object , use before UpdateModelMixin"""
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().update(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = version_etag(self.updated_version)
+        return response
+
+    def perform_update(self, serializer):
+        if_match = self.request.META.get('HTTP_IF_MATCH')
+        if if_match is not None:
+            # locked until the update commits , no write can slip in between
+            objects = type(serializer.instance).objects
+            version = objects.select_for_update().filter(
+                pk=serializer.instance.pk,
+            ).values_list('version', flat=True).get()
+            tags = parse_etags(if_match)
+            if '*' not in tags and version_etag(version) not in tags:
+                raise PreconditionFailed()
+        super().perform_update(serializer)
+        self.updated_version = serializer.instance.version
@@ -0,0 +1,97 @@
+"""
+Per-tag recipe counters
+
+Tag.recipe_count is kept up to date by every path that links or unlinks
+recipes and tags : the recipe serializer , the bulk writer , recipe deletes
+and the m2m add / remove / clear signals. Each change is a single UPDATE of
+all the tags it touches , which also bumps their version. The recipes of a
+tag that is renamed or deleted get a new version through
+touch_tag_recipes. `manage.py recount_tags` recomputes the counters from
+the recipe/tag table and reports the tags that had drifted.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import (
+    Case, Count, F, IntegerField, OuterRef, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Tag
+
+RecipeTag = Recipe.tags.through
+
+
+def apply_tag_deltas(deltas):
+    """add {tag_id: delta} to the tags' recipe_count with one update"""
+    by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(tag_id)
+    if not by_delta:
+        return
+    if len(by_delta) == 1:
+        (delta, tag_ids), = by_delta.items()
+        change = Value(delta)
+    else:
+        tag_ids = [tag_id for ids in by_delta.values() for tag_id in ids]
+        change = Case(
+            *[
+                When(id__in=ids, then=Value(delta))
+                for delta, ids in by_delta.items()
+            ],
+            output_field=IntegerField(),
+        )
+    Tag.objects.filter(id__in=tag_ids).touch(
+        recipe_count=F('recipe_count') + change,
+    )
+
+
+def link_tags(tag_ids):
+    """count one more recipe for every tag id in the list , repeats add up"""
+    apply_tag_deltas(Counter(tag_ids))
+
+
+def unlink_tags(tag_ids):
+    """count one recipe less for every tag id in the list , repeats add up"""
+    apply_tag_deltas({
+        tag_id: -count for tag_id, count in Counter(tag_ids).items()
+    })
+
+
+def release_recipe_tags(recipe_ids):
+    """uncount the tags of recipes that are about to be deleted"""
+    links = (
+        RecipeTag.objects.filter(recipe_id__in=recipe_ids)
+        .values('tag_id').annotate(count=Count('id'))
+        .values_list('tag_id', 'count')
+    )
+    apply_tag_deltas({tag_id: -count for tag_id, count in links})
+
+
+def touch_tag_recipes(tag_ids):
+    """bump the version of the recipes linked to the tags , their nested
+    tags are about to change"""
+    Recipe.objects.filter(
+        id__in=RecipeTag.objects.filter(tag_id__in=tag_ids).values('recipe_id')
+    ).touch()
+
+
+def recount_tags(tags=None, fix=True):
+    """compare recipe_count with the recipe/tag table , return
+    [(tag_id, stored, actual)] of the tags that differ and fix them"""
+    tags = Tag.objects.all() if tags is None else tags
+    actual = Coalesce(Subquery(
+        RecipeTag.objects.filter(tag_id=OuterRef('id'))
+        .values('tag_id').annotate(count=Count('id')).values('count')
+    ), 0)
+    drift = list(
+        tags.annotate(actual=actual)
+        .exclude(recipe_count=F('actual'))
+        .order_by('id')
+        .values_list('id', 'recipe_count', 'actual')
+    )
+    if drift and fix:
+        Tag.objects.filter(
+            id__in=[tag_id for tag_id, *counts in drift],
+        ).touch(recipe_count=actual)
+    return drift
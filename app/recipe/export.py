@@ -0,0 +1,86 @@
+"""
+Streaming export of a user's recipes as NDJSON , CSV or a JSON array
+
+Recipes are read through a server-side cursor and their tags are loaded
+with one query per chunk , so memory use does not depend on the size of
+the catalog.
+"""
+import csv
+from collections import defaultdict
+
+from core.models import Recipe
+from core.renderers import dumps, iter_json_array
+
+RecipeTag = Recipe.tags.through
+
+EXPORT_FIELDS = ['id', 'title', 'description', 'link', 'time_minutes', 'price']
+
+
+def attach_tags(rows):
+    """add the tags of each recipe row with one query for all rows"""
+    tags = defaultdict(list)
+    tag_rows = (
+        RecipeTag.objects.filter(recipe_id__in=[row['id'] for row in rows])
+        .order_by('recipe_id', 'tag_id')
+        .values_list('recipe_id', 'tag_id', 'tag__name')
+    )
+    for recipe_id, tag_id, name in tag_rows:
+        tags[recipe_id].append({'id': tag_id, 'name': name})
+    for row in rows:
+        row['price'] = str(row['price'])  # same as the API , no float rounding
+        row['tags'] = tags[row['id']]
+    return rows
+
+
+def iter_recipe_chunks(queryset, chunk_size):
+    """yield lists of at most `chunk_size` recipe rows with their tags"""
+    chunk = []
+    rows = queryset.order_by('id').values(*EXPORT_FIELDS)
+    rows = rows.iterator(chunk_size=chunk_size)
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield attach_tags(chunk)
+            chunk = []
+    if chunk:
+        yield attach_tags(chunk)
+
+
+def iter_ndjson(queryset, chunk_size):
+    """yield the recipes as newline delimited JSON , one chunk at a time"""
+    for rows in iter_recipe_chunks(queryset, chunk_size):
+        yield b''.join(dumps(row) + b'\n' for row in rows)
+
+
+def iter_json(queryset, chunk_size):
+    """yield the recipes as a single JSON array , one chunk at a time"""
+    return iter_json_array(iter_recipe_chunks(queryset, chunk_size))
+
+
+class Echo:
+    """file-like object whose write returns the value , so csv.writer can
+    produce lines without buffering them"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size):
+    """yield the recipes as CSV , tags as a '|' separated list of names"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS + ['tags'])
+    for rows in iter_recipe_chunks(queryset, chunk_size):
+        yield ''.join(
+            writer.writerow(
+                [row[field] for field in EXPORT_FIELDS]
+                + ['|'.join(tag['name'] for tag in row['tags'])]
+            )
+            for row in rows
+        )
+
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+    'json': (iter_json, 'application/json'),
+}
@@ -0,0 +1,76 @@
+"""
+Query parameter filters for the recipe list
+
+?tags=1,2 keeps recipes with any of the tag ids , add ?tags_match=all to
+keep recipes having every one of them. ?price_min= , ?price_max= ,
+?time_min= and ?time_max= are inclusive ranges on price and time_minutes.
+Tags are matched with a semi-join on the recipe/tag table , "all" with a
+single grouped subquery instead of one join per tag.
+"""
+from django.db.models import Count
+from rest_framework import serializers
+
+from core.models import Recipe
+
+RecipeTag = Recipe.tags.through
+
+FILTER_PARAMS = {
+    'tags', 'tags_match', 'price_min', 'price_max', 'time_min', 'time_max',
+}
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Validate the recipe list filter parameters"""
+    tags = serializers.CharField(required=False)
+    tags_match = serializers.ChoiceField(choices=['any', 'all'], default='any')
+    price_min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False,
+    )
+    price_max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, required=False,
+    )
+    time_min = serializers.IntegerField(required=False)
+    time_max = serializers.IntegerField(required=False)
+
+    def validate_tags(self, value):
+        """comma separated tag ids to a list of unique ints"""
+        try:
+            ids = [
+                int(tag_id) for tag_id in value.split(',') if tag_id.strip()
+            ]
+        except ValueError:
+            raise serializers.ValidationError(
+                'Enter a comma separated list of tag ids.'
+            )
+        return list(dict.fromkeys(ids))
+
+
+def filter_recipes(queryset, params):
+    """apply the filters in the query params , raise ValidationError (400)
+    when one is invalid"""
+    if not FILTER_PARAMS & set(params):
+        return queryset
+    serializer = RecipeFilterSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    filters = serializer.validated_data
+
+    tag_ids = filters.get('tags')
+    if tag_ids:
+        links = RecipeTag.objects.filter(tag_id__in=tag_ids)
+        if filters['tags_match'] == 'all':
+            links = (
+                links.values('recipe_id')
+                .annotate(matched=Count('tag_id'))
+                .filter(matched=len(tag_ids))
+            )
+        queryset = queryset.filter(id__in=links.values('recipe_id'))
+
+    ranges = {
+        'price__gte': filters.get('price_min'),
+        'price__lte': filters.get('price_max'),
+        'time_minutes__gte': filters.get('time_min'),
+        'time_minutes__lte': filters.get('time_max'),
+    }
+    return queryset.filter(**{
+        lookup: value for lookup, value in ranges.items() if value is not None
+    })
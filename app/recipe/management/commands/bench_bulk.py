@@ -0,0 +1,59 @@
+"""
+Django command to compare creating recipes one request at a time with the
+bulk endpoint
+"""
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarking import (
+    benchmark_database,
+    create_benchmark_user,
+    recipe_payloads,
+    timer,
+)
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the bulk recipe endpoint"""
+    help = 'Measure recipes/sec of single creates versus the bulk endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags-per-recipe', type=int, default=5)
+        parser.add_argument(
+            '--chunk-sizes', default='100,500,1000',
+            help='comma separated chunk sizes to try',
+        )
+
+    def report(self, label, count, seconds):
+        self.stdout.write(
+            f'{label:<24} {count:>8} recipes {seconds:>8.2f}s '
+            f'{count / seconds:>10.1f} recipes/sec'
+        )
+
+    def handle(self, *args, **options):
+        count = options['recipes']
+        payloads = recipe_payloads(count, options['tags_per_recipe'])
+        with benchmark_database():
+            client = APIClient()
+            client.force_authenticate(create_benchmark_user())
+
+            url = reverse('recipe:recipe-list')
+            with timer() as elapsed:
+                for payload in payloads:
+                    client.post(url, payload, format='json')
+            self.report('single POST', count, elapsed['seconds'])
+
+            for chunk_size in options['chunk_sizes'].split(','):
+                Recipe.objects.all().delete()
+                url = reverse('recipe:recipe-bulk')
+                with timer() as elapsed:
+                    client.post(
+                        f'{url}?chunk_size={chunk_size}', payloads,
+                        format='json',
+                    )
+                self.report(
+                    f'bulk chunk_size={chunk_size}', count, elapsed['seconds'],
+                )
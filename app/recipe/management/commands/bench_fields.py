@@ -0,0 +1,52 @@
+"""
+Django command to compare sparse (?fields=) and full recipe list responses
+"""
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarking import (
+    benchmark_database,
+    create_benchmark_user,
+    create_recipes,
+    timer,
+)
+from recipe.caching import get_cache
+
+
+class Command(BaseCommand):
+    """Django command to benchmark ?fields= on the recipe list"""
+    help = 'Measure bytes and latency of sparse versus full recipe list pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--page-size', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--fields', action='append',
+            help='?fields= value to compare , repeatable , default id,title',
+        )
+
+    def handle(self, *args, **options):
+        variants = [None] + (options['fields'] or ['id,title'])
+        with benchmark_database():
+            user = create_benchmark_user()
+            create_recipes(user, options['recipes'], tags_per_recipe=5)
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('recipe:recipe-list')
+
+            for fields in variants:
+                params = {'page_size': options['page_size']}
+                if fields:
+                    params['fields'] = fields
+                size = 0
+                with timer() as elapsed:
+                    for _ in range(options['repeat']):
+                        get_cache().clear()  # measure the uncached path
+                        size = len(client.get(url, params).content)
+                per_request = elapsed['seconds'] / options['repeat'] * 1000
+                self.stdout.write(
+                    f"{fields or 'all fields':<24} {size:>10} bytes "
+                    f"{per_request:>8.2f} ms/request"
+                )
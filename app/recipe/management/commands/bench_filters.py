@@ -0,0 +1,102 @@
+"""
+Django command to measure recipe list filters on skewed tag distributions
+"""
+import random
+import statistics
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarking import benchmark_database, create_benchmark_user, timer
+from core.models import Recipe, Tag
+from recipe.caching import get_cache
+from recipe.filters import filter_recipes
+
+
+def create_catalog(user, count, tag_count, tags_per_recipe, seed=0):
+    """insert recipes whose tags follow a zipf-like distribution , tag 0 is
+    on most recipes and the last tags on very few , return the tags"""
+    rng = random.Random(seed)
+    tags = Tag.objects.bulk_create(
+        [Tag(user=user, name=f'Tag {i}') for i in range(tag_count)]
+    )
+    weights = [1 / (rank + 1) for rank in range(tag_count)]
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            user=user, title=f'Recipe {i}',
+            time_minutes=rng.randint(5, 240),
+            price=Decimal(rng.randint(100, 99999)) / 100,
+        )
+        for i in range(count)
+    ], batch_size=5000)
+    RecipeTag = Recipe.tags.through
+    links = []
+    for recipe in recipes:
+        picked = rng.choices(range(tag_count), weights, k=tags_per_recipe)
+        for index in set(picked):
+            links.append(
+                RecipeTag(recipe_id=recipe.id, tag_id=tags[index].id)
+            )
+    RecipeTag.objects.bulk_create(links, batch_size=10000)
+    return tags
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe list filters"""
+    help = 'Measure latency and query plans of tag , price and time filters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--tags-per-recipe', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = create_benchmark_user()
+            tags = create_catalog(
+                user, options['recipes'], options['tags'],
+                options['tags_per_recipe'],
+            )
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            common, rare = tags[0].id, tags[-1].id
+            cases = [
+                ('any common tag', {'tags': f'{common}'}),
+                ('any rare tag', {'tags': f'{rare}'}),
+                ('all common+rare', {
+                    'tags': f'{common},{rare}', 'tags_match': 'all',
+                }),
+                ('all 2 common', {
+                    'tags': f'{common},{tags[1].id}', 'tags_match': 'all',
+                }),
+                ('narrow price', {'price_min': '10.00', 'price_max': '10.50'}),
+                ('narrow time', {'time_min': 30, 'time_max': 31}),
+                ('tag + price', {'tags': f'{rare}', 'price_max': '100'}),
+            ]
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('recipe:recipe-list')
+            self.stdout.write(
+                f"{options['recipes']} recipes on {connection.vendor}"
+            )
+            for label, params in cases:
+                times = []
+                for _ in range(options['repeat']):
+                    get_cache().clear()  # measure the uncached path
+                    with timer() as elapsed:
+                        client.get(url, params)
+                    times.append(elapsed['seconds'] * 1000)
+                queryset = filter_recipes(
+                    Recipe.objects.filter(user=user), params,
+                )
+                plan = queryset.order_by('-id')[:51].explain()
+                scan = 'seq scan' if 'Seq Scan' in plan else 'index'
+                self.stdout.write(
+                    f'{label:<18} p50 {statistics.median(times):>8.2f} ms '
+                    f'max {max(times):>8.2f} ms  {scan}'
+                )
@@ -0,0 +1,108 @@
+"""
+Django command to measure ?q= search latency on a large recipe catalog
+"""
+import random
+import statistics
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarking import benchmark_database, create_benchmark_user, timer
+from core.models import Recipe
+from recipe.caching import get_cache
+
+WORDS = [
+    'tomato', 'soup', 'salad', 'chicken', 'rice', 'bread', 'cheese', 'pasta',
+    'garlic', 'onion', 'lemon', 'pepper', 'potato', 'beef', 'curry', 'tofu',
+    'mushroom', 'spinach', 'pumpkin', 'saffron', 'quince', 'sorrel',
+]
+
+
+def create_catalog(user, count, seed=0):
+    """insert `count` recipes whose words follow a skewed distribution ,
+    the first words of WORDS are common and the last ones rare"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    recipes = []
+    for i in range(count):
+        title = ' '.join(rng.choices(WORDS, weights, k=3))
+        recipe = Recipe(
+            user=user, title=title.capitalize(),
+            description=' '.join(rng.choices(WORDS, weights, k=12)),
+            time_minutes=5 + i % 120, price=Decimal('9.99'),
+        )
+        recipe.set_search_vector()
+        recipes.append(recipe)
+    Recipe.objects.bulk_create(recipes, batch_size=5000)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe search"""
+    help = 'Measure latency of ?q= searches against a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--query', action='append',
+            help=(
+                'search text , repeatable , defaults to common , rare and '
+                'combined words'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        queries = options['query'] or [
+            'tomato', 'saffron', 'chicken curry', 'nothing',
+        ]
+        with benchmark_database():
+            user = create_benchmark_user()
+            with timer() as elapsed:
+                create_catalog(user, options['recipes'])
+            self.stdout.write(
+                f"{options['recipes']} recipes created in "
+                f"{elapsed['seconds']:.1f}s "
+                f'on {connection.vendor}'
+            )
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('ANALYZE core_recipe')
+
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('recipe:recipe-list')
+            for text in queries:
+                self.stdout.write(f'\n== {text!r}')
+                self.report(
+                    'search api', options['repeat'],
+                    lambda: client.get(url, {'q': text}),
+                )
+                scan = Recipe.objects.filter(user=user).defer('search_vector')
+                for word in text.split():
+                    scan = scan.filter(
+                        Q(title__icontains=word)
+                        | Q(description__icontains=word)
+                    )
+                self.report(
+                    'substring scan', options['repeat'],
+                    lambda: list(scan.order_by('-id')[:50]),
+                )
+
+    def report(self, label, repeat, func):
+        """run func `repeat` times and print p50 and p95 latency"""
+        times = []
+        for _ in range(repeat):
+            get_cache().clear()  # measure the uncached path
+            with timer() as elapsed:
+                func()
+            times.append(elapsed['seconds'] * 1000)
+        times.sort()
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        self.stdout.write(
+            f'{label:<16} p50 {statistics.median(times):>8.2f} ms  '
+            f'p95 {p95:>8.2f} ms'
+        )
@@ -0,0 +1,69 @@
+"""
+Django command to compare the DRF serializers with the fast serialization path
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.benchmarking import (
+    benchmark_database,
+    create_benchmark_user,
+    create_recipes,
+    timer,
+)
+from core.models import Recipe, Tag
+from recipe.caching import get_cache
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to benchmark FAST_SERIALIZATION"""
+    help = 'Measure rows/sec of the recipe serializer and the fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--page-size', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def report(self, name, rows, seconds):
+        self.stdout.write(f'{name:<24} {rows / seconds:>12.0f} rows/sec')
+
+    def handle(self, *args, **options):
+        count, repeat = options['recipes'], options['repeat']
+        with benchmark_database():
+            user = create_benchmark_user()
+            create_recipes(user, count, tags_per_recipe=5)
+            queryset = Recipe.objects.filter(user=user).order_by('-id')
+
+            # serialization only , rows already loaded
+            recipes = list(queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id'))
+            ))
+            with timer() as elapsed:
+                for _ in range(repeat):
+                    RecipeSerializer(recipes, many=True).data
+            self.report('serializer', count * repeat, elapsed['seconds'])
+
+            serializer = RecipeSerializer()
+            rows = list(queryset.values(*serializer.fast_columns()))
+            with timer() as elapsed:
+                for _ in range(repeat):
+                    serializer.fast_data(rows)  # includes the tag query
+            self.report('fast_data', count * repeat, elapsed['seconds'])
+
+            # full list requests , uncached
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('recipe:recipe-list')
+            for fast in (False, True):
+                fast_setting = override_settings(FAST_SERIALIZATION=fast)
+                with fast_setting, timer() as elapsed:
+                    for _ in range(repeat):
+                        get_cache().clear()
+                        client.get(url, {'page_size': options['page_size']})
+                name = 'list (fast)' if fast else 'list (serializer)'
+                self.report(
+                    name, options['page_size'] * repeat, elapsed['seconds'],
+                )
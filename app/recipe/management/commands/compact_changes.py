@@ -0,0 +1,55 @@
+"""
+Django command to drop change log entries a later change of the same row
+makes redundant
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef, Q
+
+from core.models import Change
+
+
+def compact_changes(changes=None):
+    """delete the changes of rows that changed again later , return how many
+
+    A sync returns the rows as they are now , so a cursor before a dropped
+    change still gets the row from its last change. Only committed changes
+    are seen by the delete , an entry is never dropped for a change that
+    could still roll back. Tombstones are the last change of their row and
+    are kept."""
+    changes = Change.objects.all() if changes is None else changes
+    later = Change.objects.filter(
+        Q(txid__gt=OuterRef('txid'))
+        | Q(txid=OuterRef('txid'), seq__gt=OuterRef('seq')),
+        user_id=OuterRef('user_id'), model=OuterRef('model'),
+        object_id=OuterRef('object_id'),
+    )
+    deleted, _ = changes.filter(Exists(later)).delete()
+    return deleted
+
+
+class Command(BaseCommand):
+    """Django command to compact the change log read by the sync endpoints"""
+    help = (
+        'Delete change log entries superseded by a later change of the same '
+        'recipe or tag.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='email of the user whose changes to compact',
+        )
+
+    def handle(self, *args, **options):
+        changes = Change.objects.all()
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+            changes = changes.filter(user=user)
+
+        deleted = compact_changes(changes)
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} superseded changes.')
+        )
@@ -0,0 +1,55 @@
+"""
+Django command to verify and recompute the tag recipe counters
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Tag
+from recipe.caching import bump_version
+from recipe.counters import recount_tags
+
+
+class Command(BaseCommand):
+    """Django command to recount Tag.recipe_count from the recipe/tag table"""
+    help = (
+        'Recompute the number of recipes of every tag and report drifted '
+        'counters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='email of the user whose tags to recount',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='only verify , exit with an error when a counter is wrong',
+        )
+
+    def handle(self, *args, **options):
+        tags = Tag.objects.all()
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+            tags = tags.filter(user=user)
+
+        drift = recount_tags(tags, fix=not options['check'])
+        for tag_id, stored, actual in drift:
+            self.stdout.write(
+                f'tag {tag_id}: counted {stored} , actual {actual}'
+            )
+        if options['check'] and drift:
+            raise CommandError(f'{len(drift)} tag counters are wrong.')
+        if drift:
+            for user_id in set(Tag.objects.filter(
+                id__in=[tag_id for tag_id, *counts in drift]
+            ).values_list('user_id', flat=True)):
+                bump_version(user_id)
+            self.stdout.write(
+                self.style.SUCCESS(f'Fixed {len(drift)} tag counters.')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('All tag counters are correct.')
+            )
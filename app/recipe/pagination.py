@@ -0,0 +1,40 @@
+"""
+Pagination classes for the recipe APIs
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class EndpointCursorPagination(CursorPagination):
+    """Cursor pagination whose page size and page size ceiling are read
+    from settings.API_PAGINATION[endpoint]"""
+    endpoint = None
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        config = settings.API_PAGINATION[self.endpoint]
+        self.page_size = config['PAGE_SIZE']
+        self.max_page_size = config['MAX_PAGE_SIZE']
+
+
+class RecipeCursorPagination(EndpointCursorPagination):
+    """Paginate recipes newest first , search results best rank first"""
+    endpoint = 'recipes'
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        if 'rank' in queryset.query.annotations:
+            # equal ranks are told apart by the offset stored in the cursor
+            return ('-rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class TagCursorPagination(EndpointCursorPagination):
+    """Paginate tags by name , unique for each user , popular tags by usage"""
+    endpoint = 'tags'
+    ordering = '-name'
+
+    def get_ordering(self, request, queryset, view):
+        if getattr(view, 'action', None) == 'popular':
+            return ('-recipe_count', '-id')
+        return super().get_ordering(request, queryset, view)
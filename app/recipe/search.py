@@ -0,0 +1,52 @@
+"""
+Full-text search over recipe titles and descriptions
+
+On Postgres recipes are matched against the GIN indexed search_vector
+column and ranked with ts_rank , title words weigh more than description
+words. Other databases , e.g. sqlite for local tests , fall back to
+case-insensitive substring matching with a title first rank.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+
+# ranks are stored as integers so cursor positions compare exactly
+RANK_SCALE = 1000000
+
+
+def search_recipes(queryset, text):
+    """filter the recipes matching the search text , annotated with an
+    integer `rank` , higher is better"""
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(
+            text, search_type='websearch',
+            config=settings.RECIPE_SEARCH_CONFIG,
+        )
+        scale = Value(RANK_SCALE, output_field=FloatField())
+        rank = SearchRank(F('search_vector'), query) * scale
+        return queryset.filter(search_vector=query).annotate(
+            rank=Cast(rank, IntegerField()),
+        )
+
+    rank = Value(0)
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+        )
+        rank = rank + Case(
+            When(title__icontains=term, then=Value(2)), default=Value(1),
+        )
+    return queryset.annotate(
+        rank=ExpressionWrapper(rank, output_field=IntegerField()),
+    )
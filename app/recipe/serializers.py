@@ -1,18 +1,180 @@
 """"
 serializers for recipe APIs
 """
+import decimal
+from collections import defaultdict
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core.instrumentation import TimedSerializerMixin, timed
+from core.models import Change, Recipe, Tag
+from recipe.caching import bump_version
+from recipe.counters import link_tags, touch_tag_recipes, unlink_tags
+
+
+def resolve_tag_ids(user, names):
+    """return {name: id} of the user's tags with these names , creating
+    missing ones"""
+    tags = Tag.objects.filter(user=user, name__in=names)
+    # one lookup for the tags the user already has
+    tag_ids = dict(tags.values_list('name', 'id'))
+    missing = [
+        Tag(user=user, name=name) for name in names if name not in tag_ids
+    ]
+    if missing:
+        # one insert for the rest , a tag created by a concurrent request
+        # in between is skipped here and picked up by the lookup below
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        tag_ids = dict(tags.values_list('name', 'id'))
+        # the insert could not hand back the new ids , log them from here
+        Change.objects.record(
+            Tag, [(tag_ids[tag.name], user.pk) for tag in missing],
+        )
+    return tag_ids
+
+
+def requested_fields(request):
+    """return the set of field names listed in ?fields= on a read request ,
+    or None when every field should be returned"""
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    return names | {'id'}
+
+
+class DynamicFieldsMixin:
+    """Serialize only the fields asked for with ?fields= ,
+    e.g. ?fields=id,title"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # nested serializers get their context only when bound , they keep
+        # every field
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+def fast_converter(field):
+    """return a function giving the same output as field.to_representation
+    for a non null database value , cheaper for the common field types"""
+    if type(field) is serializers.DecimalField:
+        coerce = getattr(
+            field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING,
+        )
+        if coerce and not field.localize and field.decimal_places is not None:
+            exponent = decimal.Decimal('.1') ** field.decimal_places
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+            rounding = field.rounding
+            return lambda value: '{:f}'.format(
+                value.quantize(exponent, rounding=rounding, context=context)
+            )
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.IntegerField:
+        return int
+    return field.to_representation
+
+
+FAST_PLANS = {}
+
 
-from core.models import Recipe, Tag
+class FastSerializerMixin:
+    """Opt-in fast path for read-only lists , builds the same output as
+    to_representation from .values() rows through a converter per field
+    instead of running the DRF field machinery for every value"""
 
-class TagSerialzer(serializers.ModelSerializer):
+    def fast_plan(self):
+        """return [(field name , converter)] for the current fields ,
+        nested serializers get a None converter"""
+        key = (type(self), tuple(self.fields))
+        plan = FAST_PLANS.get(key)
+        if plan is None:
+            plan = [
+                (name, None if isinstance(field, serializers.BaseSerializer)
+                 else fast_converter(field))
+                for name, field in self.fields.items()
+            ]
+            FAST_PLANS[key] = plan
+        return plan
+
+    def fast_columns(self):
+        """database columns to select with .values()"""
+        return [
+            name for name, convert in self.fast_plan() if convert is not None
+        ]
+
+    def fast_nested(self, rows):
+        """return {field name: {row id: representation}} for nested fields"""
+        return {}
+
+    @timed('serializer')
+    def fast_data(self, rows):
+        """return the representation of .values() rows"""
+        plan = self.fast_plan()
+        nested = self.fast_nested(rows)
+        data = []
+        for row in rows:
+            item = {}
+            for name, convert in plan:
+                if convert is None:
+                    item[name] = nested[name][row['id']]
+                else:
+                    value = row[name]
+                    item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
+
+
+class TagSerialzer(DynamicFieldsMixin, FastSerializerMixin,
+                   TimedSerializerMixin, serializers.ModelSerializer):
     """ Serializer for tags ."""
     class Meta:
         model = Tag
         fields = ['id','name']
         read_only_fields = ['id']
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def validate_name(self, value):
+        """reject renaming a tag to a name the user already has"""
+        # nested in a recipe , existing names are reused there
+        if self.parent is not None:
+            return value
+        user = self.context['request'].user
+        tags = Tag.objects.filter(user=user, name=value)
+        if self.instance is not None:
+            tags = tags.exclude(id=self.instance.id)
+        if tags.exists():
+            raise serializers.ValidationError(
+                'tag with this name already exists.'
+            )
+        return value
+
+    def update(self, instance, validated_data):
+        """update tag and invalidate the cached responses of its user"""
+        if validated_data.get('name', instance.name) != instance.name:
+            # the recipes show the tag name
+            touch_tag_recipes([instance.id])
+        tag = super().update(instance, validated_data)
+        bump_version(tag.user_id)
+        return tag
+
+
+class TagUsageSerializer(TagSerialzer):
+    """Serializer for tags with the number of recipes using them"""
+    class Meta(TagSerialzer.Meta):
+        fields = TagSerialzer.Meta.fields + ['recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class RecipeSerializer(DynamicFieldsMixin, FastSerializerMixin,
+                       TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerialzer(many=True, required=False) # by default this nested serializer is read only , add custom code below create()
 
@@ -21,17 +183,60 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ['id','title','description','link','time_minutes','price','tags']
         read_only_fields = ['id']
     
+    def fast_nested(self, rows):
+        """tags of the recipe rows with one query , ordered by id like the
+        prefetch"""
+        if 'tags' not in self.fields:
+            return {}
+        tag_rows = defaultdict(list)
+        links = (
+            Recipe.tags.through.objects
+            .filter(recipe_id__in=[row['id'] for row in rows])
+            .order_by('tag_id')
+            .values_list('recipe_id', 'tag_id', 'tag__name')
+        )
+        for recipe_id, tag_id, name in links:
+            tag_rows[recipe_id].append({'id': tag_id, 'name': name})
+        child = self.fields['tags'].child
+        return {'tags': {
+            row['id']: child.fast_data(tag_rows[row['id']]) for row in rows
+        }}
+
     def _get_or_create_tags(self,tags, recipe):
         """handle getting or creating tags as needed."""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            # get_or_create get tag if ecists if not it creates 
-            tag_obj,created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag # in future if they pass more  than name or else name = tag['name']
-            )
-            recipe.tags.add(tag_obj)
+        # unique names , keeping the order sent
+        names = list(dict.fromkeys(tag['name'] for tag in tags))
+        if not names:
+            return
+        tag_ids = resolve_tag_ids(self.context['request'].user, names)
+        # one insert into the recipe/tag through table
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe_id=recipe.id, tag_id=tag_ids[name])
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+        link_tags(tag_ids[name] for name in names)
 
+    def _set_tags(self, tags, recipe):
+        """make the recipe tags match the sent tags , writing only what
+        changed"""
+        names = list(dict.fromkeys(tag['name'] for tag in tags))
+        # uses the tags prefetched by the view when there are any
+        current = {tag.name: tag.id for tag in recipe.tags.all()}
+        removed = [
+            tag_id for name, tag_id in current.items() if name not in names
+        ]
+        added = [{'name': name} for name in names if name not in current]
+        if removed:
+            Recipe.tags.through.objects.filter(
+                recipe_id=recipe.id, tag_id__in=removed
+            ).delete()
+            unlink_tags(removed)
+        if added:
+            self._get_or_create_tags(added, recipe)
 
     def create(self, validated_data):
         """Create a Recipe"""
@@ -39,6 +244,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         auth_user = self.context['request'].user # to get user in serialzer use context , but in views u can get self.user
         self._get_or_create_tags(tags,recipe)
+        bump_version(recipe.user_id)
         return recipe
         #summary:1.remove sent tags 2. create recipe with out tags 
         # 3. create or get tags with that method and passing tags data which popped from validated data
@@ -49,11 +255,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         """update recipe."""
         tags = validated_data.pop('tags',None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_tags(tags, instance)
         for attr,value in validated_data.items():
             setattr(instance,attr,value)
         instance.save()
+        bump_version(instance.user_id)
         return instance
 
 
@@ -61,5 +267,3 @@ class RecipeDetailSerializer(RecipeSerializer): # as this is a extension for Rec
     """Serializer for recipe details """
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ['description']
-
-
@@ -0,0 +1,60 @@
+"""
+Signal handlers keeping the tag recipe counters and the recipe versions in
+sync with recipe.tags changes made through the m2m manager , e.g. in the
+admin or a shell
+
+The API and bulk paths write the recipe/tag table directly and update the
+counters themselves , see recipe.counters.
+"""
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.models import Recipe
+from recipe.counters import (
+    RecipeTag,
+    apply_tag_deltas,
+    link_tags,
+    touch_tag_recipes,
+    unlink_tags,
+)
+
+
+def existing_links(instance, reverse, pk_set=None):
+    """recipe/tag rows of the instance , limited to pk_set when given"""
+    if reverse:  # instance is a tag , pk_set holds recipe ids
+        links = RecipeTag.objects.filter(tag_id=instance.pk)
+        if pk_set is not None:
+            links = links.filter(recipe_id__in=pk_set)
+    else:
+        links = RecipeTag.objects.filter(recipe_id=instance.pk)
+        if pk_set is not None:
+            links = links.filter(tag_id__in=pk_set)
+    return links.values_list('tag_id', flat=True)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def count_recipe_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """update the tag counters when recipe tags are added , removed or
+    cleared"""
+    if action == 'post_add':
+        # pk_set only holds the links that were actually created
+        if reverse:
+            apply_tag_deltas({instance.pk: len(pk_set)})
+        else:
+            link_tags(pk_set)
+    elif action == 'pre_remove':
+        unlink_tags(existing_links(instance, reverse, pk_set))
+    elif action == 'pre_clear':
+        unlink_tags(existing_links(instance, reverse))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    """bump the version of the recipes whose tags change"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.filter(pk=instance.pk).touch()
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(pk__in=pk_set).touch()
+    elif action == 'pre_clear':
+        touch_tag_recipes([instance.pk])
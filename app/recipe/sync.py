@@ -0,0 +1,85 @@
+"""
+Delta sync of recipes and tags for offline clients
+
+GET /api/recipe/recipes/sync/?cursor=<cursor> returns the recipes created
+or updated since the cursor and the ids of the ones deleted , with the
+cursor to send next time , tags the same under /tags/sync/. Without a
+cursor every change is returned , a full download to start from.
+
+It reads core.models.Change , the change log every write path appends to ,
+through its (user , model , txid , seq) index , so a sync costs one index
+range scan over the changes since the cursor and one lookup of the rows
+they name , whatever the size of the catalog. A row changed several times
+is returned once , as it is now. `more` is true when there are more
+changes than page_size , ask again with the new cursor.
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.models import Change
+
+
+def parse_cursor(value):
+    """return the (txid , seq) of a cursor , (0 , 0) before every change"""
+    if not value:
+        return 0, 0
+    try:
+        txid, seq = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise serializers.ValidationError({'cursor': ['Invalid cursor.']})
+    return txid, seq
+
+
+def format_cursor(txid, seq):
+    return f'{txid}-{seq}'
+
+
+class SyncMixin:
+    """Add a sync action to a viewset of a versioned model"""
+
+    def get_sync_page_size(self):
+        """page size from ?page_size= , capped by
+        settings.API_PAGINATION['sync']"""
+        config = settings.API_PAGINATION['sync']
+        try:
+            page_size = int(self.request.query_params['page_size'])
+        except (KeyError, ValueError):
+            return config['PAGE_SIZE']
+        return max(1, min(page_size, config['MAX_PAGE_SIZE']))
+
+    @action(detail=False, methods=['get'], url_path='sync')
+    def sync(self, request):
+        """return the rows changed and the ids of the rows deleted since
+        ?cursor= , and the cursor of the last change returned"""
+        txid, seq = parse_cursor(request.query_params.get('cursor'))
+        page_size = self.get_sync_page_size()
+        model = self.queryset.model._meta.model_name
+        changes = list(
+            Change.objects.filter(user=request.user, model=model)
+            .after(txid, seq).visible()
+            .order_by('txid', 'seq')
+            .values_list('txid', 'seq', 'object_id')[:page_size + 1]
+        )
+        more = len(changes) > page_size
+        changes = changes[:page_size]
+        # last change first , each row once
+        object_ids = list(dict.fromkeys(
+            object_id for *position, object_id in reversed(changes)
+        ))
+        rows = self.get_queryset().in_bulk(object_ids)
+        if changes:
+            txid, seq = changes[-1][:2]
+        return Response({
+            'cursor': format_cursor(txid, seq),
+            'more': more,
+            'results': self.get_serializer([
+                rows[object_id] for object_id in object_ids
+                if object_id in rows
+            ], many=True).data,
+            # deleted since , or deleted after the change that was logged
+            'deleted': [
+                object_id for object_id in object_ids if object_id not in rows
+            ],
+        })
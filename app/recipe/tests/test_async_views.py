@@ -0,0 +1,149 @@
+"""
+Tests for the async recipe and tag read views
+"""
+import asyncio
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TransactionTestCase
+from django.test.client import AsyncRequestFactory
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, Tag
+from recipe import views
+from recipe.async_views import async_read_urls, async_view, resolve_token
+from recipe.urls import router
+from user.authentication import get_token_cache
+
+recipe_list = views.RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+recipe_detail = views.RecipeViewSet.as_view({'get': 'retrieve'})
+tag_list = views.TagViewSet.as_view({'get': 'list'})
+
+
+class AsyncReadViewTests(TransactionTestCase):
+    """Test the async views answer like the sync ones"""
+
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        # AsyncRequestFactory takes raw header names
+        self.auth = {'authorization': f'Token {self.token.key}'}
+
+    async def call(self, view, path, method='get', auth=True, **kwargs):
+        """return the response of the async version of a view"""
+        cache.clear()
+        headers = self.auth if auth else {}
+        request = getattr(AsyncRequestFactory(), method)(path, **headers)
+        return await async_view(view)(request, **kwargs)
+
+    def call_sync(self, view, path, **kwargs):
+        """return the rendered response of the sync view"""
+        cache.clear()
+        request = RequestFactory().get(
+            path, HTTP_AUTHORIZATION=self.auth['authorization'],
+        )
+        response = view(request, **kwargs)
+        return response.render()
+
+    async def test_list_and_retrieve_match_sync(self):
+        """test list , retrieve and tag list return the same bodies"""
+        cases = [
+            (recipe_list, '/api/recipe/recipes/', {}),
+            (
+                recipe_detail, f'/api/recipe/recipes/{self.recipe.id}/',
+                {'pk': self.recipe.id},
+            ),
+            (tag_list, '/api/recipe/tags/', {}),
+        ]
+        for view, path, kwargs in cases:
+            res = await self.call(view, path, **kwargs)
+            call_sync = sync_to_async(self.call_sync)
+            expected = await call_sync(view, path, **kwargs)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.content, expected.content)
+
+    async def test_other_users_recipe_not_found(self):
+        """test retrieving another user's recipe is a 404"""
+        create_user = sync_to_async(get_user_model().objects.create_user)
+        other = await create_user('other@example.com', 'pass123')
+        recipe = await sync_to_async(Recipe.objects.create)(
+            user=other, title='Other', time_minutes=5, price=Decimal('1.00'),
+        )
+
+        res = await self.call(
+            recipe_detail, f'/api/recipe/recipes/{recipe.id}/', pk=recipe.id,
+        )
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_authentication_required(self):
+        """test missing and invalid tokens get the usual 401"""
+        res = await self.call(recipe_list, '/api/recipe/recipes/', auth=False)
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+        self.auth = {'authorization': 'Token invalid'}
+        res = await self.call(recipe_list, '/api/recipe/recipes/')
+        self.assertEqual(res.status_code, 401)
+        self.assertIn('Invalid token', json.loads(res.content)['detail'])
+
+    async def test_cached_token_resolved_without_queries(self):
+        """test a token in the local cache is resolved on the event loop
+        without a database query"""
+        # caches the token
+        await self.call(recipe_list, '/api/recipe/recipes/')
+        request = AsyncRequestFactory().get(
+            '/api/recipe/recipes/', **self.auth,
+        )
+
+        before = get_token_cache().stats()
+
+        # the database cannot be used from the event loop , this would raise
+        await resolve_token(request)
+
+        after = get_token_cache().stats()
+        self.assertEqual(after['hits'], before['hits'] + 1)
+        self.assertEqual(after['misses'], before['misses'])
+        self.assertEqual(request._force_auth_user.pk, self.user.pk)
+
+    async def test_writes_use_sync_path(self):
+        """test other methods still reach the viewset"""
+        request = AsyncRequestFactory().post(
+            '/api/recipe/recipes/',
+            {'title': 'Salad', 'time_minutes': 5, 'price': '2.00'},
+            content_type='application/json', **self.auth,
+        )
+
+        res = await async_view(recipe_list)(request)
+
+        self.assertEqual(res.status_code, 201)
+        exists = sync_to_async(Recipe.objects.filter(title='Salad').exists)
+        self.assertTrue(await exists())
+
+    def test_async_read_urls(self):
+        """test only the read endpoints are swapped for async views"""
+        patterns = {
+            pattern.name: pattern for pattern in async_read_urls(router.urls)
+        }
+
+        def is_async(name):
+            return asyncio.iscoroutinefunction(patterns[name].callback)
+
+        reads = ['recipe-list', 'recipe-detail', 'tag-list', 'tag-popular']
+        for name in reads:
+            self.assertTrue(is_async(name), name)
+        for name in ['recipe-bulk', 'recipe-export', 'tag-detail']:
+            self.assertFalse(is_async(name), name)
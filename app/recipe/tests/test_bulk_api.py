@@ -0,0 +1,222 @@
+"""
+Tests for the bulk recipe API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.counters import recount_tags
+
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_payload(title, **params):
+    """return the payload of a recipe"""
+    payload = {'title': title, 'time_minutes': 10, 'price': '5.00'}
+    payload.update(params)
+    return payload
+
+
+def statuses(res):
+    """return the status of every item of a bulk response"""
+    return [item['status'] for item in res.data['results']]
+
+
+def create_recipe(user, title='Soup'):
+    """create and return a recipe"""
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=Decimal('5.00'),
+    )
+
+
+class BulkRecipeApiTests(TestCase):
+    """Test creating , updating and deleting recipes in bulk"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """test recipes and their tags are created with a result per item"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        payload = [
+            recipe_payload(
+                'Soup', tags=[{'name': 'Vegan'}, {'name': 'Dinner'}],
+            ),
+            recipe_payload('Bad', price='not a price'),
+            recipe_payload('Salad', tags=[{'name': 'Vegan'}]),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual(statuses(res), ['created', 'error', 'created'])
+        self.assertIn('price', results[1]['errors'])
+        soup = Recipe.objects.get(id=results[0]['id'])
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        salad = Recipe.objects.get(id=results[2]['id'])
+        self.assertEqual(
+            list(salad.tags.values_list('name', flat=True)), ['Vegan'],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_queries_bounded(self):
+        """test the number of queries depends on chunks , not items"""
+        def count(size):
+            payload = [
+                recipe_payload(
+                    f'Recipe {size}-{i}', tags=[{'name': f'Tag {i}'}],
+                )
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(BULK_URL, payload, format='json')
+            return len(ctx.captured_queries)
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.skipTest('backend cannot return ids from a bulk insert')
+        self.assertEqual(count(2), count(20))
+
+    def test_bulk_create_chunk_size(self):
+        """test every chunk is written even when smaller than the payload"""
+        payload = [recipe_payload(f'Recipe {i}') for i in range(5)]
+
+        res = self.client.post(
+            f'{BULK_URL}?chunk_size=2', payload, format='json',
+        )
+
+        self.assertEqual(len(res.data['results']), 5)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_bulk_update(self):
+        """test recipes are updated and only the tag difference is written"""
+        soup = create_recipe(self.user)
+        soup.tags.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+            Tag.objects.create(user=self.user, name='Lunch'),
+        )
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        other = create_recipe(other_user, 'Other')
+        payload = [
+            {
+                'id': soup.id, 'title': 'Tomato soup',
+                'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}],
+            },
+            {'id': other.id, 'title': 'Not mine'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(statuses(res), ['updated', 'error'])
+        soup.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(soup.title, 'Tomato soup')
+        self.assertEqual(soup.price, Decimal('5.00'))
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(other.title, 'Other')
+
+    def test_bulk_delete(self):
+        """test recipes of the user are deleted by id"""
+        recipes = [create_recipe(self.user, f'Recipe {i}') for i in range(3)]
+
+        res = self.client.delete(
+            BULK_URL, [recipes[0].id, recipes[2].id, 0], format='json',
+        )
+
+        self.assertEqual(statuses(res), ['deleted', 'deleted', 'error'])
+        remaining = Recipe.objects.filter(user=self.user)
+        self.assertEqual(
+            list(remaining.values_list('id', flat=True)), [recipes[1].id],
+        )
+
+    def test_bulk_invalid_ids(self):
+        """test ids that are not integers are item errors , not a crash"""
+        recipe = create_recipe(self.user)
+
+        res = self.client.delete(
+            BULK_URL, [{'id': recipe.id}, [1], True, recipe.id], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(statuses(res), ['error', 'error', 'error', 'deleted'])
+        self.assertEqual(
+            res.data['results'][0]['errors'],
+            {'id': ['A valid integer is required.']},
+        )
+
+        res = self.client.patch(
+            BULK_URL, [{'id': [1], 'title': 'x'}, 'abc', {'title': 'x'}],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(statuses(res), ['error'] * 3)
+
+    def test_bulk_duplicate_ids(self):
+        """test a repeated id is an item error and the tag counts stay right"""
+        res = self.client.post(BULK_URL, [
+            recipe_payload('Soup', tags=[{'name': 'Vegan'}]),
+        ], format='json')
+        recipe_id = res.data['results'][0]['id']
+
+        res = self.client.patch(BULK_URL, [
+            {'id': recipe_id, 'tags': []},
+            {'id': recipe_id, 'tags': [{'name': 'Spicy'}]},
+        ], format='json')
+
+        self.assertEqual(statuses(res), ['updated', 'error'])
+        self.assertEqual(
+            res.data['results'][1]['errors'], {'id': ['Duplicate id.']},
+        )
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(tags.get(name='Vegan').recipe_count, 0)
+        self.assertFalse(tags.filter(name='Spicy').exists())
+        self.assertEqual(recount_tags(fix=False), [])
+
+        res = self.client.delete(
+            BULK_URL, [recipe_id, recipe_id], format='json',
+        )
+
+        self.assertEqual(statuses(res), ['deleted', 'error'])
+        self.assertEqual(
+            res.data['results'][1]['errors'], {'id': ['Duplicate id.']},
+        )
+
+    def test_bulk_requires_list(self):
+        """test the payload must be a list"""
+        res = self.client.post(BULK_URL, recipe_payload('Soup'), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_invalidates_cache(self):
+        """test a bulk write shows up in the cached recipe list"""
+        self.client.get(RECIPES_URL)
+        self.client.post(BULK_URL, [recipe_payload('Soup')], format='json')
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
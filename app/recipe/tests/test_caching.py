@@ -0,0 +1,136 @@
+"""
+Tests for the cached recipe and tag responses
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def recipe_detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample', 'time_minutes': 10, 'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class CachedResponseTests(TestCase):
+    """Test list and retrieve responses are cached until the user writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """test a repeated list call does not query the database"""
+        create_recipe(self.user)
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_cache_per_scheme(self):
+        """test a page cached over http does not hand out http links over
+        https"""
+        create_recipe(self.user)
+        create_recipe(self.user)
+        plain = self.client.get(RECIPES_URL, {'page_size': 1})
+
+        res = self.client.get(RECIPES_URL, {'page_size': 1}, secure=True)
+
+        self.assertTrue(plain.data['next'].startswith('http://testserver/'))
+        self.assertTrue(res.data['next'].startswith('https://testserver/'))
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+
+    def test_create_invalidates_cache(self):
+        """test creating a recipe through the API shows up in the next list"""
+        self.client.get(RECIPES_URL)
+        payload = {'title': 'New', 'time_minutes': 5, 'price': Decimal('1.00')}
+        self.client.post(RECIPES_URL, payload)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_update_invalidates_cache(self):
+        """test updating a recipe changes the cached detail"""
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        self.client.get(url)
+        self.client.patch(url, {'title': 'Changed'})
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_destroy_invalidates_cache(self):
+        """test deleting a tag removes it from the cached list"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_cache_per_user(self):
+        """test cached responses are not shared between users"""
+        create_recipe(self.user)
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_if_none_match_not_modified(self):
+        """test a matching If-None-Match returns 304 without a body"""
+        create_recipe(self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_if_none_match_stale_after_write(self):
+        """test an ETag from before a write no longer matches"""
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'title': 'Changed'})
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
@@ -0,0 +1,239 @@
+"""
+Tests for the row versions and the conditional recipe and tag requests
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_URL = reverse('recipe:tag-list')
+# every request reaches the database , no cached responses
+NO_CACHE = override_settings(
+    RECIPE_API_CACHE=dict(settings.RECIPE_API_CACHE, TIMEOUT=0),
+)
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def tag_url(tag_id):
+    """create and return a tag detail URL"""
+    return reverse('recipe:tag-detail', args=[tag_id])
+
+
+def create_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample', 'time_minutes': 10, 'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class VersionTests(TestCase):
+    """Test every write path bumps version and updated_at"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def assertBumped(self, obj, version=2):
+        """assert the stored version of obj and a later updated_at"""
+        before = obj.updated_at
+        obj.refresh_from_db()
+        self.assertEqual(obj.version, version)
+        self.assertGreater(obj.updated_at, before)
+
+    def test_save(self):
+        """test save bumps the version , also with update_fields"""
+        self.recipe.title = 'Changed'
+        self.recipe.save()
+        self.assertEqual(self.recipe.version, 2)
+
+        Recipe.objects.get(id=self.recipe.id).save(update_fields=['title'])
+
+        self.assertBumped(self.recipe, 3)
+
+    def test_api_update(self):
+        """test a tag only PATCH bumps the recipe and the linked tag"""
+        self.client.patch(
+            detail_url(self.recipe.id), {'tags': [{'name': 'Vegan'}]},
+            format='json',
+        )
+
+        self.assertBumped(self.recipe)
+        self.assertBumped(self.tag)
+
+    def test_bulk_update(self):
+        """test the bulk writer bumps every updated recipe"""
+        res = self.client.patch(
+            BULK_URL, [{'id': self.recipe.id, 'tags': [{'name': 'Vegan'}]}],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertBumped(self.recipe)
+
+    def test_m2m_manager(self):
+        """test tags added through the m2m manager bump both sides"""
+        self.recipe.tags.add(self.tag)
+
+        self.assertBumped(self.recipe)
+        self.assertBumped(self.tag)
+
+    def test_tag_rename_and_delete(self):
+        """test renaming or deleting a tag bumps the recipes showing it"""
+        Recipe.tags.through.objects.create(recipe=self.recipe, tag=self.tag)
+
+        self.client.patch(tag_url(self.tag.id), {'name': 'Vegetarian'})
+        self.assertBumped(self.recipe)
+        self.client.delete(tag_url(self.tag.id))
+
+        self.assertBumped(self.recipe, 3)
+
+
+@NO_CACHE
+class ConditionalRequestTests(TestCase):
+    """Test 304 and 412 answers to conditional requests"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_detail_if_none_match(self):
+        """test a current ETag gets 304 from one query on the version"""
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res['ETag'], '"v1"')
+
+        url = detail_url(self.recipe.id)
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH='"v1"')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.recipe.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'], '"v2"')
+
+    def test_detail_if_modified_since(self):
+        """test If-Modified-Since compares with updated_at"""
+        earlier = self.recipe.updated_at - timedelta(seconds=10)
+        Recipe.objects.filter(id=self.recipe.id).update(updated_at=earlier)
+        self.recipe.refresh_from_db()
+        url = detail_url(self.recipe.id)
+        last_modified = self.client.get(url)['Last-Modified']
+        updated_at = self.recipe.updated_at
+        self.assertEqual(last_modified, http_date(updated_at.timestamp()))
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        earlier = http_date((updated_at - timedelta(seconds=5)).timestamp())
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=earlier)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since_same_second(self):
+        """test Last-Modified is left out and If-Modified-Since ignored while
+        a change could still come in the same second , If-None-Match is not"""
+        now = self.recipe.updated_at.timestamp()
+        since = http_date(now)
+        url = detail_url(self.recipe.id)
+
+        with mock.patch('recipe.caching.time.time', return_value=now):
+            res = self.client.get(url)
+            self.assertNotIn('Last-Modified', res)
+            res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = self.client.get(
+                url, HTTP_IF_NONE_MATCH='"v1"', HTTP_IF_MODIFIED_SINCE=since,
+            )
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.recipe.save()
+            res = self.client.get(
+                url, HTTP_IF_NONE_MATCH='"v1"', HTTP_IF_MODIFIED_SINCE=since,
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_if_none_match(self):
+        """test the list ETag changes with creates and deletes"""
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = create_recipe(self.user, title='Other')
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+        other.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_tag_list_if_none_match(self):
+        """test the tag list ETag changes when a tag gets used"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+        self.assertEqual(
+            self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        self.recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_match(self):
+        """test PATCH with the current ETag succeeds and a stale one gets
+        412"""
+        url = detail_url(self.recipe.id)
+        res = self.client.patch(url, {'title': 'First'}, HTTP_IF_MATCH='"v1"')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'], '"v2"')
+
+        res = self.client.patch(
+            url, {'title': 'Second'}, HTTP_IF_MATCH='"v1"',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.title, self.recipe.version), ('First', 2),
+        )
+
+    def test_tag_if_match(self):
+        """test tags support If-Match too"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.put(
+            tag_url(tag.id), {'name': 'Vegetarian'}, HTTP_IF_MATCH='"v2"',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
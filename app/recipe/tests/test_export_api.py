@@ -0,0 +1,125 @@
+"""
+Tests for the streaming recipe export
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, title, tags=()):
+    """create and return a recipe with the named tags"""
+    recipe = Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=Decimal('5.50'),
+    )
+    for name in tags:
+        tag, created = Tag.objects.get_or_create(user=user, name=name)
+        recipe.tags.add(tag)
+    return recipe
+
+
+def read_content(res):
+    """return the full body of a streaming response"""
+    return b''.join(res.streaming_content).decode()
+
+
+class RecipeExportApiTests(TestCase):
+    """Test exporting recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_requires_auth(self):
+        """test exporting needs an authenticated user"""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        """test recipes of the user are streamed as one JSON object per line"""
+        soup = create_recipe(self.user, 'Soup', tags=['Vegan', 'Dinner'])
+        salad = create_recipe(self.user, 'Salad')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        create_recipe(other, 'Other')
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in read_content(res).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [soup.id, salad.id])
+        self.assertEqual(rows[0]['price'], '5.50')
+        self.assertEqual(
+            sorted(tag['name'] for tag in rows[0]['tags']),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(rows[1]['tags'], [])
+
+    def test_export_csv(self):
+        """test recipes are streamed as CSV with tag names joined by |"""
+        create_recipe(self.user, 'Soup, hot', tags=['Vegan'])
+
+        res = self.client.get(EXPORT_URL, {'output': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(read_content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Soup, hot')
+        self.assertEqual(rows[0]['tags'], 'Vegan')
+
+    def test_export_json_array(self):
+        """test recipes can be streamed as a single JSON array"""
+        create_recipe(self.user, 'Soup', tags=['Vegan'])
+        create_recipe(self.user, 'Salad')
+
+        res = self.client.get(EXPORT_URL, {'output': 'json'})
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        rows = json.loads(read_content(res))
+        self.assertEqual([row['title'] for row in rows], ['Soup', 'Salad'])
+        self.assertEqual(rows[0]['price'], '5.50')
+
+    def test_export_unknown_output(self):
+        """test an unknown output format is rejected"""
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_queries_per_chunk(self):
+        """test tags are loaded with one query per chunk of recipes"""
+        for i in range(5):
+            create_recipe(
+                self.user, f'Recipe {i}', tags=[f'Tag {i}', 'Shared'],
+            )
+
+        res = self.client.get(EXPORT_URL)
+        with CaptureQueriesContext(connection) as ctx:
+            rows = read_content(res).splitlines()
+
+        self.assertEqual(len(rows), 5)
+        tag_queries = [
+            query for query in ctx.captured_queries
+            if 'core_recipe_tags' in query['sql']
+        ]
+        self.assertEqual(len(tag_queries), 3)
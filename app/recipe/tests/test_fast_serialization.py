@@ -0,0 +1,92 @@
+"""
+Tests that the fast serialization path matches the serializers byte for byte
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeSerializer, TagSerialzer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class FastSerializationTests(TestCase):
+    """Test list responses are identical with and without the fast path"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['b', 'a', 'c']
+        ]
+        for i, price in enumerate(['5.00', '10.50', '0.99', '999.10']):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}',
+                description='Ünïcode "quoted"', time_minutes=i,
+                price=Decimal(price), link='',
+            )
+            recipe.tags.add(*tags[:i])
+
+    def get(self, url, params, fast):
+        """return the response of a list call with the fast path on or off"""
+        cache.clear()
+        with override_settings(FAST_SERIALIZATION=fast):
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def assertSameContent(self, url, params=None):
+        """assert both paths render the same bytes , following every page"""
+        params = dict(params or {}, page_size=3)
+        slow, fast = self.get(url, params, False), self.get(url, params, True)
+        self.assertEqual(fast.content, slow.content)
+        while slow.data['next']:
+            slow = self.get(slow.data['next'], {}, False)
+            fast = self.get(fast.data['next'], {}, True)
+            self.assertEqual(fast.content, slow.content)
+
+    def test_recipe_list_identical(self):
+        """test the recipe list is rendered identically"""
+        self.assertSameContent(RECIPES_URL)
+
+    def test_recipe_list_sparse_fields_identical(self):
+        """test sparse recipe lists are rendered identically"""
+        self.assertSameContent(RECIPES_URL, {'fields': 'title,price'})
+        self.assertSameContent(RECIPES_URL, {'fields': 'tags'})
+
+    def test_tag_list_identical(self):
+        """test the tag list is rendered identically"""
+        self.assertSameContent(TAGS_URL)
+        self.assertSameContent(TAGS_URL, {'fields': 'id'})
+
+    def test_fast_data_matches_serializer_data(self):
+        """test fast_data equals serializer data for the same rows"""
+        recipes = Recipe.objects.order_by('id')
+        serializer = RecipeSerializer()
+        rows = recipes.values(*serializer.fast_columns())
+        tags = Tag.objects.order_by('id')
+
+        self.assertEqual(
+            serializer.fast_data(list(rows)),
+            RecipeSerializer(
+                recipes.prefetch_related(Prefetch('tags', queryset=tags)),
+                many=True,
+            ).data,
+        )
+        self.assertEqual(
+            TagSerialzer().fast_data(list(tags.values('id', 'name'))),
+            TagSerialzer(tags, many=True).data,
+        )
@@ -0,0 +1,121 @@
+"""
+Tests for filtering the recipe list
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeFilterApiTests(TestCase):
+    """Test filtering recipes by tags , price and time"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dinner = Tag.objects.create(user=self.user, name='Dinner')
+        self.soup = self.create_recipe(
+            'Soup', '4.50', 20, [self.vegan, self.dinner],
+        )
+        self.salad = self.create_recipe('Salad', '8.00', 10, [self.vegan])
+        self.steak = self.create_recipe('Steak', '15.00', 45, [self.dinner])
+        self.bread = self.create_recipe('Bread', '2.00', 90, [])
+
+    def create_recipe(self, title, price, time_minutes, tags):
+        """create and return a recipe with tags"""
+        recipe = Recipe.objects.create(
+            user=self.user, title=title, price=Decimal(price),
+            time_minutes=time_minutes,
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def titles(self, params):
+        """return the titles listed for the query params"""
+        cache.clear()
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(recipe['title'] for recipe in res.data['results'])
+
+    def test_filter_any_tag(self):
+        """test recipes with any of the tags are listed once"""
+        tags = f'{self.vegan.id},{self.dinner.id}'
+
+        self.assertEqual(
+            self.titles({'tags': tags}), ['Salad', 'Soup', 'Steak'],
+        )
+
+    def test_filter_all_tags(self):
+        """test recipes with every one of the tags"""
+        tags = f'{self.vegan.id},{self.dinner.id}'
+
+        self.assertEqual(
+            self.titles({'tags': tags, 'tags_match': 'all'}), ['Soup'],
+        )
+        repeated = f'{self.vegan.id},{self.vegan.id}'
+        self.assertEqual(
+            self.titles({'tags': repeated, 'tags_match': 'all'}),
+            ['Salad', 'Soup'],
+        )
+
+    def test_filter_ranges(self):
+        """test inclusive price and time ranges"""
+        self.assertEqual(
+            self.titles({'price_min': '4.50', 'price_max': '8'}),
+            ['Salad', 'Soup'],
+        )
+        self.assertEqual(self.titles({'time_min': 45}), ['Bread', 'Steak'])
+        self.assertEqual(
+            self.titles({'time_max': 20, 'tags': self.dinner.id}), ['Soup'],
+        )
+
+    def test_filter_other_users_tags(self):
+        """test another user's tag ids do not reveal their recipes"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        tag = Tag.objects.create(user=other, name='Vegan')
+        Recipe.objects.create(
+            user=other, title='Other', price=Decimal('1.00'), time_minutes=1,
+        ).tags.add(tag)
+
+        self.assertEqual(self.titles({'tags': tag.id}), [])
+
+    def test_invalid_filters(self):
+        """test invalid filter values are rejected"""
+        for params in [
+            {'tags': 'a,b'}, {'price_min': 'cheap'}, {'tags_match': 'some'},
+        ]:
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), res.data)
+
+    def test_filter_all_tags_single_subquery(self):
+        """test matching all tags does not join the tag table once per tag"""
+        tags = ','.join(str(tag.id) for tag in [self.vegan, self.dinner])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.titles({'tags': tags, 'tags_match': 'all', 'fields': 'title'})
+
+        sql = next(
+            query['sql'] for query in ctx.captured_queries
+            if 'GROUP BY' in query['sql']
+        )
+        self.assertEqual(sql.count('core_recipe_tags'), 1)
@@ -0,0 +1,124 @@
+"""
+Tests that the number of queries per endpoint does not grow with the data
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def recipe_detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipes(user, count, tags_per_recipe=3):
+    """create `count` recipes for the user, each with its own tags"""
+    recipes = []
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        for j in range(tags_per_recipe):
+            tag = Tag.objects.create(user=user, name=f'Tag {recipe.id}-{j}')
+            recipe.tags.add(tag)
+        recipes.append(recipe)
+    return recipes
+
+
+class QueryCountTests(TestCase):
+    """Query counts stay bounded as the dataset grows"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        """call the url and return the number of queries it executed ,
+        bypassing cached responses"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def assertQueriesBounded(self, url, grow):
+        """assert `url` runs the same number of queries before and after
+        `grow()` adds more rows"""
+        before = self.count_queries(url)
+        grow()
+        after = self.count_queries(url)
+        self.assertEqual(before, after)
+
+    def test_recipe_list_queries_bounded(self):
+        """listing recipes does not issue a query per recipe"""
+        create_recipes(self.user, 2)
+        self.assertQueriesBounded(
+            RECIPES_URL,
+            lambda: create_recipes(self.user, 10),
+        )
+
+    def test_recipe_detail_queries_bounded(self):
+        """retrieving a recipe does not issue a query per tag"""
+        recipe = create_recipes(self.user, 1, tags_per_recipe=1)[0]
+
+        def add_tags():
+            for i in range(10):
+                recipe.tags.add(Tag.objects.create(user=self.user, name=i))
+
+        self.assertQueriesBounded(recipe_detail_url(recipe.id), add_tags)
+
+    def test_tag_list_queries_bounded(self):
+        """listing tags does not issue a query per tag"""
+        create_recipes(self.user, 1)
+        self.assertQueriesBounded(
+            TAGS_URL,
+            lambda: create_recipes(self.user, 5),
+        )
+
+    def count_post_queries(self, payload):
+        """post a recipe and return the number of queries it executed"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(ctx.captured_queries)
+
+    def test_create_recipe_tag_queries_bounded(self):
+        """creating a recipe does not issue queries per tag"""
+        Tag.objects.create(user=self.user, name='Existing')
+
+        def payload(tag_count):
+            tags = [{'name': 'Existing'}]
+            tags += [
+                {'name': f'New {tag_count}-{i}'} for i in range(tag_count)
+            ]
+            return {
+                'title': 'Tagged recipe',
+                'time_minutes': 10,
+                'price': Decimal('5.00'),
+                'tags': tags,
+            }
+
+        few = self.count_post_queries(payload(2))
+        many = self.count_post_queries(payload(30))
+        self.assertEqual(few, many)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 33)
@@ -5,7 +5,10 @@ from decimal import Decimal
 import email
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -61,6 +64,7 @@ class PrivateReccipeAPITests(TestCase):
 
     
     def setUp(self) -> None:
+        cache.clear()  # cached responses outlive the rolled back test data
         self.user = create_user(email='user@example.com',password='user123')
         self.client = APIClient()
         self.client.force_authenticate(self.user)
@@ -74,7 +78,7 @@ class PrivateReccipeAPITests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes,many=True)
         self.assertEqual(res.status_code,status.HTTP_200_OK)
-        self.assertEqual(res.data,serializer.data)
+        self.assertEqual(res.data['results'],serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user """
@@ -88,7 +92,7 @@ class PrivateReccipeAPITests(TestCase):
         serializer= RecipeSerializer(recipes,many=True)
         # now comparing 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data,serializer.data)
+        self.assertEqual(res.data['results'],serializer.data)
 
 
     def test_get_recipe_detail(self):
@@ -262,4 +266,143 @@ class PrivateReccipeAPITests(TestCase):
         res = self.client.patch(url,payload,format = 'json')
         self.assertEqual(res.status_code,status.HTTP_200_OK)
         self.assertEqual(len(recipe.tags.all()),0)
-        # self.assertEqual(recipe.tags.count(),0)
\ No newline at end of file
+        # self.assertEqual(recipe.tags.count(),0)
+
+    @override_settings(API_PAGINATION={
+        'recipes': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+        'tags': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+    })
+    def test_recipe_list_paginated(self):
+        """Test recipes are returned in cursor pages, newest first"""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+        expected_ids = [recipe.id for recipe in reversed(recipes)]
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, expected_ids)
+
+    @override_settings(API_PAGINATION={
+        'recipes': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+        'tags': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+    })
+    def test_recipe_page_size_capped(self):
+        """Test ?page_size= cannot go above the configured ceiling"""
+        for _ in range(5):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'page_size': 1})
+        self.assertEqual(len(res.data['results']), 1)
+        res = self.client.get(RECIPES_URL, {'page_size': 100})
+        self.assertEqual(len(res.data['results']), 3)
+
+    def test_create_recipe_with_duplicate_tags(self):
+        """Test repeated tag names in a payload create a single tag"""
+        payload = {
+            'title': 'Pancakes',
+            'time_minutes': 15,
+            'price': Decimal('3.00'),
+            'tags': [{'name': 'Breakfast'}, {'name': 'Breakfast'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_update_unchanged_tags_skips_tag_writes(self):
+        """Test a PATCH sending the current tags does not write to the
+        through table"""
+        recipe = create_recipe(user=self.user)
+        for name in ['Breakfast', 'Vegan']:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+
+        payload = {
+            'title': 'New title',
+            'tags': [{'name': 'Vegan'}, {'name': 'Breakfast'}],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in ctx.captured_queries
+            if 'core_recipe_tags' in query['sql']
+            and query['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_update_tags_writes_only_difference(self):
+        """Test updating tags keeps the links of tags that stay on the
+        recipe"""
+        recipe = create_recipe(user=self.user)
+        for name in ['Breakfast', 'Vegan']:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+        RecipeTag = Recipe.tags.through
+        kept_link = RecipeTag.objects.get(recipe=recipe, tag__name='Vegan')
+
+        payload = {'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertTrue(RecipeTag.objects.filter(id=kept_link.id).exists())
+        self.assertEqual(
+            sorted(tag['name'] for tag in res.data['tags']),
+            ['Dinner', 'Vegan'],
+        )
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= trims the output and skips unrequested columns and
+        tags"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'], [{'id': recipe.id, 'title': recipe.title}],
+        )
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('core_recipe_tags', sql)
+        self.assertNotIn('description', sql)
+
+    def test_detail_sparse_fields_with_tags(self):
+        """Test ?fields= can keep the nested tags"""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        res = self.client.get(
+            detail_url(recipe.id), {'fields': 'id,price,tags'},
+        )
+
+        self.assertEqual(res.data, {
+            'id': recipe.id,
+            'price': str(recipe.price),
+            'tags': [{'id': tag.id, 'name': 'Vegan'}],
+        })
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test ?fields= does not drop fields from a create payload"""
+        payload = {
+            'title': 'Soup', 'time_minutes': 10, 'price': Decimal('2.00'),
+        }
+
+        res = self.client.post(f'{RECIPES_URL}?fields=id', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['title'], 'Soup')
@@ -0,0 +1,159 @@
+"""
+Tests for the ?q= recipe search
+"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+POSTGRES = connection.vendor == 'postgresql'
+
+
+def create_recipe(user, title, description=''):
+    """create and return a recipe"""
+    return Recipe.objects.create(
+        user=user, title=title, description=description,
+        time_minutes=10, price=Decimal('5.00'),
+    )
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test searching recipes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, text, **params):
+        """return the titles of the recipes found"""
+        cache.clear()
+        res = self.client.get(RECIPES_URL, {'q': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_search_title_and_description(self):
+        """test recipes are matched on title and description of the user
+        only"""
+        create_recipe(self.user, 'Tomato soup')
+        create_recipe(self.user, 'Bread', 'Serve with tomato')
+        create_recipe(self.user, 'Salad')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        create_recipe(other, 'Tomato pie')
+
+        self.assertEqual(
+            sorted(self.search('tomato')), ['Bread', 'Tomato soup'],
+        )
+
+    def test_title_matches_rank_first(self):
+        """test a match in the title ranks above one in the description"""
+        create_recipe(self.user, 'Bread', 'Serve with tomato')
+        create_recipe(self.user, 'Tomato soup')
+
+        self.assertEqual(self.search('tomato'), ['Tomato soup', 'Bread'])
+
+    def test_all_terms_required(self):
+        """test every word of the search must match"""
+        create_recipe(self.user, 'Tomato soup')
+        create_recipe(self.user, 'Tomato salad')
+
+        self.assertEqual(self.search('tomato soup'), ['Tomato soup'])
+
+    def test_blank_search_lists_everything(self):
+        """test an empty ?q= is ignored"""
+        create_recipe(self.user, 'Soup')
+        create_recipe(self.user, 'Salad')
+
+        self.assertEqual(self.search(' '), ['Salad', 'Soup'])
+
+    def test_search_pagination(self):
+        """test search results are paginated by rank without gaps"""
+        for i in range(5):
+            create_recipe(self.user, f'Soup {i}', 'soup ' * i)
+        create_recipe(self.user, 'Salad')
+
+        titles, params = [], {'q': 'soup', 'page_size': 2}
+        url = RECIPES_URL
+        while url:
+            cache.clear()
+            res = self.client.get(url, params)
+            titles += [recipe['title'] for recipe in res.data['results']]
+            url, params = res.data['next'], {}
+
+        self.assertEqual(titles, self.search('soup', page_size=10))
+        self.assertEqual(sorted(titles), [f'Soup {i}' for i in range(5)])
+
+    def test_search_fast_serialization(self):
+        """test the fast path returns the same search results"""
+        create_recipe(self.user, 'Tomato soup')
+        create_recipe(self.user, 'Bread', 'Serve with tomato')
+
+        with override_settings(FAST_SERIALIZATION=True):
+            self.assertEqual(self.search('tomato'), ['Tomato soup', 'Bread'])
+
+    def test_search_follows_updates(self):
+        """test the search sees recipes created and changed through the API"""
+        res = self.client.post(
+            RECIPES_URL,
+            {'title': 'Pumpkin soup', 'time_minutes': 5, 'price': '1.00'},
+        )
+        recipe_id = res.data['id']
+        self.assertEqual(self.search('pumpkin'), ['Pumpkin soup'])
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe_id]),
+            {'title': 'Leek soup'},
+        )
+
+        self.assertEqual(self.search('pumpkin'), [])
+        self.assertEqual(self.search('leek'), ['Leek soup'])
+
+    def test_search_follows_bulk_writes(self):
+        """test the search sees recipes written by the bulk endpoint"""
+        payload = [
+            {'title': 'Pumpkin soup', 'time_minutes': 5, 'price': '1.00'},
+        ]
+        res = self.client.post(BULK_URL, payload, format='json')
+        recipe_id = res.data['results'][0]['id']
+        self.assertEqual(self.search('pumpkin'), ['Pumpkin soup'])
+
+        self.client.patch(
+            BULK_URL, [{'id': recipe_id, 'description': 'With leek'}],
+            format='json',
+        )
+
+        self.assertEqual(self.search('leek'), ['Pumpkin soup'])
+
+    @skipUnless(POSTGRES, 'full-text search needs Postgres')
+    def test_search_stems_words(self):
+        """test words are matched on their stem"""
+        create_recipe(self.user, 'Baked potatoes')
+
+        self.assertEqual(self.search('potato bake'), ['Baked potatoes'])
+
+    @skipUnless(POSTGRES, 'full-text search needs Postgres')
+    def test_save_with_update_fields_refreshes_vector(self):
+        """test saving only the title still updates the search vector"""
+        recipe = create_recipe(self.user, 'Soup')
+        recipe.title = 'Stew'
+
+        recipe.save(update_fields=['title'])
+
+        self.assertEqual(self.search('stew'), ['Stew'])
@@ -0,0 +1,204 @@
+"""
+Tests for the change log and the recipe and tag sync endpoints
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Change, Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_SYNC_URL = reverse('recipe:recipe-sync')
+TAGS_SYNC_URL = reverse('recipe:tag-sync')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample', 'time_minutes': 10, 'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class SyncApiTests(TestCase):
+    """Test syncing recipes and tags from a cursor"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, url=RECIPES_SYNC_URL, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_sync_then_changes(self):
+        """test a first sync returns everything and the next only what
+        changed , deletes as ids"""
+        kept = create_recipe(self.user, title='Kept')
+        changed = create_recipe(self.user, title='Changed')
+        deleted = create_recipe(self.user, title='Deleted')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        create_recipe(other)
+
+        first = self.sync()
+        self.assertEqual(
+            {row['id'] for row in first['results']},
+            {kept.id, changed.id, deleted.id},
+        )
+        self.assertEqual(first['deleted'], [])
+
+        self.client.patch(detail_url(changed.id), {'title': 'New title'})
+        self.client.delete(detail_url(deleted.id))
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Added', 'time_minutes': 5, 'price': '1.00',
+        })
+
+        second = self.sync(cursor=first['cursor'])
+        self.assertEqual(
+            [(row['id'], row['title']) for row in second['results']],
+            [(res.data['id'], 'Added'), (changed.id, 'New title')],
+        )
+        self.assertEqual(second['deleted'], [deleted.id])
+        self.assertFalse(second['more'])
+        third = self.sync(cursor=second['cursor'])
+        self.assertEqual((third['results'], third['deleted']), ([], []))
+        self.assertEqual(third['cursor'], second['cursor'])
+
+    def test_sync_reads_only_the_changes(self):
+        """test the queries of a sync do not grow with the catalog"""
+        for number in range(20):
+            create_recipe(self.user, title=f'Recipe {number}')
+        cursor = self.sync()['cursor']
+        recipe = create_recipe(self.user, title='New')
+
+        # the changes , the rows and their tags , and the oldest running
+        # transaction on Postgres
+        queries = 4 if connection.vendor == 'postgresql' else 3
+        with self.assertNumQueries(queries):
+            data = self.sync(cursor=cursor)
+
+        self.assertEqual([row['id'] for row in data['results']], [recipe.id])
+
+    def test_bulk_and_tag_writes_logged(self):
+        """test bulk writes , tag renames and tag deletes reach the sync of
+        both recipes and tags"""
+        cursor = self.sync()['cursor']
+        tag_cursor = self.sync(TAGS_SYNC_URL)['cursor']
+        res = self.client.post(BULK_URL, [
+            {
+                'title': 'One', 'time_minutes': 5, 'price': '1.00',
+                'tags': [{'name': 'Vegan'}],
+            },
+            {'title': 'Two', 'time_minutes': 5, 'price': '1.00'},
+        ], format='json')
+        ids = [item['id'] for item in res.data['results']]
+
+        data = self.sync(cursor=cursor)
+        self.assertEqual({row['id'] for row in data['results']}, set(ids))
+        tags = self.sync(TAGS_SYNC_URL, cursor=tag_cursor)
+        self.assertEqual(
+            [(row['name'], row['recipe_count']) for row in tags['results']],
+            [('Vegan', 1)],
+        )
+
+        tag = Tag.objects.get(user=self.user, name='Vegan')
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        self.client.delete(BULK_URL, [ids[1]], format='json')
+
+        data = self.sync(cursor=data['cursor'])
+        self.assertEqual(
+            [(row['id'], row['tags']) for row in data['results']],
+            [(ids[0], [])],
+        )
+        self.assertEqual(data['deleted'], [ids[1]])
+        tags = self.sync(TAGS_SYNC_URL, cursor=tags['cursor'])
+        self.assertEqual(tags['deleted'], [tag.id])
+
+    def test_more_pages(self):
+        """test changes past page_size come with the next cursor"""
+        recipes = [
+            create_recipe(self.user, title=f'Recipe {number}')
+            for number in range(3)
+        ]
+
+        first = self.sync(page_size=2)
+        second = self.sync(page_size=2, cursor=first['cursor'])
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(
+            [row['id'] for row in first['results'] + second['results']],
+            [recipes[1].id, recipes[0].id, recipes[2].id],
+        )
+
+    def test_invalid_cursor(self):
+        """test a malformed cursor gets 400"""
+        res = self.client.get(RECIPES_SYNC_URL, {'cursor': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact_changes(self):
+        """test compacting keeps the last change of each row , a sync from
+        any cursor returns the same"""
+        recipe = create_recipe(self.user)
+        cursor = self.sync()['cursor']
+        for title in ['One', 'Two']:
+            recipe.title = title
+            recipe.save()
+        gone = create_recipe(self.user)
+        gone_id = gone.id
+        gone.delete()
+
+        call_command('compact_changes', verbosity=0)
+
+        self.assertEqual(Change.objects.filter(user=self.user).count(), 2)
+        data = self.sync(cursor=cursor)
+        self.assertEqual([row['title'] for row in data['results']], ['Two'])
+        self.assertEqual(data['deleted'], [gone_id])
+
+    @override_settings(
+        RECIPE_API_CACHE=dict(settings.RECIPE_API_CACHE, TIMEOUT=0),
+    )
+    def test_list_last_modified_sees_deletes(self):
+        """test deleting a recipe moves the list Last-Modified forward"""
+        recipe = create_recipe(self.user)
+        earlier = recipe.updated_at - timedelta(seconds=5)
+        Recipe.objects.filter(id=recipe.id).update(updated_at=earlier)
+        create_recipe(self.user).delete()
+        # seconds ago , Last-Modified is only sent once its second is over
+        Change.objects.filter(user=self.user, deleted=True).update(
+            changed_at=earlier + timedelta(seconds=1),
+        )
+
+        res = self.client.get(RECIPES_URL)
+
+        tombstone = Change.objects.get(user=self.user, deleted=True)
+        self.assertEqual(
+            res['Last-Modified'],
+            http_date(int(tombstone.changed_at.timestamp())),
+        )
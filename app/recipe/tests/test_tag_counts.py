@@ -0,0 +1,197 @@
+"""
+Tests for the tag recipe counters and the popular tags endpoint
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+POPULAR_URL = reverse('recipe:tag-popular')
+
+
+def recipe_payload(title, *tags):
+    """return the payload of a recipe with the named tags"""
+    return {
+        'title': title, 'time_minutes': 10, 'price': '5.00',
+        'tags': [{'name': name} for name in tags],
+    }
+
+
+def create_recipe(user, title):
+    """create and return a recipe without tags"""
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=5, price=Decimal('1.00'),
+    )
+
+
+class TagCountTests(TestCase):
+    """Test Tag.recipe_count follows every write path"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counts(self):
+        """return {tag name: recipe_count} of the user's tags"""
+        tags = Tag.objects.filter(user=self.user)
+        return dict(tags.values_list('name', 'recipe_count'))
+
+    def test_api_create_update_delete(self):
+        """test counters follow recipes created , retagged and deleted"""
+        soup = self.client.post(
+            RECIPES_URL, recipe_payload('Soup', 'Vegan', 'Dinner'),
+            format='json',
+        )
+        self.client.post(
+            RECIPES_URL, recipe_payload('Salad', 'Vegan'), format='json',
+        )
+        self.assertEqual(self.counts(), {'Vegan': 2, 'Dinner': 1})
+
+        url = reverse('recipe:recipe-detail', args=[soup.data['id']])
+        self.client.patch(
+            url, {'tags': [{'name': 'Lunch'}, {'name': 'Vegan'}]},
+            format='json',
+        )
+        self.assertEqual(self.counts(), {'Vegan': 2, 'Dinner': 0, 'Lunch': 1})
+
+        self.client.delete(url)
+        self.assertEqual(self.counts(), {'Vegan': 1, 'Dinner': 0, 'Lunch': 0})
+
+    def test_bulk_paths(self):
+        """test counters follow bulk create , update and delete"""
+        res = self.client.post(BULK_URL, [
+            recipe_payload('Soup', 'Vegan', 'Dinner'),
+            recipe_payload('Salad', 'Vegan'),
+        ], format='json')
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(self.counts(), {'Vegan': 2, 'Dinner': 1})
+
+        self.client.patch(BULK_URL, [
+            {'id': ids[0], 'tags': [{'name': 'Dinner'}]},
+            {'id': ids[1], 'tags': [{'name': 'Lunch'}]},
+        ], format='json')
+        self.assertEqual(self.counts(), {'Vegan': 0, 'Dinner': 1, 'Lunch': 1})
+
+        self.client.delete(BULK_URL, ids, format='json')
+        self.assertEqual(self.counts(), {'Vegan': 0, 'Dinner': 0, 'Lunch': 0})
+
+    def test_m2m_manager(self):
+        """test counters follow recipe.tags add , remove and clear"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        soup = create_recipe(self.user, 'Soup')
+        salad = create_recipe(self.user, 'Salad')
+
+        soup.tags.add(vegan, dinner)
+        soup.tags.add(vegan)  # already there , not counted again
+        vegan.recipe_set.add(salad)
+        self.assertEqual(self.counts(), {'Vegan': 2, 'Dinner': 1})
+
+        soup.tags.remove(vegan)
+        soup.tags.remove(vegan)
+        self.assertEqual(self.counts(), {'Vegan': 1, 'Dinner': 1})
+
+        soup.tags.clear()
+        vegan.recipe_set.clear()
+        self.assertEqual(self.counts(), {'Vegan': 0, 'Dinner': 0})
+
+
+class PopularTagsApiTests(TestCase):
+    """Test the popular tags endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name, count in [('Rare', 1), ('Common', 9), ('Medium', 5)]:
+            Tag.objects.create(user=self.user, name=name, recipe_count=count)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'pass123',
+        )
+        Tag.objects.create(user=other, name='Other', recipe_count=100)
+
+    def test_popular_tags(self):
+        """test tags are listed most used first with their counts"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(POPULAR_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (tag['name'], tag['recipe_count'])
+                for tag in res.data['results']
+            ],
+            [('Common', 9), ('Medium', 5), ('Rare', 1)],
+        )
+        self.assertFalse(any(
+            'core_recipe_tags' in query['sql']
+            for query in ctx.captured_queries
+        ))
+
+    def test_popular_tags_paginated(self):
+        """test the popular list pages follow the usage order"""
+        res = self.client.get(POPULAR_URL, {'page_size': 2, 'fields': 'name'})
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Common', 'Medium'],
+        )
+        self.assertNotIn('recipe_count', res.data['results'][0])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Rare'],
+        )
+
+
+class RecountTagsCommandTests(TestCase):
+    """Test the recount_tags command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(self.user, 'Soup')
+        recipe.tags.add(self.tag)
+        Tag.objects.filter(id=self.tag.id).update(recipe_count=7)
+
+    def test_check_reports_drift(self):
+        """test --check fails on a wrong counter and leaves it"""
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('recount_tags', check=True, stdout=out)
+
+        self.assertIn(
+            f'tag {self.tag.id}: counted 7 , actual 1', out.getvalue(),
+        )
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 7)
+
+    def test_recount_fixes_drift(self):
+        """test the counters are recomputed"""
+        call_command('recount_tags', stdout=StringIO())
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        call_command('recount_tags', check=True, stdout=StringIO())
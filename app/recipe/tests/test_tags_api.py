@@ -2,8 +2,9 @@ from decimal import Decimal
 from recipe.serializers import TagSerialzer
 from core.models  import Tag
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 
 from rest_framework import status
@@ -33,6 +34,7 @@ class PublicTagApiTests(TestCase):
 class PrivateTagApiTests(TestCase):
     """ Test an authenticated API Tests"""
     def setUp(self) -> None:
+        cache.clear()  # cached responses outlive the rolled back test data
         self.user = create_user(email='user@example.com',password = 'testpass123')
         self.client = APIClient()
         self.client.force_authenticate(self.user)
@@ -51,7 +53,7 @@ class PrivateTagApiTests(TestCase):
         serializer=TagSerialzer(tags,many=True)
         #now compare this serialzed data and res data 
         self.assertEqual(res.status_code,status.HTTP_200_OK)
-        self.assertEqual(res.data,serializer.data)
+        self.assertEqual(res.data['results'],serializer.data)
     
     def test_tags_limited_to_user(self):
         """ test list of tags is limited to authenticated user """
@@ -64,8 +66,14 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(res.status_code,status.HTTP_200_OK)
         # no need to get data from and serialze it and compare that data with res data , 
         # because we are just calculating counts and verifying names 
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data[0]['name'],tag_2.name)
+        self.assertEqual(len(res.data['results']),1)
+        self.assertEqual(res.data['results'][0]['name'],tag_2.name)
+
+    def test_tags_sparse_fields(self):
+        """ Test ?fields= trims the tag list output"""
+        tag = create_tag(user=self.user, name='Vegan')
+        res = self.client.get(TAGS_URL, {'fields': 'id'})
+        self.assertEqual(res.data['results'], [{'id': tag.id}])
 
     def test_update_tag(self):
         """ Test updating a tag"""
@@ -77,6 +85,15 @@ class PrivateTagApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name,payload['name'])
 
+    def test_update_tag_to_existing_name(self):
+        """ Test renaming a tag to a name the user already has is rejected"""
+        create_tag(user=self.user, name='Dinner')
+        tag = create_tag(user=self.user, name='Supper')
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Supper')
+
     def test_delete_tag(self):
         """Test deleting a tag assigned to user"""
         tag = Tag.objects.create(user=self.user,name='Breakfast')
@@ -86,4 +103,20 @@ class PrivateTagApiTests(TestCase):
         tags_now = Tag.objects.filter(id=tag.id)
         self.assertFalse(tags_now.exists())
 
-   
+    @override_settings(API_PAGINATION={
+        'recipes': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+        'tags': {'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3},
+    })
+    def test_tags_paginated_by_name(self):
+        """Test tags are returned in cursor pages ordered by name"""
+        for name in ['Breakfast', 'Dinner', 'Lunch', 'Snack', 'Vegan']:
+            create_tag(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL)
+        names = [tag['name'] for tag in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names += [tag['name'] for tag in res.data['results']]
+        self.assertEqual(
+            names, ['Vegan', 'Snack', 'Lunch', 'Dinner', 'Breakfast'],
+        )
@@ -1,6 +1,7 @@
 """
 URL mappings for the recipe API 
 """
+from django.conf import settings
 from django.urls import (
     path,
     include,
@@ -8,9 +9,13 @@ from django.urls import (
 )
 from rest_framework.routers import DefaultRouter
 from recipe import views
+from recipe.async_views import async_read_urls
 
 router = DefaultRouter()
 router.register('recipes',views.RecipeViewSet)
 router.register('tags',views.TagViewSet)
 app_name = 'recipe'
-urlpatterns = [path('',include(router.urls)),]
\ No newline at end of file
+router_urls = router.urls
+if settings.ASYNC_READ_VIEWS:  # ASGI only , see recipe.async_views
+    router_urls = async_read_urls(router_urls)
+urlpatterns = [path('',include(router_urls)),]
\ No newline at end of file
@@ -1,27 +1,166 @@
 """
 Views for the recipe APIs
 """
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import (
     viewsets,
-    mixins)
+    mixins,
+    status)
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from recipe import serializers
+from recipe.bulk import RecipeBulkWriter
+from recipe.export import EXPORT_FORMATS
+from recipe.counters import release_recipe_tags, touch_tag_recipes
+from recipe.caching import (
+    CachedListMixin,
+    CachedRetrieveMixin,
+    ConditionalUpdateMixin,
+    bump_version,
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    TagCursorPagination,
+)
+from recipe.filters import filter_recipes
+from recipe.search import search_recipes
+from recipe.sync import SyncMixin
+from core.db.replicas import ReplicaReadMixin
 from core.models import (Recipe,Tag)
-from rest_framework.authentication import TokenAuthentication
+from user.authentication import CachedTokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from drf_spectacular.utils import (
+    extend_schema,
+    extend_schema_view,
+    OpenApiParameter,
+    OpenApiTypes,
+)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+# recipe columns ?fields= can limit the query to
+RECIPE_COLUMNS = {
+    'id', 'title', 'description', 'link', 'time_minutes', 'price',
+}
+# actions returning recipes , their nested tags are prefetched
+RECIPE_ACTIONS = {
+    'list', 'retrieve', 'create', 'update', 'partial_update', 'sync',
+}
+FIELDS_PARAMETER = OpenApiParameter(
+    'fields', OpenApiTypes.STR,
+    description='Comma separated list of fields to return , e.g. id,title',
+)
+SEARCH_PARAMETER = OpenApiParameter(
+    'q', OpenApiTypes.STR,
+    description=(
+        'Full-text search in title and description , best matches first'
+    ),
+)
+FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags', OpenApiTypes.STR,
+        description='Comma separated list of tag ids to filter by , e.g. 1,2',
+    ),
+    OpenApiParameter(
+        'tags_match', OpenApiTypes.STR, enum=['any', 'all'],
+        description='Keep recipes with any (default) or all of the tags',
+    ),
+    OpenApiParameter(
+        'price_min', OpenApiTypes.DECIMAL, description='Minimum price',
+    ),
+    OpenApiParameter(
+        'price_max', OpenApiTypes.DECIMAL, description='Maximum price',
+    ),
+    OpenApiParameter(
+        'time_min', OpenApiTypes.INT, description='Minimum time in minutes',
+    ),
+    OpenApiParameter(
+        'time_max', OpenApiTypes.INT, description='Maximum time in minutes',
+    ),
+]
+SYNC_PARAMETERS = [
+    OpenApiParameter(
+        'cursor', OpenApiTypes.STR,
+        description=(
+            'Cursor returned by the previous sync , every change when left out'
+        ),
+    ),
+    OpenApiParameter(
+        'page_size', OpenApiTypes.INT, description='Changes per response',
+    ),
+]
+
+
+class FastListMixin:
+    """Build list responses with the serializer's fast path from .values()
+    rows when settings.FAST_SERIALIZATION is on , use before ListModelMixin"""
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+        # no instance , the serializer is only used for its fields
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None)
+        # the paginator reads the position of the last row from its ordering
+        # columns
+        ordering = ()
+        if self.paginator is not None:
+            ordering = self.paginator.get_ordering(request, queryset, self)
+        columns = set(serializer.fast_columns())
+        columns |= {name.lstrip('-') for name in ordering}
+        queryset = queryset.values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.fast_data(page))
+        return Response(serializer.fast_data(list(queryset)))
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[FIELDS_PARAMETER, SEARCH_PARAMETER, *FILTER_PARAMETERS],
+    ),
+    retrieve=extend_schema(parameters=[FIELDS_PARAMETER]),
+    sync=extend_schema(parameters=SYNC_PARAMETERS),
+)
+class RecipeViewSet(ReplicaReadMixin, CachedListMixin, CachedRetrieveMixin,
+                    ConditionalUpdateMixin, FastListMixin, SyncMixin,
+                    viewsets.ModelViewSet):
     """View for manage REcipe APIs
     """
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    throttle_scope = 'recipe'
 
     # till above it returns all recipes 
     # but to get user specific recipes filter by user as below by overrididng get_queryset() method
     def get_queryset(self):
         """ Filter/Retrieve recipe for authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        # search_vector is only read by the database
+        queryset = self.queryset.filter(user=self.request.user)
+        queryset = queryset.defer('search_vector')
+        fields = serializers.requested_fields(self.request)
+        if fields is not None:
+            # ?fields= only loads the columns that get serialized
+            queryset = queryset.only(*(fields & RECIPE_COLUMNS))
+        # nested tags are serialized for every action that returns a recipe,
+        # load them in one extra query instead of one query per recipe
+        if (self.action in RECIPE_ACTIONS
+                and (fields is None or 'tags' in fields)):
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id'))
+            )
+        if self.action != 'list':
+            return queryset.order_by('-id')
+        queryset = filter_recipes(queryset, self.request.query_params)
+        search = self.request.query_params.get('q', '').strip()
+        if search:
+            return search_recipes(queryset, search).order_by('-rank', '-id')
+        return queryset.order_by('-id')
 
     # most of times we use Detailserializer hence we implement this condition based method get_serializer_class and change above 
     #serializer_class = serializers.RecipeSerializer --->
@@ -38,17 +177,132 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """ create a new recipe"""
         serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        """delete recipe , uncount its tags and invalidate cached responses"""
+        with transaction.atomic():
+            release_recipe_tags([instance.id])
+            instance.delete()
+        bump_version(self.request.user.pk)
+
+    def get_bulk_chunk_size(self):
+        """chunk size from ?chunk_size= , capped by settings.RECIPE_BULK"""
+        config = settings.RECIPE_BULK
+        try:
+            chunk_size = int(self.request.query_params['chunk_size'])
+        except (KeyError, ValueError):
+            return config['CHUNK_SIZE']
+        return max(1, min(chunk_size, config['MAX_CHUNK_SIZE']))
+
+    # heavier than a single recipe , they get their own throttle scopes
+    @action(
+        detail=False, methods=['post', 'patch', 'delete'], url_path='bulk',
+        throttle_scope='recipe-bulk',
+    )
+    def bulk(self, request):
+        """create (POST) , update (PATCH) or delete (DELETE) a list of recipes
+        and return the result of each item"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of items.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_items = settings.RECIPE_BULK['MAX_ITEMS']
+        if len(items) > max_items:
+            return Response(
+                {'detail': f'At most {max_items} items per request.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        writer = RecipeBulkWriter(
+            request.user, self.get_bulk_chunk_size(),
+            context={'request': request},
+        )
+        if request.method == 'POST':
+            results = writer.create(items)
+        elif request.method == 'PATCH':
+            results = writer.update(items)
+        else:
+            results = writer.delete(items)
+        return Response({'results': results})
+
+    @action(
+        detail=False, methods=['get'], url_path='export',
+        throttle_scope='recipe-export',
+    )
+    def export(self, request):
+        """stream every recipe of the user with its tags ,
+        ?output=ndjson (default) , ?output=csv or ?output=json"""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'output': [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        generate, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            generate(self.get_queryset(), settings.RECIPE_EXPORT_CHUNK_SIZE),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{output}"'
+        )
+        return response
+
+
 # just adding UpdateModelMixin here will update our tag object - test  patch
-class TagViewSet(mixins.DestroyModelMixin,
-                mixins.UpdateModelMixin,
-                mixins.ListModelMixin,
-                viewsets.GenericViewSet): # generic vide set should be last as per DJnago rules
+@extend_schema_view(
+    list=extend_schema(parameters=[FIELDS_PARAMETER]),
+    popular=extend_schema(parameters=[FIELDS_PARAMETER]),
+    sync=extend_schema(parameters=SYNC_PARAMETERS),
+)
+class TagViewSet(ReplicaReadMixin,
+                 CachedListMixin,
+                 ConditionalUpdateMixin,
+                 FastListMixin,
+                 SyncMixin,
+                 mixins.DestroyModelMixin,
+                 mixins.UpdateModelMixin,
+                 mixins.ListModelMixin,
+                 # generic vide set should be last as per DJnago rules
+                 viewsets.GenericViewSet):
     """Manage tags in the database """
     serializer_class = serializers.TagSerialzer
     queryset = Tag.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes= [IsAuthenticated]
+    pagination_class = TagCursorPagination
+    throttle_scope = 'tag'
 
     def get_queryset(self):
         """filter tags based on user """
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        fields = serializers.requested_fields(self.request)
+        if fields is not None:
+            # name is always loaded , the paginator orders by it
+            queryset = queryset.only(
+                *(fields & {'id', 'recipe_count'}), 'name',
+            )
+        if self.action == 'popular':
+            return queryset.order_by('-recipe_count', '-id')
+        return queryset.order_by('-name')
+
+    def get_serializer_class(self):
+        """tags with their recipe counts for the popular list and sync"""
+        if self.action in ('popular', 'sync'):
+            return serializers.TagUsageSerializer
+        return self.serializer_class
+
+    @action(detail=False, methods=['get'], url_path='popular')
+    def popular(self, request):
+        """list the tags of the user by number of recipes , most used first ,
+        read from the maintained counters instead of counting recipes"""
+        return self.list(request)
+
+    def perform_destroy(self, instance):
+        """delete tag , bump the version of its recipes and invalidate
+        cached responses"""
+        with transaction.atomic():
+            touch_tag_recipes([instance.id])
+            instance.delete()
+        bump_version(self.request.user.pk)
@@ -0,0 +1,310 @@
+"""
+Token authentication backed by an in-process cache
+"""
+import hashlib
+import hmac
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """LRU of token key -> token (with its user) where entries expire after
+    `ttl` seconds , optionally layered over a Django cache shared between
+    processes.
+
+    Entries are kept pickled so every request gets its own user instance ,
+    a view changing request.user cannot leak into other requests. Shared
+    entries carry the time they expire , a process reading one keeps it for
+    what is left of the ttl , not a new ttl.
+    """
+
+    def __init__(self, max_size, ttl, cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = caches[cache_alias] if cache_alias else None
+        # key -> (expires_at , user_id , pickled token)
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def shared_key(key):
+        """key in the shared cache , the token itself is a secret so it is
+        hashed"""
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get_local(self, key):
+        """return the token from the in-process LRU or None , never does I/O
+        so it is safe to call from the event loop"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(entry[2])
+        return None
+
+    def get(self, key):
+        """return the cached token for the key or None"""
+        token = self.get_local(key)
+        if token is not None:
+            return token
+        if self.shared is not None:
+            entry = self.shared.get(self.shared_key(key))
+            if entry is not None:
+                expires_at, data = entry
+                ttl = expires_at - time.time()
+                if ttl > 0:
+                    token = pickle.loads(data)
+                    self._store(key, token.user_id, data, ttl)
+                    with self._lock:
+                        self.shared_hits += 1
+                    return token
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, token):
+        """cache the token , its user must already be loaded"""
+        data = pickle.dumps(token)
+        self._store(key, token.user_id, data, self.ttl)
+        if self.shared is not None:
+            self.shared.set(
+                self.shared_key(key), (time.time() + self.ttl, data), self.ttl,
+            )
+
+    def _store(self, key, user_id, data, ttl):
+        """add an entry to the local LRU for ttl seconds , evicting the oldest
+        when full"""
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, user_id, data)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        """remove a key from the local LRU , the lock must be held"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1])
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[1]]
+
+    def invalidate(self, key):
+        """forget a token , e.g. after it was deleted"""
+        with self._lock:
+            self._discard(key)
+        if self.shared is not None:
+            self.shared.delete(self.shared_key(key))
+
+    def invalidate_user(self, user_id):
+        """forget every token of a user , e.g. after it was deactivated"""
+        with self._lock:
+            keys = set(self._keys_by_user.get(user_id, ()))
+            for key in keys:
+                self._discard(key)
+        if self.shared is not None:
+            # other processes may have cached tokens this one has not seen
+            tokens = Token.objects.filter(user_id=user_id)
+            keys |= set(tokens.values_list('key', flat=True))
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        """drop every local entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        """return the hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
+
+
+_token_cache = None
+
+
+def get_token_cache():
+    """return the process wide token cache configured by
+    settings.TOKEN_AUTH_CACHE"""
+    global _token_cache
+    if _token_cache is None:
+        config = settings.TOKEN_AUTH_CACHE
+        _token_cache = TokenCache(
+            max_size=config['MAX_SIZE'],
+            ttl=config['TTL'],
+            cache_alias=config.get('CACHE_ALIAS'),
+        )
+    return _token_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    """rebuild the token cache when its settings are overridden in tests"""
+    global _token_cache
+    if setting == 'TOKEN_AUTH_CACHE':
+        _token_cache = None
+
+
+class LoginCache:
+    """LRU of logins verified in the last `ttl` seconds , email -> token key
+
+    A login with the same email and password gets the token back without
+    hashing the password , with one query checking the token still exists ,
+    the user is active and still has the password hash the login was
+    verified against. A password changed or a user deactivated by another
+    process , or without signals , misses the cache. Passwords are kept as
+    an HMAC keyed with a secret made when the process starts , so they are
+    never stored , but the HMAC is fast to check , keep the TTL short.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        # email -> (expires_at , user_id , token key , digest)
+        self._entries = OrderedDict()
+        self._emails_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, email, password, encoded):
+        """HMAC of the credentials and the stored hash they were checked
+        against"""
+        message = f'{email}\0{password}\0{encoded}'.encode()
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def get(self, email, password):
+        """return the token key of a recent login with these credentials or
+        None"""
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._discard(email)
+                entry = None
+        if entry is not None:
+            expires_at, user_id, key, digest = entry
+            encoded = Token.objects.filter(
+                key=key, user_id=user_id, user__is_active=True,
+            ).values_list('user__password', flat=True).first()
+            if encoded is not None and hmac.compare_digest(
+                digest, self.digest(email, password, encoded),
+            ):
+                with self._lock:
+                    if email in self._entries:
+                        self._entries.move_to_end(email)
+                    self.hits += 1
+                return key
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, email, password, user, key):
+        """remember a verified login of `user` with its current password
+        hash"""
+        digest = self.digest(email, password, user.password)
+        entry = (time.monotonic() + self.ttl, user.pk, key, digest)
+        with self._lock:
+            self._discard(email)
+            self._entries[email] = entry
+            self._emails_by_user.setdefault(user.pk, set()).add(email)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, email):
+        """remove an email from the LRU , the lock must be held"""
+        entry = self._entries.pop(email, None)
+        if entry is not None:
+            emails = self._emails_by_user.get(entry[1])
+            emails.discard(email)
+            if not emails:
+                del self._emails_by_user[entry[1]]
+
+    def invalidate_user(self, user_id, email=None):
+        """forget the logins of a user , e.g. after a password change , and
+        of `email` which may have belonged to a deleted user"""
+        with self._lock:
+            for cached in set(self._emails_by_user.get(user_id, ())) | {email}:
+                self._discard(cached)
+
+    def clear(self):
+        """drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._emails_by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """return the hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
+
+
+_login_cache = None
+
+
+def get_login_cache():
+    """return the process wide login cache configured by
+    settings.PASSWORD_HASHING"""
+    global _login_cache
+    if _login_cache is None:
+        config = settings.PASSWORD_HASHING
+        _login_cache = LoginCache(
+            max_size=config['LOGIN_CACHE_SIZE'],
+            ttl=config['LOGIN_CACHE_TTL'],
+        )
+    return _login_cache
+
+
+@receiver(setting_changed)
+def reset_login_cache(setting, **kwargs):
+    """rebuild the login cache when its settings are overridden in tests"""
+    global _login_cache
+    if setting == 'PASSWORD_HASHING':
+        _login_cache = None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in TokenAuthentication that looks tokens up in the token cache
+    before going to the database"""
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        token = cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(key, token)
+        elif not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return (token.user, token)
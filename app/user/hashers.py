@@ -0,0 +1,127 @@
+"""
+Password hashers running on a bounded pool of worker threads
+
+Every hash , logins , sign ups , password changes and the dummy hash run
+for unknown emails , goes through run_hash: at most
+settings.PASSWORD_HASHING['WORKERS'] hashes run at once and at most
+MAX_QUEUE more wait for a worker , so a login storm keeps the other cores
+for the API. A hash that cannot get a place within QUEUE_TIMEOUT seconds
+fails with a 503. The hashing libraries release the GIL while they work.
+
+Django rehashes a password at the next successful login when its hasher
+is no longer the first of PASSWORD_HASHERS or its cost changed.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+class PasswordHashingBusy(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many logins at once , try again shortly.')
+    default_code = 'password_hashing_busy'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait  # sent as Retry-After
+
+
+class HashingPool:
+    """Worker threads for password hashes with a bounded waiting line"""
+
+    def __init__(self, workers, max_queue, timeout):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hash',
+        )
+        self.admitted = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def run(self, func, *args):
+        if not self.admitted.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy(wait=max(1, round(self.timeout)))
+        try:
+            return self.executor.submit(in_pool, func, *args).result()
+        finally:
+            self.admitted.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def in_pool(func, *args):
+    """call func on a worker , hashes it starts itself run inline"""
+    _local.in_pool = True
+    return func(*args)
+
+
+def get_hashing_pool():
+    """return the process wide hashing pool of settings.PASSWORD_HASHING"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = settings.PASSWORD_HASHING
+            _pool = HashingPool(
+                config['WORKERS'], config['MAX_QUEUE'],
+                config['QUEUE_TIMEOUT'],
+            )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    """rebuild the hashing pool when its settings are overridden in tests"""
+    global _pool
+    if setting == 'PASSWORD_HASHING':
+        with _pool_lock:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = None
+
+
+def run_hash(func, *args):
+    """run a hashing function on the hashing pool"""
+    if getattr(_local, 'in_pool', False):
+        return func(*args)
+    return get_hashing_pool().run(func, *args)
+
+
+class PooledHasherMixin:
+    """Run encode and verify on the hashing pool"""
+
+    def encode(self, *args, **kwargs):
+        encode = super().encode
+        return run_hash(lambda: encode(*args, **kwargs))
+
+    def verify(self, password, encoded):
+        return run_hash(super().verify, password, encoded)
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with settings.PASSWORD_HASHING['PBKDF2_ITERATIONS'] iterations"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING['PBKDF2_ITERATIONS']
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """Argon2 , needs argon2-cffi"""
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin,
+                                 hashers.BCryptSHA256PasswordHasher):
+    """bcrypt , needs bcrypt"""
@@ -9,7 +9,10 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _ # _ is common symbol for translation in django
 from rest_framework import serializers
 
-class UserSerializer(serializers.ModelSerializer):
+from core.instrumentation import TimedSerializerMixin
+from user.authentication import get_login_cache
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serialiser for the user object"""
     class Meta:
         model = get_user_model()
@@ -37,9 +40,14 @@ class AuthTokenSerilazer(serializers.Serializer):
     trim_whitespace=False
     )
     def validate(self,attrs):
-        """validate and authenticate the user"""
+        """validate and authenticate the user , a login seen recently gets
+        its token back without hashing the password"""
         email = attrs.get('email')
         password = attrs.get('password')
+        key = get_login_cache().get(email, password)
+        if key is not None:
+            attrs['token'] = key
+            return attrs
         user = authenticate(
             request = self.context.get('requests'),
             username= email,
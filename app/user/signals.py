@@ -0,0 +1,24 @@
+"""
+Signal handlers keeping the token and login caches in sync with the database
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import get_login_cache, get_token_cache
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """forget a token once it is deleted"""
+    get_token_cache().invalidate(instance.key)
+    get_login_cache().invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_saved_user_tokens(sender, instance, **kwargs):
+    """forget the tokens and logins of a user once it changes , e.g. is
+    deactivated or gets a new password"""
+    get_token_cache().invalidate_user(instance.pk)
+    get_login_cache().invalidate_user(instance.pk, instance.email)
@@ -0,0 +1,173 @@
+"""
+Tests for the cached token authentication
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import get_login_cache, get_token_cache
+
+ME_URL = reverse('user:me')
+METRICS_URL = reverse('metrics')
+TOKEN_CACHE = {'MAX_SIZE': 2, 'TTL': 60, 'CACHE_ALIAS': None}
+
+
+def create_user(email='user@example.com', **params):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(
+        email=email, password='pass123', **params,
+    )
+
+
+@override_settings(TOKEN_AUTH_CACHE=TOKEN_CACHE)
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with a token through the token cache"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = create_user(name='Cached')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_cached_after_first_request(self):
+        """test the second request authenticates without querying the token"""
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+        stats = get_token_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_cache_counters_in_metrics(self):
+        """test the token and login cache counters are exported as metrics"""
+        get_login_cache().clear()
+        self.client.get(ME_URL)
+        self.client.get(ME_URL)
+        admin = APIClient()
+        admin.force_authenticate(
+            create_user('admin@example.com', is_staff=True),
+        )
+
+        body = admin.get(METRICS_URL).content.decode()
+
+        self.assertIn('auth_token_cache_lookups_total{result="hit"} 1', body)
+        self.assertIn(
+            'auth_token_cache_lookups_total{result="shared_hit"} 0', body,
+        )
+        self.assertIn('auth_token_cache_lookups_total{result="miss"} 1', body)
+        self.assertIn('auth_token_cache_entries 1', body)
+        self.assertIn('auth_login_cache_lookups_total{result="miss"} 0', body)
+        self.assertIn('# TYPE auth_login_cache_entries gauge', body)
+
+    def test_deleted_token_rejected(self):
+        """test a cached token stops working once deleted"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """test a cached token stops working once its user is deactivated"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_not_shared_between_requests(self):
+        """test each request gets its own copy of the cached user"""
+        self.client.get(ME_URL)
+        cache = get_token_cache()
+        first = cache.get(self.token.key)
+        first.user.name = 'Changed'
+
+        self.assertEqual(cache.get(self.token.key).user.name, 'Cached')
+
+    def test_entries_expire(self):
+        """test entries are dropped after the ttl"""
+        cache = get_token_cache()
+        with patch('user.authentication.time.monotonic', return_value=100):
+            cache.set(self.token.key, self.token)
+        with patch('user.authentication.time.monotonic', return_value=161):
+            self.assertIsNone(cache.get(self.token.key))
+
+    def test_least_recently_used_evicted(self):
+        """test the cache holds at most MAX_SIZE tokens"""
+        cache = get_token_cache()
+        tokens = [self.token] + [
+            Token.objects.create(user=create_user(f'user{i}@example.com'))
+            for i in range(2)
+        ]
+        cache.set(tokens[0].key, tokens[0])
+        cache.set(tokens[1].key, tokens[1])
+        cache.get(tokens[0].key)
+        cache.set(tokens[2].key, tokens[2])
+
+        self.assertIsNone(cache.get(tokens[1].key))
+        self.assertIsNotNone(cache.get(tokens[0].key))
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+@override_settings(TOKEN_AUTH_CACHE=dict(TOKEN_CACHE, CACHE_ALIAS='default'))
+class SharedTokenCacheTests(TestCase):
+    """Test the token cache layered over a Django cache"""
+
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+
+    def test_shared_cache_hit(self):
+        """test a token cached by another process is read from the shared
+        cache"""
+        get_token_cache().set(self.token.key, self.token)
+        get_token_cache().clear()  # as if another process had cached it
+
+        token = get_token_cache().get(self.token.key)
+
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(get_token_cache().stats()['shared_hits'], 1)
+
+    def test_shared_hit_keeps_expiry(self):
+        """test a token read from the shared cache expires when the shared
+        entry does , not a full ttl later"""
+        with patch('user.authentication.time.time', return_value=1000.0):
+            get_token_cache().set(self.token.key, self.token)
+        get_token_cache().clear()
+
+        expires = 1000.0 + TOKEN_CACHE['TTL']
+        wall = patch('user.authentication.time.time', return_value=expires - 5)
+        clock = patch('user.authentication.time.monotonic', return_value=500.0)
+        with wall, clock:
+            self.assertIsNotNone(get_token_cache().get(self.token.key))
+        with patch('user.authentication.time.monotonic', return_value=506.0):
+            self.assertIsNone(get_token_cache().get_local(self.token.key))
+        with patch('user.authentication.time.time', return_value=expires + 1):
+            self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_user_change_clears_shared_cache(self):
+        """test saving a user removes its tokens from the shared cache"""
+        get_token_cache().set(self.token.key, self.token)
+        get_token_cache().clear()
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(get_token_cache().get(self.token.key))
@@ -0,0 +1,167 @@
+"""
+Tests for the password hashing pool and the login cache
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import get_login_cache
+from user.hashers import (
+    HashingPool, PasswordHashingBusy, get_hashing_pool, run_hash,
+)
+
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+PAYLOAD = {'email': 'user@example.com', 'password': 'pass123'}
+
+
+def hashing(**params):
+    """override settings.PASSWORD_HASHING , few iterations keep tests fast"""
+    return override_settings(PASSWORD_HASHING=dict(
+        settings.PASSWORD_HASHING, **{'PBKDF2_ITERATIONS': 1000, **params},
+    ))
+
+
+class HashingPoolTests(SimpleTestCase):
+    """Test the bounded hashing pool"""
+
+    def test_full_pool_rejects(self):
+        """test a hash is refused once the workers and the queue are taken"""
+        pool = HashingPool(workers=1, max_queue=0, timeout=0.05)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        thread = threading.Thread(target=pool.run, args=(block,))
+        thread.start()
+        started.wait()
+        try:
+            with self.assertRaises(PasswordHashingBusy):
+                pool.run(len, 'abc')
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(pool.run(len, 'abc'), 3)
+        self.assertEqual(pool.rejected, 1)
+        pool.shutdown()
+
+    @hashing(WORKERS=1, MAX_QUEUE=0)
+    def test_nested_hash_runs_inline(self):
+        """test a hash started on a worker does not wait for a worker"""
+        self.assertEqual(run_hash(run_hash, len, 'abc'), 3)
+
+
+@hashing()
+class LoginTests(TestCase):
+    """Test logging in through the hashing pool and the login cache"""
+
+    def setUp(self):
+        get_login_cache().clear()
+        self.user = get_user_model().objects.create_user(**PAYLOAD)
+        self.client = APIClient()
+
+    def test_rehash_on_login(self):
+        """test a password hashed with an old cost is rehashed at login"""
+        with hashing(PBKDF2_ITERATIONS=500):
+            self.user.set_password(PAYLOAD['password'])
+            self.user.save()
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_recent_login_served_from_cache(self):
+        """test the same credentials get the token back with one query"""
+        first = self.client.post(TOKEN_URL, PAYLOAD)
+
+        with self.assertNumQueries(1):
+            second = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['token'], first.data['token'])
+        self.assertEqual(get_login_cache().stats()['hits'], 1)
+
+    def test_wrong_password_not_served_from_cache(self):
+        """test a cached login does not accept another password"""
+        self.client.post(TOKEN_URL, PAYLOAD)
+
+        res = self.client.post(TOKEN_URL, {**PAYLOAD, 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('token', res.data)
+
+    def test_password_change_forgets_login(self):
+        """test the old password stops working once changed"""
+        self.client.post(TOKEN_URL, PAYLOAD)
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_elsewhere_forgets_login(self):
+        """test a password change or deactivation made by another process ,
+        no signal reaches this process's cache , is not served from it"""
+        self.client.post(TOKEN_URL, PAYLOAD)
+        users = get_user_model().objects.filter(pk=self.user.pk)
+        users.update(password=make_password('newpass123'))
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        users.update(password=make_password(PAYLOAD['password']))
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        users.update(is_active=False)
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_login_cache().stats()['hits'], 0)
+
+    def test_deleted_token_forgets_login(self):
+        """test a login after the token is deleted gets a new token"""
+        old = self.client.post(TOKEN_URL, PAYLOAD).data['token']
+        Token.objects.filter(key=old).delete()
+
+        res = self.client.post(TOKEN_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['token'], old)
+        token = res.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_busy_hashing_answers_503(self):
+        """test a login that cannot get a hashing worker answers 503"""
+        with hashing(WORKERS=1, MAX_QUEUE=0, QUEUE_TIMEOUT=0.05):
+            pool = get_hashing_pool()
+            started, release = threading.Event(), threading.Event()
+
+            def block():
+                started.set()
+                release.wait()
+
+            thread = threading.Thread(target=pool.run, args=(block,))
+            thread.start()
+            started.wait()
+            try:
+                res = self.client.post(TOKEN_URL, PAYLOAD)
+            finally:
+                release.set()
+                thread.join()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
@@ -1,9 +1,14 @@
 """
 Views for the user API
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from core.db.replicas import ReplicaReadMixin
+from core.throttling import EndpointTokenBucketThrottle
+from user.authentication import CachedTokenAuthentication, get_login_cache
 from user.serializers import (
     UserSerializer,
     AuthTokenSerilazer
@@ -12,17 +17,35 @@ from user.serializers import (
 class CreateUserView(generics.CreateAPIView):
     """create a new user in the system"""
     serializer_class = UserSerializer
+    throttle_scope = 'signup'
 
 class CreateTokenView(ObtainAuthToken):
     """create a new auth token for user"""
     serializer_class = AuthTokenSerilazer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken turns throttling off , logins are limited per address
+    throttle_classes = [EndpointTokenBucketThrottle]
+    throttle_scope = 'login'
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+    def post(self, request, *args, **kwargs):
+        """return the token of the user and remember the login"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        key = data.get('token')
+        if key is None:
+            user = data['user']
+            token, created = Token.objects.get_or_create(user=user)
+            key = token.key
+            get_login_cache().set(data['email'], data['password'], user, key)
+        return Response({'token': key})
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """mange the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'me'
 
     def get_object(self):
         """Retrieve and return the authenticated user."""